@@ -0,0 +1,84 @@
+import random
+from argparse import ArgumentParser
+from datetime import datetime
+
+from narrec.analysis.document_memory_consumption import create_synthetic_documents
+from narrec.document.core import NarrativeCoreExtractor
+from narrec.document.corpus import DocumentCorpus
+from narrec.document.document import RecommenderDocument
+
+
+class SyntheticCorpus(DocumentCorpus):
+    """
+    In-memory corpus with random concept supports (no database required)
+    """
+
+    def __init__(self, concept_count: int, document_count: int):
+        rnd = random.Random(42)
+        self.collections = []
+        self.document_count = document_count
+        self.cache_statement2count = dict()
+        self.cache_concept2support = {f'MESH:D{i:06d}': rnd.randint(1, document_count // 10)
+                                      for i in range(concept_count)}
+        self.all_idf_data_cached = True
+        self.all_statement_data_cached = False
+        self.concept_support_table = None
+        self.statement_support_table = None
+
+
+def main():
+    parser = ArgumentParser(description="Measures the throughput of the scalar and the batch core extraction")
+    parser.add_argument("--batches", type=int, default=5, help="number of topic batches")
+    parser.add_argument("--batch-size", type=int, default=2000, help="documents per topic batch")
+    parser.add_argument("--tags", type=int, default=60, help="tags per document")
+    parser.add_argument("--statements", type=int, default=25, help="statements per document")
+    parser.add_argument("--concepts", type=int, default=50000, help="size of the concept pool")
+    args = parser.parse_args()
+
+    corpus = SyntheticCorpus(args.concepts, document_count=30000000)
+    print(f'Creating {args.batches} batches with {args.batch_size} synthetic documents...')
+    documents = [RecommenderDocument(nd) for nd in create_synthetic_documents(args.batches * args.batch_size,
+                                                                              args.tags, args.statements,
+                                                                              args.concepts)]
+    batches = [documents[i:i + args.batch_size] for i in range(0, len(documents), args.batch_size)]
+
+    print('--' * 60)
+    # fresh extractors to exclude the core cache
+    scalar, batch = NarrativeCoreExtractor(corpus), NarrativeCoreExtractor(corpus)
+    start = datetime.now()
+    scalar_cores = {d.id: scalar.extract_narrative_core_from_document(d) for b in batches for d in b}
+    scalar_time = (datetime.now() - start).total_seconds()
+    start = datetime.now()
+    batch_cores = {}
+    for b in batches:
+        batch_cores.update(batch.extract_narrative_cores(b))
+    batch_time = (datetime.now() - start).total_seconds()
+
+    start = datetime.now()
+    scalar_concept_cores = {d.id: scalar.extract_concept_core(d) for b in batches for d in b}
+    scalar_concept_time = (datetime.now() - start).total_seconds()
+    start = datetime.now()
+    batch_concept_cores = {}
+    for b in batches:
+        batch_concept_cores.update(batch.extract_concept_cores(b))
+    batch_concept_time = (datetime.now() - start).total_seconds()
+
+    for doc_id, core in scalar_cores.items():
+        other = batch_cores[doc_id]
+        assert [(s.get_triple(), s.score) for s in core.statements] == \
+               [(s.get_triple(), s.score) for s in other.statements]
+    for doc_id, core in scalar_concept_cores.items():
+        other = batch_concept_cores[doc_id]
+        assert [(c.concept, c.score) for c in core.concepts] == [(c.concept, c.score) for c in other.concepts]
+    print('Batch and scalar cores are identical')
+
+    n = len(documents)
+    print(f'Narrative cores (scalar): {round(n / scalar_time)} cores/sec')
+    print(f'Narrative cores (batch) : {round(n / batch_time)} cores/sec')
+    print(f'Concept cores (scalar)  : {round(n / scalar_concept_time)} cores/sec')
+    print(f'Concept cores (batch)   : {round(n / batch_concept_time)} cores/sec')
+    print('--' * 60)
+
+
+if __name__ == '__main__':
+    main()
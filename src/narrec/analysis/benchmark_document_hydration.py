@@ -0,0 +1,102 @@
+import os
+import random
+import tempfile
+from argparse import ArgumentParser
+from datetime import datetime
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from kgextractiontoolbox.backend.models import Document, Tag, Predication
+from narrec.backend.retriever import retrieve_narrative_documents_from_database_small, \
+    retrieve_narrative_documents_from_database_bulk, chunk_document_ids, query_document_rows, query_tag_rows, \
+    query_predication_rows, BULK_RETRIEVAL_CHUNK_SIZE_DEFAULT
+
+COLLECTION = "PubMed"
+RELATIONS = ["associated", "administered", "decreases", "induces", "inhibits", "treats"]
+ENTITY_TYPES = ["Disease", "Drug", "Gene", "Chemical"]
+
+
+def create_synthetic_fixture(engine, document_count: int, tags_per_doc: int, statements_per_doc: int):
+    """
+    Fills an empty SQLite database with synthetic documents, tags and statement extractions
+    :param engine: a SQLAlchemy engine
+    :param document_count: number of documents to create
+    :param tags_per_doc: number of tags per document
+    :param statements_per_doc: number of statements per document
+    :return: the list of created document ids
+    """
+    for table in [Document.__table__, Tag.__table__, Predication.__table__]:
+        table.create(engine, checkfirst=True)
+
+    rnd = random.Random(42)
+    concepts = [f'MESH:D{i:06d}' for i in range(5000)]
+    document_ids = list(range(1, document_count + 1))
+    doc_values, tag_values, pred_values = [], [], []
+    for doc_id in document_ids:
+        doc_values.append(dict(id=doc_id, collection=COLLECTION, title=f'Title of document {doc_id}',
+                               abstract='lorem ipsum ' * 100))
+        for idx in range(tags_per_doc):
+            tag_values.append(dict(document_id=doc_id, document_collection=COLLECTION, start=idx * 10,
+                                   end=idx * 10 + 5, ent_id=rnd.choice(concepts),
+                                   ent_type=rnd.choice(ENTITY_TYPES), ent_str='entity'))
+        for idx in range(statements_per_doc):
+            pred_values.append(dict(document_id=doc_id, document_collection=COLLECTION,
+                                    subject_id=rnd.choice(concepts), subject_type=rnd.choice(ENTITY_TYPES),
+                                    subject_str='subject', predicate='pred', relation=rnd.choice(RELATIONS),
+                                    object_id=rnd.choice(concepts), object_type=rnd.choice(ENTITY_TYPES),
+                                    object_str='object', confidence=rnd.random(), sentence_id=doc_id * 100 + idx,
+                                    extraction_type='PathIE'))
+
+    with engine.begin() as connection:
+        connection.execute(insert(Document.__table__), doc_values)
+        connection.execute(insert(Tag.__table__), tag_values)
+        connection.execute(insert(Predication.__table__), pred_values)
+    return document_ids
+
+
+def measure_phase(engine, name: str, query_function, chunks, document_collection: str):
+    with engine.connect() as connection:
+        time_start = datetime.now()
+        rows = query_function(connection, chunks, document_collection)
+        seconds = (datetime.now() - time_start).total_seconds()
+    print(f'{name:<15}: {len(rows)} rows in {round(seconds, 3)}s ({round(len(rows) / max(seconds, 1e-9))} rows/sec)')
+
+
+def main():
+    parser = ArgumentParser(description="Micro-benchmark for document hydration on a synthetic SQLite fixture")
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--tags", type=int, default=40, help="tags per document")
+    parser.add_argument("--statements", type=int, default=20, help="statements per document")
+    parser.add_argument("--chunk-size", type=int, default=BULK_RETRIEVAL_CHUNK_SIZE_DEFAULT)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(f'sqlite:///{os.path.join(tmp_dir, "hydration.db")}')
+        print(f'Creating synthetic fixture with {args.documents} documents...')
+        document_ids = set(create_synthetic_fixture(engine, args.documents, args.tags, args.statements))
+        session = sessionmaker(bind=engine)()
+
+        print('--' * 60)
+        print(f'Phases (chunk size = {args.chunk_size})')
+        chunks = chunk_document_ids(document_ids, args.chunk_size)
+        measure_phase(engine, "documents", query_document_rows, chunks, COLLECTION)
+        measure_phase(engine, "tags", query_tag_rows, chunks, COLLECTION)
+        measure_phase(engine, "predications", query_predication_rows, chunks, COLLECTION)
+
+        print('--' * 60)
+        time_start = datetime.now()
+        docs = retrieve_narrative_documents_from_database_small(session, document_ids, COLLECTION)
+        print(f'ORM retrieval  : {len(docs)} documents in {datetime.now() - time_start}')
+
+        time_start = datetime.now()
+        docs = retrieve_narrative_documents_from_database_bulk(session, document_ids, COLLECTION,
+                                                               chunk_size=args.chunk_size)
+        print(f'Bulk retrieval : {len(docs)} documents in {datetime.now() - time_start}')
+        print('--' * 60)
+        session.close()
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
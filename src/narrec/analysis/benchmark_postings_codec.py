@@ -0,0 +1,92 @@
+import ast
+import json
+from argparse import ArgumentParser
+from datetime import datetime
+
+import numpy as np
+
+from narrec.backend.postings import encode_postings, decode_postings, CODEC_RAW32, CODEC_DELTA_VARINT
+from narrec.config import GLOBAL_DB_DOCUMENT_COLLECTION
+
+
+def load_largest_postings(limit: int, collection: str) -> [list]:
+    """
+    Loads the postings of the concepts with the highest support from the NodeInvertedIndex
+    :param limit: the number of concepts
+    :param collection: the document collection
+    :return: a list of document id lists
+    """
+    from narrec.backend.database import SessionRecommender
+    from narrec.backend.models import NodeInvertedIndex
+
+    session = SessionRecommender.get()
+    q = session.query(NodeInvertedIndex.document_ids)
+    q = q.filter(NodeInvertedIndex.document_collection == collection)
+    q = q.order_by(NodeInvertedIndex.support.desc()).limit(limit)
+    return [json.loads(row.document_ids) for row in q]
+
+
+def create_synthetic_postings(limit: int, max_document_id: int) -> [list]:
+    # skewed posting lengths (few very frequent concepts)
+    rng = np.random.default_rng(42)
+    postings = []
+    for idx in range(limit):
+        size = max(1, int(max_document_id / (10 * (idx + 1))))
+        document_ids = np.unique(rng.integers(1, max_document_id, size=size))
+        postings.append(document_ids[::-1].tolist())
+    return postings
+
+
+def measure_decoding(name: str, encoded: list, decode_function, repeat: int) -> float:
+    time_start = datetime.now()
+    total = 0
+    for _ in range(repeat):
+        for data in encoded:
+            total += len(decode_function(data))
+    seconds = (datetime.now() - time_start).total_seconds() / repeat
+    size = sum(len(data) for data in encoded)
+    print(f'{name:<20}: {round(seconds, 4)}s per pass ({round(total / repeat / max(seconds, 1e-9))} ids/sec) '
+          f'- {round(size / 1024 ** 2, 2)} MB')
+    return seconds
+
+
+def main():
+    parser = ArgumentParser(description="Compares decoding time and storage size of posting codecs")
+    parser.add_argument("--limit", type=int, default=100, help="number of concepts (highest support first)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--synthetic", action="store_true", help="use synthetic postings instead of the database")
+    parser.add_argument("--max-document-id", type=int, default=2000000, help="only used for synthetic postings")
+    parser.add_argument("-c", "--collection", default=GLOBAL_DB_DOCUMENT_COLLECTION)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        print(f'Creating {args.limit} synthetic postings...')
+        postings = create_synthetic_postings(args.limit, args.max_document_id)
+    else:
+        print(f'Loading the postings of the {args.limit} largest concepts...')
+        postings = load_largest_postings(args.limit, args.collection)
+    print(f'{sum(len(p) for p in postings)} document ids loaded')
+
+    json_texts = [json.dumps(p) for p in postings]
+    varint_data = [encode_postings(p, codec=CODEC_DELTA_VARINT) for p in postings]
+    raw32_data = [encode_postings(p, codec=CODEC_RAW32) for p in postings]
+
+    for p, data_v, data_r in zip(postings, varint_data, raw32_data):
+        expected = np.array(sorted(set(p)), dtype=np.int64)
+        assert np.array_equal(expected, decode_postings(data_v))
+        assert np.array_equal(expected, decode_postings(data_r))
+
+    print('--' * 60)
+    json_bytes = [t.encode() for t in json_texts]
+    baseline = measure_decoding("literal_eval (text)", json_bytes,
+                                lambda t: {int(d) for d in ast.literal_eval(t.decode())}, args.repeat)
+    measure_decoding("json.loads (text)", json_bytes, lambda t: json.loads(t), args.repeat)
+    varint = measure_decoding("delta varint", varint_data, decode_postings, args.repeat)
+    raw32 = measure_decoding("raw32 (zero-copy)", raw32_data, decode_postings, args.repeat)
+    print('--' * 60)
+    print(f'Speedup delta varint: {round(baseline / max(varint, 1e-9), 1)}x')
+    print(f'Speedup raw32       : {round(baseline / max(raw32, 1e-9), 1)}x')
+
+
+if __name__ == '__main__':
+    main()
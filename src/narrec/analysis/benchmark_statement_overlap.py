@@ -0,0 +1,57 @@
+from argparse import ArgumentParser
+from datetime import datetime
+
+from narrec.analysis.benchmark_core_extraction import SyntheticCorpus
+from narrec.analysis.document_memory_consumption import create_synthetic_documents
+from narrec.document.core import NarrativeCoreExtractor
+from narrec.document.document import RecommenderDocument
+from narrec.recommender.statementoverlap import StatementOverlap
+
+
+def main():
+    parser = ArgumentParser(description="Compares the nested loop and the postings-based StatementOverlap on "
+                                        "synthetic topics")
+    parser.add_argument("--topics", type=int, default=5)
+    parser.add_argument("--candidates", type=int, default=10000, help="candidates per topic")
+    parser.add_argument("--tags", type=int, default=60, help="tags per document")
+    parser.add_argument("--statements", type=int, default=25, help="statements per document")
+    parser.add_argument("--concepts", type=int, default=50,
+                        help="size of the concept pool (small pools lead to many matches)")
+    args = parser.parse_args()
+
+    corpus = SyntheticCorpus(args.concepts, document_count=30000000)
+    extractor = NarrativeCoreExtractor(corpus)
+    loop = StatementOverlap(extractor, use_postings=False)
+    postings = StatementOverlap(extractor, use_postings=True)
+
+    print(f'Creating {args.topics} topics with {args.candidates} synthetic candidates...')
+    documents = [RecommenderDocument(nd) for nd in
+                 create_synthetic_documents(args.topics * (args.candidates + 1), args.tags, args.statements,
+                                            args.concepts)]
+    print('--' * 60)
+    loop_time, postings_time = 0.0, 0.0
+    for topic in range(args.topics):
+        topic_docs = documents[topic * (args.candidates + 1):(topic + 1) * (args.candidates + 1)]
+        query, candidates = topic_docs[0], topic_docs[1:]
+        # compute the query core beforehand
+        extractor.extract_narrative_core_from_document(query)
+
+        start = datetime.now()
+        expected = loop.recommend_documents(query, candidates, None)
+        loop_time += (datetime.now() - start).total_seconds()
+        start = datetime.now()
+        result = postings.recommend_documents(query, candidates, None)
+        postings_time += (datetime.now() - start).total_seconds()
+
+        assert expected == result
+        matches = sum(1 for _, score in result if score > 0.0)
+        print(f'Topic {topic}: {matches} of {len(candidates)} candidates share statements with the core')
+
+    print('Rankings of both modes are identical')
+    print(f'Nested loop: {round(loop_time / args.topics * 1000, 2)} ms per topic')
+    print(f'Postings   : {round(postings_time / args.topics * 1000, 2)} ms per topic')
+    print('--' * 60)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import gc
+import random
+import tracemalloc
+from argparse import ArgumentParser
+from datetime import datetime
+
+from kgextractiontoolbox.document.document import TaggedEntity
+from kgextractiontoolbox.document.narrative_document import NarrativeDocument, StatementExtraction
+from narrec.document.compact import CompactRecommenderDocument
+from narrec.document.document import RecommenderDocument
+
+RELATIONS = ["associated", "administered", "decreases", "induces", "inhibits", "interacts", "treats"]
+ENTITY_TYPES = ["Disease", "Drug", "Gene", "Chemical", "Species"]
+
+
+def create_synthetic_documents(count: int, tags_per_doc: int, statements_per_doc: int, concept_count: int):
+    rnd = random.Random(42)
+    concepts = [(f'MESH:D{i:06d}', ENTITY_TYPES[i % len(ENTITY_TYPES)]) for i in range(concept_count)]
+    documents = []
+    for doc_id in range(count):
+        doc_concepts = rnd.sample(concepts, min(len(concepts), max(2, tags_per_doc // 3)))
+        nd = NarrativeDocument(document_id=doc_id, title=f'Title of document {doc_id}',
+                               abstract=' '.join('lorem ipsum' for _ in range(120)))
+        for idx in range(tags_per_doc):
+            c_id, c_type = rnd.choice(doc_concepts)
+            nd.tags.append(TaggedEntity(document=doc_id, start=idx * 12, end=idx * 12 + 8, ent_id=c_id,
+                                        ent_type=c_type, text=f'text {c_id}'))
+        for idx in range(statements_per_doc):
+            (s_id, s_type), (o_id, o_type) = rnd.sample(doc_concepts, 2)
+            nd.extracted_statements.append(StatementExtraction(subject_id=s_id, subject_type=s_type,
+                                                               subject_str=f'text {s_id}', predicate='pred',
+                                                               relation=rnd.choice(RELATIONS), object_id=o_id,
+                                                               object_type=o_type, object_str=f'text {o_id}',
+                                                               sentence_id=doc_id * 100 + idx % 10,
+                                                               confidence=rnd.random()))
+        documents.append(nd)
+    return documents
+
+
+def measure(name: str, build):
+    gc.collect()
+    tracemalloc.start()
+    start = datetime.now()
+    documents = build()
+    time_taken = datetime.now() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    mb = round(size / 1024 / 1024, 2)
+    print(f'{name:<30}: {mb} MB ({round(size / len(documents))} bytes per document / built in {time_taken})')
+    return documents
+
+
+def main():
+    parser = ArgumentParser(description="Compares the memory consumption of RecommenderDocument and "
+                                        "CompactRecommenderDocument on synthetic documents")
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--tags", type=int, default=60, help="tags per document")
+    parser.add_argument("--statements", type=int, default=25, help="statements per document")
+    parser.add_argument("--concepts", type=int, default=50000, help="size of the concept pool")
+    args = parser.parse_args()
+
+    def create():
+        return create_synthetic_documents(args.documents, args.tags, args.statements, args.concepts)
+
+    # documents are generated within the measurement because RecommenderDocuments keep the tags and statements
+    print('--' * 60)
+    documents = measure("RecommenderDocument", lambda: [RecommenderDocument(nd) for nd in create()])
+    del documents
+    measure("CompactRecommenderDocument",
+            lambda: [CompactRecommenderDocument(RecommenderDocument(nd)) for nd in create()])
+    print('(CompactRecommenderDocument includes the growth of the shared vocabulary)')
+    print('--' * 60)
+
+
+if __name__ == '__main__':
+    main()
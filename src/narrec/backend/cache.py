@@ -0,0 +1,97 @@
+import sys
+from collections import OrderedDict
+
+from narrec.document.compact import CompactRecommenderDocument
+
+# rough per-object costs (bytes) to estimate the footprint of a RecommenderDocument
+TAG_SIZE_ESTIMATE = 400
+STATEMENT_SIZE_ESTIMATE = 800
+GRAPH_ENTRY_SIZE_ESTIMATE = 500
+CONCEPT_ENTRY_SIZE_ESTIMATE = 300
+
+
+def estimate_document_size(document) -> int:
+    """
+    Estimates the memory footprint of a RecommenderDocument
+    sys.getsizeof is shallow, so the size is estimated by the number of contained objects
+    :param document: a RecommenderDocument
+    :return: estimated size in bytes
+    """
+    if isinstance(document, CompactRecommenderDocument):
+        return document.get_memory_size()
+    size = sys.getsizeof(document.title or "") + sys.getsizeof(document.abstract or "")
+    size += TAG_SIZE_ESTIMATE * len(document.tags)
+    size += STATEMENT_SIZE_ESTIMATE * len(document.extracted_statements)
+    size += GRAPH_ENTRY_SIZE_ESTIMATE * len(document.graph)
+    size += CONCEPT_ENTRY_SIZE_ESTIMATE * len(document.concepts)
+    return size
+
+
+class LRUCache:
+    """
+    A least-recently-used cache which is bounded by the number of items and/or the (estimated) size in bytes
+    If no bound is given, the cache behaves like a plain dictionary
+    """
+
+    def __init__(self, max_items: int = None, max_bytes: int = None, sizeof=sys.getsizeof):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.__items = OrderedDict()
+        self.__sizes = {}
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        return key in self.__items
+
+    def __len__(self):
+        return len(self.__items)
+
+    def get(self, key, default=None):
+        if key in self.__items:
+            self.hits += 1
+            self.__items.move_to_end(key)
+            return self.__items[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        if key in self.__items:
+            self.current_bytes -= self.__sizes[key]
+        if self.max_bytes:
+            self.__sizes[key] = self.sizeof(value)
+        else:
+            self.__sizes[key] = 0
+        self.current_bytes += self.__sizes[key]
+        self.__items[key] = value
+        self.__items.move_to_end(key)
+        self.__evict()
+
+    def __evict(self):
+        while len(self.__items) > 1 and ((self.max_items and len(self.__items) > self.max_items)
+                                         or (self.max_bytes and self.current_bytes > self.max_bytes)):
+            key, _ = self.__items.popitem(last=False)
+            self.current_bytes -= self.__sizes.pop(key)
+            self.evictions += 1
+
+    def clear(self):
+        self.__items.clear()
+        self.__sizes.clear()
+        self.current_bytes = 0
+
+    def stats(self) -> dict:
+        return dict(items=len(self.__items), bytes=self.current_bytes, hits=self.hits, misses=self.misses,
+                    evictions=self.evictions)
+
+    def __str__(self):
+        return (f'{len(self.__items)} items ({round(self.current_bytes / 1024 / 1024, 2)} MB) / '
+                f'hits: {self.hits} / misses: {self.misses} / evictions: {self.evictions}')
+
+
+class DocumentCache(LRUCache):
+
+    def __init__(self, max_documents: int = None, max_bytes: int = None):
+        super().__init__(max_items=max_documents, max_bytes=max_bytes, sizeof=estimate_document_size)
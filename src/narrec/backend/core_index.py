@@ -0,0 +1,225 @@
+import json
+import logging
+import os
+from bisect import bisect_right
+from typing import Dict
+
+import numpy as np
+
+from kgextractiontoolbox.document.narrative_document import StatementExtraction
+from narrec.backend.cache import LRUCache
+from narrec.config import CORE_INDEX_DIR
+from narrec.document.core import NarrativeCore, NarrativeConceptCore, ScoredStatementExtraction, ScoredConcept
+
+SEGMENT_STRING_CACHE_SIZE = 64
+META_FILE = "meta.json"
+STRINGS_FILE = "strings.json"
+
+# string columns of a statement (stored as ids of the segment's string table)
+STATEMENT_STRING_COLUMNS = ["subject_id", "subject_type", "subject_str", "predicate", "relation",
+                            "object_id", "object_type", "object_str"]
+
+
+def write_core_segment(directory: str, doc2core: Dict[int, NarrativeCore],
+                       doc2concept_core: Dict[int, NarrativeConceptCore], config_hash: str, **meta):
+    """
+    Writes the cores of a set of documents as a columnar segment (one .npy file per column)
+    Documents without a core (None) are flagged, so that they are distinguishable from unknown documents.
+    :param directory: the segment directory
+    :param doc2core: a dictionary mapping document ids to their narrative core (or None)
+    :param doc2concept_core: a dictionary mapping document ids to their concept core (or None)
+    :param config_hash: hash of the scoring configuration (see compute_scoring_config_hash)
+    :param meta: additional entries of the meta file
+    """
+    os.makedirs(directory, exist_ok=True)
+    str2id = {}
+
+    def intern(value: str) -> int:
+        if value not in str2id:
+            str2id[value] = len(str2id)
+        return str2id[value]
+
+    doc_ids = sorted(doc2core)
+    offsets = [0]
+    strings, sentence_ids, confidences, scores = [], [], [], []
+    for doc_id in doc_ids:
+        core = doc2core[doc_id]
+        if core:
+            for s in core.statements:
+                strings.append([intern(getattr(s, column)) for column in STATEMENT_STRING_COLUMNS])
+                sentence_ids.append(s.sentence_id)
+                confidences.append(s.confidence)
+                scores.append(s.score)
+        offsets.append(len(scores))
+    np.save(os.path.join(directory, 'statement_doc_ids.npy'), np.array(doc_ids, dtype=np.int64))
+    np.save(os.path.join(directory, 'statement_offsets.npy'), np.array(offsets, dtype=np.int64))
+    np.save(os.path.join(directory, 'statement_none.npy'),
+            np.array([doc2core[d] is None for d in doc_ids], dtype=bool))
+    np.save(os.path.join(directory, 'statement_strings.npy'),
+            np.array(strings, dtype=np.int32).reshape(-1, len(STATEMENT_STRING_COLUMNS)))
+    np.save(os.path.join(directory, 'statement_sentence_ids.npy'), np.array(sentence_ids, dtype=np.int64))
+    np.save(os.path.join(directory, 'statement_confidence.npy'), np.array(confidences, dtype=np.float64))
+    np.save(os.path.join(directory, 'statement_score.npy'), np.array(scores, dtype=np.float64))
+
+    concept_doc_ids = sorted(doc2concept_core)
+    offsets = [0]
+    concepts, scores, coverages, supports = [], [], [], []
+    for doc_id in concept_doc_ids:
+        core = doc2concept_core[doc_id]
+        if core:
+            for c in core.concepts:
+                concepts.append(intern(c.concept))
+                scores.append(c.score)
+                coverages.append(c.coverage)
+                supports.append(c.support)
+        offsets.append(len(scores))
+    np.save(os.path.join(directory, 'concept_doc_ids.npy'), np.array(concept_doc_ids, dtype=np.int64))
+    np.save(os.path.join(directory, 'concept_offsets.npy'), np.array(offsets, dtype=np.int64))
+    np.save(os.path.join(directory, 'concept_none.npy'),
+            np.array([doc2concept_core[d] is None for d in concept_doc_ids], dtype=bool))
+    np.save(os.path.join(directory, 'concept_ids.npy'), np.array(concepts, dtype=np.int32))
+    np.save(os.path.join(directory, 'concept_score.npy'), np.array(scores, dtype=np.float64))
+    np.save(os.path.join(directory, 'concept_coverage.npy'), np.array(coverages, dtype=np.float64))
+    np.save(os.path.join(directory, 'concept_support.npy'), np.array(supports, dtype=np.int64))
+
+    with open(os.path.join(directory, STRINGS_FILE), 'wt') as f:
+        json.dump(list(str2id), f)
+    # the meta file is written last and marks the segment as complete
+    all_doc_ids = doc_ids + concept_doc_ids
+    with open(os.path.join(directory, META_FILE), 'wt') as f:
+        json.dump(dict(config_hash=config_hash, documents=len(doc_ids),
+                       min_document_id=min(all_doc_ids) if all_doc_ids else 0,
+                       max_document_id=max(all_doc_ids) if all_doc_ids else 0, **meta), f)
+
+
+class CoreSegment:
+
+    def __init__(self, directory: str, meta: dict):
+        self.directory = directory
+        self.config_hash = meta["config_hash"]
+        self.min_document_id = meta["min_document_id"]
+        self.max_document_id = meta["max_document_id"]
+        self.__arrays = {}
+
+    def array(self, name: str) -> np.ndarray:
+        # arrays are memory-mapped on first access
+        if name not in self.__arrays:
+            self.__arrays[name] = np.load(os.path.join(self.directory, f'{name}.npy'), mmap_mode='r')
+        return self.__arrays[name]
+
+    def load_strings(self) -> [str]:
+        with open(os.path.join(self.directory, STRINGS_FILE), 'rt') as f:
+            return json.load(f)
+
+    def find(self, prefix: str, document_id: int):
+        # (has core, start row, end row) or None if the document is not contained in the segment
+        doc_ids = self.array(f'{prefix}_doc_ids')
+        idx = int(np.searchsorted(doc_ids, document_id))
+        if idx < len(doc_ids) and int(doc_ids[idx]) == document_id:
+            offsets = self.array(f'{prefix}_offsets')
+            return not bool(self.array(f'{prefix}_none')[idx]), int(offsets[idx]), int(offsets[idx + 1])
+        return None
+
+
+class CoreIndex:
+    """
+    Read-only access to precomputed narrative and concept cores (see backend/create_core_index.py)
+    The index consists of segments (ranges of document ids) with memory-mapped columns.
+    """
+
+    def __init__(self, directory: str = CORE_INDEX_DIR):
+        self.directory = directory
+        self.segments = []
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                meta_path = os.path.join(directory, name, META_FILE)
+                if os.path.isfile(meta_path):
+                    with open(meta_path, 'rt') as f:
+                        self.segments.append(CoreSegment(os.path.join(directory, name), json.load(f)))
+        self.segments.sort(key=lambda s: s.min_document_id)
+        self.__segment_starts = [s.min_document_id for s in self.segments]
+        self.__strings = LRUCache(max_items=SEGMENT_STRING_CACHE_SIZE)
+        logging.info(f'Core index with {len(self.segments)} segments loaded from {directory}')
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __get_strings(self, segment: CoreSegment) -> [str]:
+        strings = self.__strings.get(segment.directory)
+        if strings is None:
+            strings = segment.load_strings()
+            self.__strings.put(segment.directory, strings)
+        return strings
+
+    def __find_segment(self, document_id: int, config_hash: str) -> CoreSegment:
+        idx = bisect_right(self.__segment_starts, document_id) - 1
+        if idx < 0:
+            return None
+        segment = self.segments[idx]
+        if document_id > segment.max_document_id or segment.config_hash != config_hash:
+            return None
+        return segment
+
+    def get_narrative_cores(self, document_ids: [int], config_hash: str) -> Dict[int, NarrativeCore]:
+        """
+        Loads the narrative cores of the documents which are contained in the index
+        :param document_ids: a list of document ids
+        :param config_hash: the current scoring configuration (segments of other configurations are ignored)
+        :return: a dictionary mapping a document id to its core (None if the document has no core)
+        """
+        result = {}
+        for doc_id in document_ids:
+            segment = self.__find_segment(doc_id, config_hash)
+            if not segment:
+                continue
+            rows = segment.find('statement', doc_id)
+            if not rows:
+                continue
+            has_core, start, end = rows
+            if not has_core:
+                result[doc_id] = None
+                continue
+
+            strings = self.__get_strings(segment)
+            statements = []
+            for values, sentence_id, confidence, score in zip(segment.array('statement_strings')[start:end].tolist(),
+                                                              segment.array('statement_sentence_ids')[
+                                                              start:end].tolist(),
+                                                              segment.array('statement_confidence')[start:end].tolist(),
+                                                              segment.array('statement_score')[start:end].tolist()):
+                fields = {column: strings[v] for column, v in zip(STATEMENT_STRING_COLUMNS, values)}
+                statements.append(ScoredStatementExtraction(stmt=StatementExtraction(sentence_id=sentence_id,
+                                                                                     confidence=confidence,
+                                                                                     **fields),
+                                                            score=score))
+            result[doc_id] = NarrativeCore(statements)
+        return result
+
+    def get_concept_cores(self, document_ids: [int], config_hash: str) -> Dict[int, NarrativeConceptCore]:
+        """
+        Loads the concept cores of the documents which are contained in the index
+        :param document_ids: a list of document ids
+        :param config_hash: the current scoring configuration (segments of other configurations are ignored)
+        :return: a dictionary mapping a document id to its concept core (None if the document has no concepts)
+        """
+        result = {}
+        for doc_id in document_ids:
+            segment = self.__find_segment(doc_id, config_hash)
+            if not segment:
+                continue
+            rows = segment.find('concept', doc_id)
+            if not rows:
+                continue
+            has_core, start, end = rows
+            if not has_core:
+                result[doc_id] = None
+                continue
+
+            strings = self.__get_strings(segment)
+            result[doc_id] = NarrativeConceptCore([ScoredConcept(strings[c], score, coverage, support)
+                                                   for c, score, coverage, support
+                                                   in zip(segment.array('concept_ids')[start:end].tolist(),
+                                                          segment.array('concept_score')[start:end].tolist(),
+                                                          segment.array('concept_coverage')[start:end].tolist(),
+                                                          segment.array('concept_support')[start:end].tolist())])
+        return result
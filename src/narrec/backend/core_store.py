@@ -0,0 +1,96 @@
+import os
+import pickle
+import sqlite3
+import zlib
+from typing import Dict
+
+from kgextractiontoolbox.document.narrative_document import StatementExtraction
+from narrec.config import CORE_STORE_PATH
+from narrec.document.core import NarrativeCore, ScoredStatementExtraction
+
+STORE_QUERY_CHUNK_SIZE = 500
+
+
+def serialize_core(core: NarrativeCore) -> bytes:
+    # documents without a core are stored as an empty statement list
+    statements = []
+    if core:
+        statements = [(s.subject_id, s.subject_type, s.subject_str, s.predicate, s.relation,
+                       s.object_id, s.object_type, s.object_str, s.sentence_id, s.confidence, s.score)
+                      for s in core.statements]
+    return zlib.compress(pickle.dumps(statements, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def deserialize_core(blob: bytes) -> NarrativeCore:
+    statements = pickle.loads(zlib.decompress(blob))
+    if not statements:
+        return None
+    return NarrativeCore([ScoredStatementExtraction(stmt=StatementExtraction(subject_id=s_id, subject_type=s_type,
+                                                                             subject_str=s_str, predicate=predicate,
+                                                                             relation=relation, object_id=o_id,
+                                                                             object_type=o_type, object_str=o_str,
+                                                                             sentence_id=sentence_id,
+                                                                             confidence=confidence),
+                                                    score=score)
+                          for s_id, s_type, s_str, predicate, relation, o_id, o_type, o_str, sentence_id,
+                          confidence, score in statements])
+
+
+class CoreStore:
+    """
+    Persistent store (SQLite file) for narrative cores keyed by (scoring config hash, document id)
+    Cores depend on the scoring configuration and the corpus, so entries of other configurations are never returned.
+    """
+
+    def __init__(self, path: str = CORE_STORE_PATH):
+        self.path = path
+        self.__connection = None
+        self.__pid = None
+
+    def __get_connection(self):
+        # connections must not be shared between processes
+        if self.__connection is None or self.__pid != os.getpid():
+            self.__connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            self.__connection.execute('PRAGMA journal_mode=WAL')
+            self.__connection.execute('CREATE TABLE IF NOT EXISTS core ('
+                                      'config_hash TEXT NOT NULL, '
+                                      'document_id INTEGER NOT NULL, '
+                                      'data BLOB NOT NULL, '
+                                      'PRIMARY KEY (config_hash, document_id)) WITHOUT ROWID')
+            self.__connection.commit()
+            self.__pid = os.getpid()
+        return self.__connection
+
+    def get_narrative_cores(self, document_ids: [int], config_hash: str) -> Dict[int, NarrativeCore]:
+        connection = self.__get_connection()
+        document_ids = sorted(document_ids)
+        result = {}
+        for i in range(0, len(document_ids), STORE_QUERY_CHUNK_SIZE):
+            chunk = document_ids[i:i + STORE_QUERY_CHUNK_SIZE]
+            q = (f'SELECT document_id, data FROM core WHERE config_hash = ? '
+                 f'AND document_id IN ({",".join("?" * len(chunk))})')
+            for doc_id, blob in connection.execute(q, [config_hash] + chunk):
+                result[doc_id] = deserialize_core(blob)
+        return result
+
+    def put_cores(self, doc2core: Dict[int, NarrativeCore], config_hash: str):
+        connection = self.__get_connection()
+        values = [(config_hash, doc_id, serialize_core(core)) for doc_id, core in doc2core.items()]
+        connection.executemany('INSERT OR REPLACE INTO core (config_hash, document_id, data) VALUES (?, ?, ?)',
+                               values)
+        connection.commit()
+
+    def count(self, config_hash: str) -> int:
+        connection = self.__get_connection()
+        return connection.execute('SELECT COUNT(*) FROM core WHERE config_hash = ?', (config_hash,)).fetchone()[0]
+
+    def invalidate(self, config_hash: str):
+        # removes all cores that were computed with a different configuration
+        connection = self.__get_connection()
+        connection.execute('DELETE FROM core WHERE config_hash != ?', (config_hash,))
+        connection.commit()
+
+    def clear(self):
+        connection = self.__get_connection()
+        connection.execute('DELETE FROM core')
+        connection.commit()
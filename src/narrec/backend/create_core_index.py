@@ -0,0 +1,116 @@
+import json
+import os
+import shutil
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from tqdm import tqdm
+
+from narrec.backend.core_index import write_core_segment, META_FILE
+from narrec.backend.retriever import DocumentRetriever
+from narrec.config import GLOBAL_DB_DOCUMENT_COLLECTION, CORE_INDEX_DIR
+from narrec.document.core import NarrativeCoreExtractor, compute_scoring_config_hash
+from narrec.document.corpus import DocumentCorpus
+
+CORE_INDEX_SEGMENT_SIZE = 20000
+
+# per-process state of the worker pool
+_worker_state = {}
+
+
+def _init_worker(collection: str):
+    corpus = DocumentCorpus(collections=[collection])
+    corpus.load_all_support_into_memory()
+    _worker_state["collection"] = collection
+    # every document is processed only once - caching would only waste memory
+    _worker_state["retriever"] = DocumentRetriever(cache_max_documents=1)
+    _worker_state["extractor"] = NarrativeCoreExtractor(corpus=corpus, cache_max_items=1)
+
+
+def _get_segment_range(document_ids: [int]) -> dict:
+    # the ids a segment was computed for (segments are cut by position, so added documents shift the ranges)
+    return dict(first_document_id=int(document_ids[0]), last_document_id=int(document_ids[-1]),
+                segment_documents=len(document_ids))
+
+
+def _is_segment_up_to_date(segment_dir: str, config_hash: str, document_ids: [int]) -> bool:
+    meta_path = os.path.join(segment_dir, META_FILE)
+    if not os.path.isfile(meta_path):
+        return False
+    with open(meta_path, 'rt') as f:
+        meta = json.load(f)
+    if meta.get("config_hash") != config_hash:
+        return False
+    return all(meta.get(key) == value for key, value in _get_segment_range(document_ids).items())
+
+
+def _compute_segment(segment_dir: str, document_ids: [int]) -> int:
+    retriever, extractor = _worker_state["retriever"], _worker_state["extractor"]
+    # the ids are already database ids
+    documents = retriever.retrieve_narrative_documents(document_ids, _worker_state["collection"], translate_ids=False)
+    doc2core = extractor.extract_narrative_cores(documents)
+    doc2concept_core = extractor.extract_concept_cores(documents)
+    write_core_segment(segment_dir, doc2core, doc2concept_core, extractor.config_hash,
+                       **_get_segment_range(document_ids))
+    return len(documents)
+
+
+def compute_core_index(collection=GLOBAL_DB_DOCUMENT_COLLECTION, workers: int = 8,
+                       segment_size: int = CORE_INDEX_SEGMENT_SIZE, directory: str = CORE_INDEX_DIR):
+    """
+    Computes the narrative and concept cores of all documents in a collection and writes them as columnar segments
+    Segments that were already written for the same scoring configuration and document ids are skipped, so an
+    interrupted job can be continued. All other segments are recomputed.
+    :param collection: the document collection
+    :param workers: number of worker processes
+    :param segment_size: number of documents per segment
+    :param directory: the target directory of the core index
+    """
+    start_time = datetime.now()
+    print('Retrieving document ids...')
+    document_ids = sorted(DocumentRetriever().retrieve_document_ids_for_collection(collection))
+    print(f'{len(document_ids)} documents found')
+    config_hash = compute_scoring_config_hash(DocumentCorpus(collections=[collection]))
+
+    tasks = []
+    segment_names = set()
+    for segment_no, i in enumerate(range(0, len(document_ids), segment_size)):
+        segment_name = f'{collection}_{segment_no:06d}'
+        segment_names.add(segment_name)
+        segment_dir = os.path.join(directory, segment_name)
+        segment_document_ids = document_ids[i:i + segment_size]
+        if _is_segment_up_to_date(segment_dir, config_hash, segment_document_ids):
+            continue
+        # remove incomplete or outdated segments of a previous run
+        if os.path.isdir(segment_dir):
+            shutil.rmtree(segment_dir)
+        tasks.append((segment_dir, segment_document_ids))
+
+    # remove segments behind the last segment (e.g., after a change of the segment size)
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            is_segment = name.startswith(f'{collection}_') and name[len(collection) + 1:].isdigit()
+            if is_segment and name not in segment_names:
+                shutil.rmtree(os.path.join(directory, name))
+    print(f'{len(tasks)} segments must be computed (segment size: {segment_size})')
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(collection,)) as executor:
+        futures = [executor.submit(_compute_segment, segment_dir, ids) for segment_dir, ids in tasks]
+        for future in tqdm(futures, desc="Computing cores", total=len(futures)):
+            future.result()
+
+    print(f'Core index written to {directory}. Took me {datetime.now() - start_time} minutes.')
+
+
+def main():
+    parser = ArgumentParser(description="Precomputes narrative and concept cores for all documents of a collection")
+    parser.add_argument("-c", "--collection", default=GLOBAL_DB_DOCUMENT_COLLECTION)
+    parser.add_argument("-w", "--workers", type=int, default=8)
+    parser.add_argument("-s", "--segment-size", type=int, default=CORE_INDEX_SEGMENT_SIZE)
+    args = parser.parse_args()
+    compute_core_index(collection=args.collection, workers=args.workers, segment_size=args.segment_size)
+
+
+if __name__ == "__main__":
+    main()
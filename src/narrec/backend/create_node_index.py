@@ -8,7 +8,8 @@ from kgextractiontoolbox.backend.models import Predication, BULK_INSERT_AFTER_K
 from kgextractiontoolbox.progress import Progress
 from narraint.config import QUERY_YIELD_PER_K
 from narrec.backend.database import SessionRecommender
-from narrec.backend.models import NodeInvertedIndex
+from narrec.backend.models import NodeInvertedIndex, NodeInvertedIndexPacked
+from narrec.backend.postings import encode_postings
 
 
 def compute_node_inverted_index(collection="PubMed"):
@@ -16,6 +17,8 @@ def compute_node_inverted_index(collection="PubMed"):
     print('Deleting old inverted index for nodes...')
     stmt = delete(NodeInvertedIndex)
     session.execute(stmt)
+    stmt = delete(NodeInvertedIndexPacked)
+    session.execute(stmt)
     session.commit()
 
     print('Counting the number of predications...')
@@ -33,6 +36,7 @@ def compute_node_inverted_index(collection="PubMed"):
     prov_query = prov_query.yield_per(10 * QUERY_YIELD_PER_K)
 
     insert_list = []
+    insert_list_packed = []
     print("Starting...")
     concept2docs = defaultdict(set)
 
@@ -54,6 +58,9 @@ def compute_node_inverted_index(collection="PubMed"):
         if idx % BULK_INSERT_AFTER_K == 0:
             NodeInvertedIndex.bulk_insert_values_into_table(session, insert_list, check_constraints=False)
             insert_list.clear()
+            NodeInvertedIndexPacked.bulk_insert_values_into_table(session, insert_list_packed,
+                                                                  check_constraints=False)
+            insert_list_packed.clear()
 
         progress2.print_progress(idx)
         assert len(concept2docs[concept]) > 0
@@ -66,10 +73,18 @@ def compute_node_inverted_index(collection="PubMed"):
             support=len(doc_list),
             document_ids=json.dumps(doc_list)
         ))
+        insert_list_packed.append(dict(
+            entity_id=concept,
+            document_collection=collection,
+            support=len(doc_list),
+            document_ids=encode_postings(doc_list)
+        ))
     progress2.done()
 
     NodeInvertedIndex.bulk_insert_values_into_table(session, insert_list, check_constraints=False)
     insert_list.clear()
+    NodeInvertedIndexPacked.bulk_insert_values_into_table(session, insert_list_packed, check_constraints=False)
+    insert_list_packed.clear()
     session.commit()
 
     progress.done()
@@ -0,0 +1,90 @@
+import json
+from argparse import ArgumentParser
+from datetime import datetime
+
+from sqlalchemy import delete, case
+from tqdm import tqdm
+
+from kgextractiontoolbox.backend.models import BULK_INSERT_AFTER_K
+from narraint.backend.models import PredicationInvertedIndex
+from narraint.config import QUERY_YIELD_PER_K
+from narrec.backend.database import SessionRecommender
+from narrec.backend.models import NodePairInvertedIndex
+from narrec.backend.postings import encode_postings
+from narrec.config import GLOBAL_DB_DOCUMENT_COLLECTION
+
+
+def to_node_pair_row(node_pair: (str, str), document_ids: {int}, collection: str) -> dict:
+    # pairs are stored in the sorted order of Python strings (the order of the database may differ)
+    node_a, node_b = sorted(node_pair)
+    return dict(node_a=node_a, node_b=node_b, document_collection=collection, support=len(document_ids),
+                document_ids=encode_postings(document_ids))
+
+
+def compute_node_pair_inverted_index(collections: [str]):
+    """
+    Denormalizes the PredicationInvertedIndex into the NodePairInvertedIndex: the provenance of all statements
+    between two nodes (any relation and direction) is merged into a single postings list per unordered node pair
+    The statements are streamed in node pair order, so the memory is bounded by the provenance of a single pair.
+    :param collections: the document collections to compute
+    """
+    start_time = datetime.now()
+    session = SessionRecommender.get()
+
+    for collection in collections:
+        print(f'Deleting old inverted index for node pairs ({collection})...')
+        stmt = delete(NodePairInvertedIndex).where(NodePairInvertedIndex.document_collection == collection)
+        session.execute(stmt)
+        session.commit()
+
+        total = session.query(PredicationInvertedIndex).filter(
+            PredicationInvertedIndex.document_collection == collection).count()
+        # the rows of an unordered node pair (relations and both directions) are adjacent in this order, so every
+        # pair is written as soon as the next pair starts and only one pair is kept in memory
+        node_a = case((PredicationInvertedIndex.subject_id <= PredicationInvertedIndex.object_id,
+                       PredicationInvertedIndex.subject_id), else_=PredicationInvertedIndex.object_id)
+        node_b = case((PredicationInvertedIndex.subject_id <= PredicationInvertedIndex.object_id,
+                       PredicationInvertedIndex.object_id), else_=PredicationInvertedIndex.subject_id)
+        q = session.query(node_a.label("node_a"), node_b.label("node_b"), PredicationInvertedIndex.provenance_mapping)
+        q = q.filter(PredicationInvertedIndex.document_collection == collection)
+        q = q.order_by(node_a, node_b)
+
+        insert_list = []
+        pair_count = 0
+        current_pair, document_ids = None, set()
+        for row in tqdm(q.yield_per(QUERY_YIELD_PER_K), desc=f"Merging statement provenance ({collection})...",
+                        total=total):
+            if (row.node_a, row.node_b) != current_pair:
+                if current_pair:
+                    insert_list.append(to_node_pair_row(current_pair, document_ids, collection))
+                    pair_count += 1
+                current_pair, document_ids = (row.node_a, row.node_b), set()
+            # the keys of the provenance mapping are the document ids
+            document_ids.update(int(d) for d in json.loads(row.provenance_mapping))
+
+            if len(insert_list) >= BULK_INSERT_AFTER_K:
+                # a commit would close the server-side cursor of the streamed query
+                NodePairInvertedIndex.bulk_insert_values_into_table(session, insert_list, check_constraints=False,
+                                                                    commit=False)
+                insert_list.clear()
+        if current_pair:
+            insert_list.append(to_node_pair_row(current_pair, document_ids, collection))
+            pair_count += 1
+
+        NodePairInvertedIndex.bulk_insert_values_into_table(session, insert_list, check_constraints=False)
+        insert_list.clear()
+        session.commit()
+        print(f'{pair_count} node pairs written ({collection})')
+
+    print(f"Node pair inverted index table created. Took me {datetime.now() - start_time} minutes.")
+
+
+def main():
+    parser = ArgumentParser(description="Computes the inverted index for unordered node pairs")
+    parser.add_argument("-c", "--collections", nargs="+", default=[GLOBAL_DB_DOCUMENT_COLLECTION])
+    args = parser.parse_args()
+    compute_node_pair_inverted_index(args.collections)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import ast
+import json
+import os
+import shutil
+from argparse import ArgumentParser
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+from tqdm import tqdm
+
+from narraint.backend.database import SessionExtended
+from narraint.backend.models import TagInvertedIndex, PredicationInvertedIndex
+from narraint.config import QUERY_YIELD_PER_K
+from narrec.backend.models import NodeInvertedIndex, TagInvertedIndexScored
+from narrec.backend.postings_index import write_postings_segment, node_pair_to_term, FIELD_CONCEPT, FIELD_NODE, \
+    FIELD_NODE_PAIR, FIELD_CONCEPT_SCORED
+from narrec.config import GLOBAL_DB_DOCUMENT_COLLECTION, POSTINGS_INDEX_DIR
+
+# number of terms per segment (bounds the memory of the builder)
+POSTINGS_INDEX_SEGMENT_SIZE = 500000
+SCORED_COLUMNS = ["tf", "score"]
+
+
+def iterate_concept_postings(session, collection: str):
+    total = session.query(TagInvertedIndex).filter(TagInvertedIndex.document_collection == collection).count()
+    q = session.query(TagInvertedIndex.entity_id, TagInvertedIndex.document_ids)
+    q = q.filter(TagInvertedIndex.document_collection == collection)
+    for row in tqdm(q.yield_per(QUERY_YIELD_PER_K), desc="Exporting concept postings...", total=total):
+        yield row.entity_id, {int(d) for d in ast.literal_eval(row.document_ids)}, None
+
+
+def iterate_node_postings(session, collection: str):
+    total = session.query(NodeInvertedIndex).filter(NodeInvertedIndex.document_collection == collection).count()
+    q = session.query(NodeInvertedIndex.entity_id, NodeInvertedIndex.document_ids)
+    q = q.filter(NodeInvertedIndex.document_collection == collection)
+    for row in tqdm(q.yield_per(QUERY_YIELD_PER_K), desc="Exporting node postings...", total=total):
+        yield row.entity_id, {int(d) for d in ast.literal_eval(row.document_ids)}, None
+
+
+def iterate_node_pair_postings(session, collection: str):
+    # a node pair consists of several rows (relations and both directions) - they are merged within a segment
+    # and across segments at lookup time
+    total = session.query(PredicationInvertedIndex).filter(
+        PredicationInvertedIndex.document_collection == collection).count()
+    q = session.query(PredicationInvertedIndex.subject_id, PredicationInvertedIndex.object_id,
+                      PredicationInvertedIndex.provenance_mapping)
+    q = q.filter(PredicationInvertedIndex.document_collection == collection)
+    for row in tqdm(q.yield_per(QUERY_YIELD_PER_K), desc="Exporting node pair postings...", total=total):
+        yield node_pair_to_term(row.subject_id, row.object_id), \
+            {int(d) for d in json.loads(row.provenance_mapping)}, None
+
+
+def iterate_scored_concept_postings(session, collection: str):
+    total = session.query(TagInvertedIndexScored).filter(
+        TagInvertedIndexScored.document_collection == collection).count()
+    q = session.query(TagInvertedIndexScored.entity_id, TagInvertedIndexScored.scored_document_ids)
+    q = q.filter(TagInvertedIndexScored.document_collection == collection)
+    for row in tqdm(q.yield_per(QUERY_YIELD_PER_K), desc="Exporting scored concept postings...", total=total):
+        did2values = {int(did): (tf, score) for did, tf, score in ast.literal_eval(row.scored_document_ids)}
+        yield row.entity_id, set(did2values), did2values
+
+
+FIELD2ROWS = {
+    FIELD_CONCEPT: iterate_concept_postings,
+    FIELD_NODE: iterate_node_postings,
+    FIELD_NODE_PAIR: iterate_node_pair_postings,
+    FIELD_CONCEPT_SCORED: iterate_scored_concept_postings,
+}
+
+
+def write_field(field_dir: str, rows, segment_size: int = POSTINGS_INDEX_SEGMENT_SIZE) -> int:
+    """
+    Writes the postings of a field as a sequence of segments
+    :param field_dir: the directory of the field
+    :param rows: an iterable of (term, set of document ids, dictionary document id -> value tuple or None)
+    :param segment_size: number of terms per segment
+    :return: the number of written segments
+    """
+    term2postings = defaultdict(set)
+    term2values = defaultdict(dict)
+    segments = 0
+
+    def flush():
+        nonlocal segments
+        if not term2postings:
+            return
+        postings = {t: np.fromiter(ids, dtype=np.int64, count=len(ids)) for t, ids in term2postings.items()}
+        values = None
+        if term2values:
+            values = {}
+            for t, ids in postings.items():
+                did2values = term2values[t]
+                values[t] = {c: np.array([did2values[d][i] for d in ids.tolist()], dtype=np.float64)
+                             for i, c in enumerate(SCORED_COLUMNS)}
+        write_postings_segment(os.path.join(field_dir, f'{segments:06d}'), postings, values)
+        segments += 1
+        term2postings.clear()
+        term2values.clear()
+
+    for term, document_ids, did2values in rows:
+        if term not in term2postings and len(term2postings) >= segment_size:
+            flush()
+        term2postings[term].update(document_ids)
+        if did2values:
+            term2values[term].update(did2values)
+    flush()
+    return segments
+
+
+def compute_postings_index(collection: str = GLOBAL_DB_DOCUMENT_COLLECTION, fields: [str] = None,
+                           segment_size: int = POSTINGS_INDEX_SEGMENT_SIZE, directory: str = POSTINGS_INDEX_DIR):
+    """
+    Exports the inverted indexes of the database into the file-based postings index (see PostingsIndex)
+    :param collection: the document collection
+    :param fields: the fields to export (all fields by default)
+    :param segment_size: number of terms per segment
+    :param directory: the base directory of the postings index
+    """
+    start_time = datetime.now()
+    session = SessionExtended.get()
+    for field in (fields if fields else list(FIELD2ROWS)):
+        field_dir = os.path.join(directory, collection, field)
+        # fields are always rebuilt completely
+        if os.path.isdir(field_dir):
+            shutil.rmtree(field_dir)
+        segments = write_field(field_dir, FIELD2ROWS[field](session, collection), segment_size)
+        print(f'Field {field}: {segments} segments written to {field_dir}')
+
+    print(f'Postings index written. Took me {datetime.now() - start_time} minutes.')
+
+
+def main():
+    parser = ArgumentParser(description="Exports the inverted indexes of the database into a file-based index")
+    parser.add_argument("-c", "--collection", default=GLOBAL_DB_DOCUMENT_COLLECTION)
+    parser.add_argument("-f", "--fields", nargs="+", choices=list(FIELD2ROWS), default=None)
+    parser.add_argument("-s", "--segment-size", type=int, default=POSTINGS_INDEX_SEGMENT_SIZE)
+    args = parser.parse_args()
+    compute_postings_index(collection=args.collection, fields=args.fields, segment_size=args.segment_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+from argparse import ArgumentParser
+from collections import defaultdict
+from datetime import datetime
+
+from tqdm import tqdm
+
+from narraint.backend.database import SessionExtended
+from narraint.backend.models import TagInvertedIndex, PredicationInvertedIndex
+from narraint.config import QUERY_YIELD_PER_K
+from narrec.backend.support_table import write_support_table, get_support_table_dir, statement_to_key, \
+    CONCEPT_TABLE, STATEMENT_TABLE
+from narrec.config import GLOBAL_DB_DOCUMENT_COLLECTION
+
+
+def compute_support_tables(collections: [str]):
+    start_time = datetime.now()
+    session = SessionExtended.get()
+    directory = get_support_table_dir(collections)
+
+    print('Exporting concept support...')
+    concept2support = defaultdict(int)
+    for collection in collections:
+        total = session.query(TagInvertedIndex).filter(TagInvertedIndex.document_collection == collection).count()
+        q = session.query(TagInvertedIndex.entity_id, TagInvertedIndex.support)
+        q = q.filter(TagInvertedIndex.document_collection == collection)
+        for row in tqdm(q.yield_per(QUERY_YIELD_PER_K), desc=f"Loading concepts ({collection})...", total=total):
+            concept2support[row.entity_id] += row.support
+    write_support_table(directory, CONCEPT_TABLE, concept2support)
+    print(f'{len(concept2support)} concepts written')
+    del concept2support
+
+    print('Exporting statement support...')
+    statement2support = defaultdict(int)
+    for collection in collections:
+        total = session.query(PredicationInvertedIndex).filter(
+            PredicationInvertedIndex.document_collection == collection).count()
+        q = session.query(PredicationInvertedIndex.subject_id, PredicationInvertedIndex.relation,
+                          PredicationInvertedIndex.object_id, PredicationInvertedIndex.support)
+        q = q.filter(PredicationInvertedIndex.document_collection == collection)
+        for row in tqdm(q.yield_per(QUERY_YIELD_PER_K), desc=f"Loading statements ({collection})...", total=total):
+            statement2support[statement_to_key((row.subject_id, row.relation, row.object_id))] += row.support
+    write_support_table(directory, STATEMENT_TABLE, statement2support)
+    print(f'{len(statement2support)} statements written')
+
+    print(f'Support tables written to {directory}. Took me {datetime.now() - start_time} minutes.')
+
+
+def main():
+    parser = ArgumentParser(description="Exports concept and statement support to memory-mapped tables")
+    parser.add_argument("-c", "--collections", nargs="+", default=[GLOBAL_DB_DOCUMENT_COLLECTION])
+    args = parser.parse_args()
+    compute_support_tables(args.collections)
+
+
+if __name__ == "__main__":
+    main()
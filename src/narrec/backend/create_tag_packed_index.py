@@ -0,0 +1,64 @@
+import ast
+from argparse import ArgumentParser
+from datetime import datetime
+
+from sqlalchemy import delete
+from tqdm import tqdm
+
+from kgextractiontoolbox.backend.models import BULK_INSERT_AFTER_K
+from narraint.backend.models import TagInvertedIndex
+from narraint.config import QUERY_YIELD_PER_K
+from narrec.backend.database import SessionRecommender
+from narrec.backend.models import TagInvertedIndexPacked
+from narrec.backend.postings import encode_postings
+from narrec.config import GLOBAL_DB_DOCUMENT_COLLECTION
+
+
+def compute_packed_tag_inverted_index(collections: [str]):
+    """
+    Converts the TagInvertedIndex (document ids as JSON text) into the TagInvertedIndexPacked table (encoded
+    postings, see backend/postings.py)
+    :param collections: the document collections to convert
+    """
+    start_time = datetime.now()
+    session = SessionRecommender.get()
+
+    for collection in collections:
+        print(f'Deleting old packed inverted index for tags ({collection})...')
+        stmt = delete(TagInvertedIndexPacked).where(TagInvertedIndexPacked.document_collection == collection)
+        session.execute(stmt)
+        session.commit()
+
+        total = session.query(TagInvertedIndex).filter(TagInvertedIndex.document_collection == collection).count()
+        q = session.query(TagInvertedIndex).filter(TagInvertedIndex.document_collection == collection)
+
+        insert_list = []
+        for row in tqdm(q.yield_per(QUERY_YIELD_PER_K), desc=f"Converting tag postings ({collection})...",
+                        total=total):
+            document_ids = [int(d) for d in ast.literal_eval(row.document_ids)]
+            insert_list.append(dict(entity_id=row.entity_id,
+                                    document_collection=collection,
+                                    support=len(document_ids),
+                                    document_ids=encode_postings(document_ids)))
+            if len(insert_list) >= BULK_INSERT_AFTER_K:
+                # a commit would close the server-side cursor of the streamed query
+                TagInvertedIndexPacked.bulk_insert_values_into_table(session, insert_list, check_constraints=False,
+                                                                     commit=False)
+                insert_list.clear()
+
+        TagInvertedIndexPacked.bulk_insert_values_into_table(session, insert_list, check_constraints=False)
+        insert_list.clear()
+        session.commit()
+
+    print(f"Packed tag inverted index table created. Took me {datetime.now() - start_time} minutes.")
+
+
+def main():
+    parser = ArgumentParser(description="Converts the tag inverted index into encoded postings")
+    parser.add_argument("-c", "--collections", nargs="+", default=[GLOBAL_DB_DOCUMENT_COLLECTION])
+    args = parser.parse_args()
+    compute_packed_tag_inverted_index(args.collections)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+from datetime import datetime
+
+from tqdm import tqdm
+
+from narraint.backend.database import SessionExtended
+from narraint.backend.models import TagInvertedIndex, PredicationInvertedIndex
+from narrec.config import VOCABULARY_PATH, GLOBAL_DB_DOCUMENT_COLLECTION
+from narrec.document.vocabulary import NarrativeVocabulary
+
+
+def compute_vocabulary(collection=GLOBAL_DB_DOCUMENT_COLLECTION):
+    start_time = datetime.now()
+    session = SessionExtended.get()
+
+    concepts = set()
+    relations = set()
+    print('Collecting concepts from the tag inverted index...')
+    q = session.query(TagInvertedIndex.entity_id).filter(TagInvertedIndex.document_collection == collection)
+    for row in tqdm(q):
+        concepts.add(row.entity_id)
+
+    print('Collecting concepts and relations from the predication inverted index...')
+    q = session.query(PredicationInvertedIndex.subject_id, PredicationInvertedIndex.relation,
+                      PredicationInvertedIndex.object_id)
+    q = q.filter(PredicationInvertedIndex.document_collection == collection)
+    for row in tqdm(q):
+        concepts.add(row.subject_id)
+        concepts.add(row.object_id)
+        relations.add(row.relation)
+
+    # sort the entries to have a deterministic mapping
+    vocabulary = NarrativeVocabulary()
+    for concept in sorted(concepts):
+        vocabulary.concepts.add(concept)
+    for relation in sorted(relations):
+        vocabulary.relations.add(relation)
+
+    print(f'{len(vocabulary.concepts)} concepts and {len(vocabulary.relations)} relations found')
+    vocabulary.save(VOCABULARY_PATH)
+    print(f'Vocabulary written to {VOCABULARY_PATH}. Took me {datetime.now() - start_time} minutes.')
+
+
+def main():
+    compute_vocabulary()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
+from sqlalchemy import inspect
 from sqlalchemy.orm.scoping import ScopedSession
 
+from kgextractiontoolbox.backend.database import Session
 from narraint.backend.database import SessionExtended
 from narrec.backend.models import Recommender
 from narrec.config import BACKEND_CONFIG
 
+# sessions inherited from the parent process (see dispose_inherited_sessions)
+_inherited_sessions = []
+
 
 class SessionRecommender(SessionExtended):
     is_sqlite = False
@@ -19,3 +24,37 @@ class SessionRecommender(SessionExtended):
             SessionRecommender.is_postgres = cls._instance.is_postgres
             SessionRecommender.is_sqlite = cls._instance.is_sqlite
         return SessionRecommender._instance_recommender
+
+
+def has_table(session, model) -> bool:
+    """
+    Checks whether the table of a model exists in the database of a session
+    (e.g., index tables of the recommender that were not created in older databases)
+    :param session: a session
+    :param model: a model class
+    :return: True if the table exists
+    """
+    return inspect(session.get_bind()).has_table(model.__tablename__)
+
+
+def dispose_inherited_sessions():
+    """
+    Drops the sessions that a forked process inherited from its parent (to be called in the forked process)
+    The connections of the inherited engines belong to the parent process: they are neither used nor closed
+    (dispose with close=False), so the parent can continue to use them. Sessions that are requested afterwards
+    open new connections.
+    """
+    for cls, attribute in [(Session, '_instance'), (SessionExtended, '_instance'),
+                           (SessionRecommender, '_instance_recommender')]:
+        # only reset the singletons that are defined by the class itself (and not inherited)
+        session = cls.__dict__.get(attribute)
+        if session is not None:
+            engine = session.get_bind()
+            try:
+                engine.dispose(close=False)
+            except TypeError:
+                # SQLAlchemy < 1.4.33 does not support close: replace the pool without touching its connections
+                engine.pool = engine.pool.recreate()
+            # keep the session alive: collecting it would reset its connection (which is still used by the parent)
+            _inherited_sessions.append(session)
+            setattr(cls, attribute, None)
@@ -0,0 +1,111 @@
+import os
+import pickle
+import sqlite3
+import zlib
+from typing import List, Dict
+
+from kgextractiontoolbox.document.document import TaggedEntity
+from kgextractiontoolbox.document.narrative_document import NarrativeDocument, StatementExtraction
+from narrec.config import DOCUMENT_STORE_PATH
+
+STORE_QUERY_CHUNK_SIZE = 500
+# must be increased if the stored document data changes (e.g., serialization, gene translation or statement filter)
+DOCUMENT_STORE_FORMAT_VERSION = 1
+
+
+def serialize_document(document: NarrativeDocument) -> bytes:
+    # only store plain tuples to be independent of the class layout
+    tags = [(t.start, t.end, t.ent_id, t.ent_type, t.text) for t in document.tags]
+    statements = [(s.subject_id, s.subject_type, s.subject_str, s.predicate, s.relation,
+                   s.object_id, s.object_type, s.object_str, s.sentence_id, s.confidence)
+                  for s in document.extracted_statements
+                  if s.relation and s.subject_type != s.object_type]
+    data = (document.id, document.title, document.abstract, tags, statements)
+    return zlib.compress(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def deserialize_document(blob: bytes) -> NarrativeDocument:
+    doc_id, title, abstract, tags, statements = pickle.loads(zlib.decompress(blob))
+    document = NarrativeDocument(document_id=doc_id, title=title, abstract=abstract)
+    document.tags = [TaggedEntity(document=doc_id, start=start, end=end, ent_id=ent_id, ent_type=ent_type, text=text)
+                     for start, end, ent_id, ent_type, text in tags]
+    document.extracted_statements = [StatementExtraction(subject_id=s_id, subject_type=s_type, subject_str=s_str,
+                                                         predicate=predicate, relation=relation,
+                                                         object_id=o_id, object_type=o_type, object_str=o_str,
+                                                         sentence_id=sentence_id, confidence=confidence)
+                                     for s_id, s_type, s_str, predicate, relation, o_id, o_type, o_str,
+                                     sentence_id, confidence in statements]
+    return document
+
+
+class DocumentStore:
+    """
+    Persistent store (SQLite file) for hydrated documents keyed by (collection fingerprint, collection, document id)
+    Documents are stored with translated gene tags and filtered statements, so they can be
+    used without querying the database again. The fingerprint identifies the state of the collection in the
+    database (see compute_collection_fingerprint), so documents of an outdated database are never returned.
+    """
+
+    def __init__(self, path: str = DOCUMENT_STORE_PATH):
+        self.path = path
+        self.__connection = None
+        self.__pid = None
+
+    def __get_connection(self):
+        # connections must not be shared between processes
+        if self.__connection is None or self.__pid != os.getpid():
+            self.__connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            self.__connection.execute('PRAGMA journal_mode=WAL')
+            columns = {row[1] for row in self.__connection.execute('PRAGMA table_info(document)')}
+            if columns and 'fingerprint' not in columns:
+                # stores of older versions do not know the state of their documents
+                self.__connection.execute('DROP TABLE document')
+            self.__connection.execute('CREATE TABLE IF NOT EXISTS document ('
+                                      'fingerprint TEXT NOT NULL, '
+                                      'collection TEXT NOT NULL, '
+                                      'document_id INTEGER NOT NULL, '
+                                      'data BLOB NOT NULL, '
+                                      'PRIMARY KEY (fingerprint, collection, document_id)) WITHOUT ROWID')
+            self.__connection.commit()
+            self.__pid = os.getpid()
+        return self.__connection
+
+    def get_documents(self, document_ids: [int], document_collection: str,
+                      fingerprint: str) -> Dict[int, NarrativeDocument]:
+        connection = self.__get_connection()
+        document_ids = sorted(document_ids)
+        result = {}
+        for i in range(0, len(document_ids), STORE_QUERY_CHUNK_SIZE):
+            chunk = document_ids[i:i + STORE_QUERY_CHUNK_SIZE]
+            q = (f'SELECT document_id, data FROM document WHERE fingerprint = ? AND collection = ? '
+                 f'AND document_id IN ({",".join("?" * len(chunk))})')
+            for doc_id, blob in connection.execute(q, [fingerprint, document_collection] + chunk):
+                result[doc_id] = deserialize_document(blob)
+        return result
+
+    def put_documents(self, documents: List[NarrativeDocument], document_collection: str, fingerprint: str):
+        connection = self.__get_connection()
+        values = [(fingerprint, document_collection, d.id, serialize_document(d)) for d in documents]
+        connection.executemany('INSERT OR REPLACE INTO document (fingerprint, collection, document_id, data) '
+                               'VALUES (?, ?, ?, ?)', values)
+        connection.commit()
+
+    def count(self, document_collection: str, fingerprint: str) -> int:
+        connection = self.__get_connection()
+        return connection.execute('SELECT COUNT(*) FROM document WHERE fingerprint = ? AND collection = ?',
+                                  (fingerprint, document_collection)).fetchone()[0]
+
+    def invalidate(self, document_collection: str, fingerprint: str):
+        # removes all documents of the collection that were stored for a different state of the database
+        connection = self.__get_connection()
+        connection.execute('DELETE FROM document WHERE collection = ? AND fingerprint != ?',
+                           (document_collection, fingerprint))
+        connection.commit()
+
+    def clear(self, document_collection: str = None):
+        connection = self.__get_connection()
+        if document_collection:
+            connection.execute('DELETE FROM document WHERE collection = ?', (document_collection,))
+        else:
+            connection.execute('DELETE FROM document')
+        connection.commit()
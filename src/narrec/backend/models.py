@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, ForeignKeyConstraint
+from sqlalchemy import Column, String, Integer, ForeignKeyConstraint, LargeBinary
 
 from narraint.backend.models import Extended, DatabaseTable
 
@@ -36,4 +36,43 @@ class NodeInvertedIndex(Extended, DatabaseTable):
     entity_id = Column(String, nullable=False, index=True, primary_key=True)
     document_collection = Column(String, nullable=False, index=True, primary_key=True)
     support = Column(Integer, nullable=False)
-    document_ids = Column(String, nullable=False)
\ No newline at end of file
+    document_ids = Column(String, nullable=False)
+
+
+class NodeInvertedIndexPacked(Extended, DatabaseTable):
+    """
+    Same content as NodeInvertedIndex, but the document ids are stored as encoded postings (backend/postings.py)
+    """
+    __tablename__ = "node_inverted_index_packed"
+
+    entity_id = Column(String, nullable=False, index=True, primary_key=True)
+    document_collection = Column(String, nullable=False, index=True, primary_key=True)
+    support = Column(Integer, nullable=False)
+    document_ids = Column(LargeBinary, nullable=False)
+
+
+class TagInvertedIndexPacked(Extended, DatabaseTable):
+    """
+    Same content as TagInvertedIndex, but the document ids are stored as encoded postings (backend/postings.py)
+    """
+    __tablename__ = "tag_inverted_index_packed"
+
+    entity_id = Column(String, nullable=False, index=True, primary_key=True)
+    document_collection = Column(String, nullable=False, index=True, primary_key=True)
+    support = Column(Integer, nullable=False)
+    document_ids = Column(LargeBinary, nullable=False)
+
+
+class NodePairInvertedIndex(Extended, DatabaseTable):
+    """
+    Maps an unordered node pair to the documents that contain a statement between both nodes (any relation and
+    direction). The pair is stored in sorted order (node_a <= node_b), the document ids as encoded postings
+    (backend/postings.py)
+    """
+    __tablename__ = "node_pair_inverted_index"
+
+    node_a = Column(String, nullable=False, index=True, primary_key=True)
+    node_b = Column(String, nullable=False, index=True, primary_key=True)
+    document_collection = Column(String, nullable=False, index=True, primary_key=True)
+    support = Column(Integer, nullable=False)
+    document_ids = Column(LargeBinary, nullable=False)
@@ -0,0 +1,111 @@
+import numpy as np
+
+# the first byte of an encoded postings list identifies the codec
+CODEC_RAW32 = 1
+CODEC_RAW64 = 2
+CODEC_DELTA_VARINT = 3
+
+INT32_MAX = 2 ** 31 - 1
+
+
+def encode_postings(document_ids, codec: int = CODEC_DELTA_VARINT) -> bytes:
+    """
+    Encodes a postings list as bytes
+    CODEC_DELTA_VARINT stores the gaps between the sorted ids as varints (7 bits per byte, the high bit marks
+    a continuation). CODEC_RAW32 / CODEC_RAW64 store the sorted ids as little-endian integers, which can be
+    decoded without a copy.
+    :param document_ids: an iterable of non-negative integer document ids
+    :param codec: the codec
+    :return: the encoded postings
+    """
+    if not isinstance(document_ids, np.ndarray):
+        document_ids = np.fromiter(document_ids, dtype=np.int64)
+    document_ids = np.unique(document_ids.astype(np.int64, copy=False))
+    if len(document_ids) > 0 and document_ids[0] < 0:
+        raise ValueError('Postings must not contain negative document ids')
+
+    if codec == CODEC_RAW32:
+        if len(document_ids) > 0 and document_ids[-1] > INT32_MAX:
+            raise ValueError('Document ids exceed the range of CODEC_RAW32')
+        return bytes([codec]) + document_ids.astype('<i4').tobytes()
+    if codec == CODEC_RAW64:
+        return bytes([codec]) + document_ids.astype('<i8').tobytes()
+    if codec != CODEC_DELTA_VARINT:
+        raise ValueError(f'Unknown postings codec: {codec}')
+
+    gaps = np.diff(document_ids, prepend=0).astype(np.uint64)
+    # number of bytes per gap (at least one)
+    byte_counts = np.ones(len(gaps), dtype=np.int64)
+    for shift in range(7, 64, 7):
+        byte_counts += gaps >= (np.uint64(1) << np.uint64(shift))
+    offsets = np.cumsum(byte_counts) - byte_counts
+    data = np.zeros(int(byte_counts.sum()) + 1, dtype=np.uint8)
+    data[0] = codec
+    for i in range(int(byte_counts.max()) if len(gaps) else 0):
+        has_byte = byte_counts > i
+        values = (gaps[has_byte] >> np.uint64(7 * i)) & np.uint64(0x7f)
+        # continuation bit for all but the last byte of a gap
+        values |= np.where(byte_counts[has_byte] > i + 1, np.uint64(0x80), np.uint64(0))
+        data[offsets[has_byte] + i + 1] = values.astype(np.uint8)
+    return data.tobytes()
+
+
+def decode_postings(data) -> np.ndarray:
+    """
+    Decodes a postings list
+    :param data: the encoded postings (bytes or memoryview)
+    :return: a sorted array of document ids (a read-only view on data for the raw codecs, int64 otherwise)
+    """
+    codec = data[0]
+    if codec == CODEC_RAW32:
+        return np.frombuffer(data, dtype='<i4', offset=1)
+    if codec == CODEC_RAW64:
+        return np.frombuffer(data, dtype='<i8', offset=1)
+    if codec != CODEC_DELTA_VARINT:
+        raise ValueError(f'Unknown postings codec: {codec}')
+
+    data = np.frombuffer(data, dtype=np.uint8, offset=1)
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.int64)
+    # the last byte of every gap has no continuation bit
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.empty(len(ends), dtype=np.int64)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    shifts = (np.arange(len(data), dtype=np.int64) - np.repeat(starts, ends - starts + 1)) * 7
+    parts = (data & 0x7f).astype(np.uint64) << shifts.astype(np.uint64)
+    gaps = np.add.reduceat(parts, starts)
+    return np.cumsum(gaps).astype(np.int64)
+
+
+def merge_postings(postings: [np.ndarray]) -> np.ndarray:
+    """
+    :param postings: a list of sorted document id arrays
+    :return: the sorted union of all postings (int64)
+    """
+    if len(postings) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if len(postings) == 1:
+        return postings[0].astype(np.int64)
+    return np.unique(np.concatenate(postings).astype(np.int64, copy=False))
+
+
+def contained_mask(document_ids: np.ndarray, allowed_document_ids: np.ndarray) -> np.ndarray:
+    """
+    :param document_ids: an array of document ids (any order)
+    :param allowed_document_ids: a sorted array of document ids
+    :return: a boolean mask that is true for the document ids that are contained in allowed_document_ids
+    """
+    if len(document_ids) == 0 or len(allowed_document_ids) == 0:
+        return np.zeros(len(document_ids), dtype=bool)
+    positions = np.minimum(np.searchsorted(allowed_document_ids, document_ids), len(allowed_document_ids) - 1)
+    return allowed_document_ids[positions] == document_ids
+
+
+def filter_postings(document_ids: np.ndarray, allowed_document_ids: np.ndarray) -> np.ndarray:
+    """
+    :param document_ids: a sorted array of document ids
+    :param allowed_document_ids: a sorted array of the document ids to keep
+    :return: the document ids that are contained in allowed_document_ids
+    """
+    return document_ids[contained_mask(document_ids, allowed_document_ids)]
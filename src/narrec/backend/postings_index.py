@@ -0,0 +1,315 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from narrec.backend.postings import merge_postings, contained_mask
+from narrec.backend.support_table import hash_key, STATEMENT_SEPARATOR
+from narrec.config import POSTINGS_INDEX_DIR, GLOBAL_DB_DOCUMENT_COLLECTION
+
+META_FILE = "meta.json"
+INT32_MAX = 2 ** 31 - 1
+# benchmark-scoped views are stored below the collection directory of the index
+SCOPE_DIR = "benchmarks"
+# number of postings that are restricted at once
+SCOPE_BLOCK_POSTINGS = 10000000
+
+# fields of the postings index (one per DB table)
+FIELD_CONCEPT = "concept"  # TagInvertedIndex
+FIELD_NODE = "node"  # NodeInvertedIndex
+FIELD_NODE_PAIR = "node_pair"  # PredicationInvertedIndex (unordered subject / object pair)
+FIELD_CONCEPT_SCORED = "concept_scored"  # TagInvertedIndexScored (value columns: tf, score)
+
+
+def node_pair_to_term(concept_a: str, concept_b: str) -> str:
+    # the direction of a statement is ignored
+    if concept_a > concept_b:
+        concept_a, concept_b = concept_b, concept_a
+    return STATEMENT_SEPARATOR.join([concept_a, concept_b])
+
+
+def write_postings_segment(directory: str, term2postings: Dict[str, np.ndarray],
+                           term2values: Dict[str, Dict[str, np.ndarray]] = None):
+    """
+    Writes a segment of the postings index (term dictionary + concatenated postings as .npy files)
+    The term dictionary consists of the sorted 64-bit term hashes and the offsets of their postings.
+    The document ids of a term are sorted and unique. Value columns (e.g., scores) are aligned with the postings.
+    :param directory: the segment directory
+    :param term2postings: a dictionary mapping a term to its document ids
+    :param term2values: a dictionary mapping a term to its value columns (column name -> values aligned with the
+                        document ids of the term), or None
+    """
+    os.makedirs(directory, exist_ok=True)
+    terms = list(term2postings)
+    hashes = np.fromiter((hash_key(t) for t in terms), dtype=np.uint64, count=len(terms))
+    order = np.argsort(hashes, kind="stable")
+    hashes = hashes[order]
+    if len(hashes) > 1 and np.any(hashes[1:] == hashes[:-1]):
+        raise ValueError(f'Hash collision in postings segment {directory} - cannot write segment')
+
+    columns = sorted(next(iter(term2values.values())).keys()) if term2values else []
+    postings, values = [], {c: [] for c in columns}
+    offsets = [0]
+    for idx in order.tolist():
+        term = terms[idx]
+        document_ids = np.asarray(term2postings[term], dtype=np.int64)
+        positions = np.argsort(document_ids, kind="stable")
+        document_ids = document_ids[positions]
+        if len(document_ids) > 1 and np.any(document_ids[1:] == document_ids[:-1]):
+            raise ValueError(f'Postings of term {term} contain duplicated document ids')
+        postings.append(document_ids)
+        for c in columns:
+            values[c].append(np.asarray(term2values[term][c], dtype=np.float64)[positions])
+        offsets.append(offsets[-1] + len(document_ids))
+
+    postings = np.concatenate(postings) if postings else np.zeros(0, dtype=np.int64)
+    values = {c: np.concatenate(values[c]) if values[c] else np.zeros(0, dtype=np.float64) for c in columns}
+    # the creation time identifies the segment (see PostingsIndex.scoped_to_benchmark)
+    write_segment_arrays(directory, hashes, np.array(offsets, dtype=np.int64), postings, values,
+                         created=datetime.now().isoformat())
+
+
+def write_segment_arrays(directory: str, term_hashes: np.ndarray, offsets: np.ndarray, postings: np.ndarray,
+                         values: Dict[str, np.ndarray], **meta):
+    """
+    Writes the arrays of a segment (see write_postings_segment)
+    :param directory: the segment directory
+    :param term_hashes: the sorted term hashes
+    :param offsets: the offsets of the postings of each term (len(term_hashes) + 1 entries)
+    :param postings: the concatenated postings
+    :param values: the value columns (aligned with postings)
+    :param meta: additional entries of the meta file
+    """
+    os.makedirs(directory, exist_ok=True)
+    # PubMed ids fit into 32 bits, which halves the size of the postings
+    if len(postings) == 0 or postings.max() <= INT32_MAX:
+        postings = postings.astype(np.int32)
+    np.save(os.path.join(directory, 'terms.npy'), term_hashes)
+    np.save(os.path.join(directory, 'offsets.npy'), offsets)
+    np.save(os.path.join(directory, 'postings.npy'), postings)
+    for c, column_values in values.items():
+        np.save(os.path.join(directory, f'values_{c}.npy'), column_values)
+    # the meta file is written last and marks the segment as complete
+    with open(os.path.join(directory, META_FILE), 'wt') as f:
+        json.dump(dict(terms=len(term_hashes), postings=len(postings), columns=sorted(values), **meta), f)
+
+
+class PostingsSegment:
+
+    def __init__(self, directory: str, meta: dict):
+        self.directory = directory
+        self.meta = meta
+        self.columns = meta["columns"]
+        self.terms = np.load(os.path.join(directory, 'terms.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(directory, 'offsets.npy'), mmap_mode='r')
+        self.postings = np.load(os.path.join(directory, 'postings.npy'), mmap_mode='r')
+        self.__values = {}
+
+    def values(self, column: str) -> np.ndarray:
+        # value columns are memory-mapped on first access
+        if column not in self.__values:
+            self.__values[column] = np.load(os.path.join(self.directory, f'values_{column}.npy'), mmap_mode='r')
+        return self.__values[column]
+
+    def find(self, term_hashes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Looks up several terms at once (one vectorised binary search over the term dictionary)
+        :param term_hashes: the hashes of the terms
+        :return: the start and end offsets of the postings (start == end for unknown terms)
+        """
+        if len(self.terms) == 0:
+            empty = np.zeros(len(term_hashes), dtype=np.int64)
+            return empty, empty
+        positions = np.minimum(np.searchsorted(self.terms, term_hashes), len(self.terms) - 1)
+        found = self.terms[positions] == term_hashes
+        starts = np.where(found, self.offsets[positions], 0)
+        ends = np.where(found, self.offsets[positions + 1], 0)
+        return starts, ends
+
+
+class PostingsIndex:
+    """
+    Read-only, file-based inverted index for the first stages (see backend/create_postings_index.py)
+    Each field (concept, node, node pair, ...) consists of one or more segments. A segment stores a term
+    dictionary (sorted 64-bit term hashes) and the postings of its terms as memory-mapped arrays, so lookups
+    need no database and all processes share the same physical pages. A term may occur in several segments,
+    its postings are merged at lookup time.
+    A benchmark-scoped view (see scoped_to_benchmark) only contains the documents of a benchmark.
+    """
+
+    def __init__(self, directory: str = POSTINGS_INDEX_DIR, collection: str = GLOBAL_DB_DOCUMENT_COLLECTION,
+                 scope: str = None):
+        """
+        :param directory: the base directory of the postings index
+        :param collection: the document collection
+        :param scope: the name of a benchmark to load its scoped view (None loads the full index)
+        """
+        self.base_directory = directory
+        self.collection = collection
+        self.scope = scope
+        self.directory = os.path.join(directory, collection)
+        if scope:
+            self.directory = os.path.join(self.directory, SCOPE_DIR, scope)
+        self.field2segments = {}
+        if os.path.isdir(self.directory):
+            for field in sorted(os.listdir(self.directory)):
+                field_dir = os.path.join(self.directory, field)
+                if field == SCOPE_DIR or not os.path.isdir(field_dir):
+                    continue
+                segments = []
+                for name in sorted(os.listdir(field_dir)):
+                    meta_path = os.path.join(field_dir, name, META_FILE)
+                    if os.path.isfile(meta_path):
+                        with open(meta_path, 'rt') as f:
+                            segments.append(PostingsSegment(os.path.join(field_dir, name), json.load(f)))
+                if segments:
+                    self.field2segments[field] = segments
+        logging.info(f'Postings index with fields {list(self.field2segments)} loaded from {self.directory}')
+
+    def has_field(self, field: str) -> bool:
+        return field in self.field2segments
+
+    def get_postings_many(self, field: str, terms: [str]) -> List[np.ndarray]:
+        """
+        :param field: the field of the index
+        :param terms: a list of terms
+        :return: a list of sorted document id arrays (aligned with terms, empty arrays for unknown terms)
+        """
+        term2postings = [[] for _ in terms]
+        if not terms:
+            return []
+        term_hashes = np.fromiter((hash_key(t) for t in terms), dtype=np.uint64, count=len(terms))
+        for segment in self.field2segments.get(field, []):
+            starts, ends = segment.find(term_hashes)
+            for idx in np.flatnonzero(ends > starts).tolist():
+                term2postings[idx].append(segment.postings[starts[idx]:ends[idx]])
+        return [merge_postings(p) for p in term2postings]
+
+    def get_postings(self, field: str, term: str) -> np.ndarray:
+        """
+        :param field: the field of the index
+        :param term: a term (concept id or node pair, see node_pair_to_term)
+        :return: the sorted document ids of the term
+        """
+        return self.get_postings_many(field, [term])[0]
+
+    def get_postings_with_values_many(self, field: str, terms: [str],
+                                      column: str) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        :param field: the field of the index
+        :param terms: a list of terms
+        :param column: the name of a value column (e.g., score)
+        :return: a list of document id arrays and aligned value arrays (aligned with terms, concatenated over all
+                 segments, empty arrays for unknown terms)
+        """
+        if not terms:
+            return []
+        term2document_ids, term2values = [[] for _ in terms], [[] for _ in terms]
+        term_hashes = np.fromiter((hash_key(t) for t in terms), dtype=np.uint64, count=len(terms))
+        for segment in self.field2segments.get(field, []):
+            starts, ends = segment.find(term_hashes)
+            for idx in np.flatnonzero(ends > starts).tolist():
+                term2document_ids[idx].append(segment.postings[starts[idx]:ends[idx]])
+                term2values[idx].append(segment.values(column)[starts[idx]:ends[idx]])
+        result = []
+        for document_ids, values in zip(term2document_ids, term2values):
+            if not document_ids:
+                result.append((np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)))
+            else:
+                result.append((np.concatenate(document_ids).astype(np.int64, copy=False),
+                               np.concatenate(values).astype(np.float64, copy=False)))
+        return result
+
+    def get_postings_with_values(self, field: str, term: str, column: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param field: the field of the index
+        :param term: a term
+        :param column: the name of a value column (e.g., score)
+        :return: the document ids of the term and the aligned values (concatenated over all segments)
+        """
+        return self.get_postings_with_values_many(field, [term], column)[0]
+
+    def scoped_to_benchmark(self, benchmark):
+        """
+        Restricts the postings to the documents of a benchmark (Benchmark.get_document_array_for_baseline)
+        The view is computed once per benchmark and segment and cached on disk. It is recomputed if the
+        benchmark documents or the segments of the full index change.
+        :param benchmark: a Benchmark
+        :return: a PostingsIndex that only contains benchmark documents (self if the benchmark is not restricted)
+        """
+        if self.scope or benchmark.document_collection != self.collection:
+            return self
+        document_ids = benchmark.get_document_array_for_baseline()
+        if document_ids is None:
+            return self
+
+        fingerprint = hashlib.blake2b(document_ids.tobytes(), digest_size=16).hexdigest()
+        scope_dir = os.path.join(self.directory, SCOPE_DIR, benchmark.name)
+        # remove fields that do not exist in the full index anymore
+        if os.path.isdir(scope_dir):
+            for field in os.listdir(scope_dir):
+                if field not in self.field2segments:
+                    shutil.rmtree(os.path.join(scope_dir, field))
+        for field, segments in self.field2segments.items():
+            for segment in segments:
+                target_dir = os.path.join(scope_dir, field, os.path.basename(segment.directory))
+                meta_path = os.path.join(target_dir, META_FILE)
+                if os.path.isfile(meta_path):
+                    with open(meta_path, 'rt') as f:
+                        meta = json.load(f)
+                    if meta.get("fingerprint") == fingerprint and meta.get("source") == segment.meta:
+                        continue
+                    shutil.rmtree(target_dir)
+                restrict_segment(segment, document_ids, target_dir, fingerprint=fingerprint, source=segment.meta)
+            # remove segments that do not exist in the full index anymore (e.g., after a rebuild)
+            names = {os.path.basename(s.directory) for s in segments}
+            field_dir = os.path.join(scope_dir, field)
+            for name in os.listdir(field_dir):
+                if name not in names:
+                    shutil.rmtree(os.path.join(field_dir, name))
+        logging.info(f'Postings restricted to {len(document_ids)} documents of benchmark {benchmark.name}')
+        return PostingsIndex(directory=self.base_directory, collection=self.collection, scope=benchmark.name)
+
+
+def restrict_segment(segment: PostingsSegment, document_ids: np.ndarray, directory: str, **meta):
+    """
+    Writes a copy of a segment that only contains the given documents (terms without postings are dropped)
+    :param segment: the segment
+    :param document_ids: a sorted array of the documents to keep
+    :param directory: the target directory
+    :param meta: additional entries of the meta file
+    """
+    term_hashes, offsets, postings = [], [np.zeros(1, dtype=np.int64)], []
+    values = {c: [] for c in segment.columns}
+    total = 0
+    start_term, term_count = 0, len(segment.terms)
+    while start_term < term_count:
+        # a block of terms with about SCOPE_BLOCK_POSTINGS postings (at least one term)
+        end_term = int(np.searchsorted(segment.offsets, segment.offsets[start_term] + SCOPE_BLOCK_POSTINGS,
+                                       side='right')) - 1
+        end_term = min(max(end_term, start_term + 1), term_count)
+        start, end = int(segment.offsets[start_term]), int(segment.offsets[end_term])
+        mask = contained_mask(segment.postings[start:end], document_ids)
+        # number of kept postings of each term in the block
+        kept = np.concatenate(([0], np.cumsum(mask)))
+        counts = np.diff(kept[np.asarray(segment.offsets[start_term:end_term + 1]) - start])
+        has_postings = counts > 0
+        term_hashes.append(segment.terms[start_term:end_term][has_postings])
+        offsets.append(total + np.cumsum(counts[has_postings]))
+        total += int(counts.sum())
+        postings.append(segment.postings[start:end][mask])
+        for c in segment.columns:
+            values[c].append(segment.values(c)[start:end][mask])
+        start_term = end_term
+
+    write_segment_arrays(directory,
+                         np.concatenate(term_hashes) if term_hashes else np.zeros(0, dtype=np.uint64),
+                         np.concatenate(offsets).astype(np.int64),
+                         np.concatenate(postings).astype(np.int64) if postings else np.zeros(0, dtype=np.int64),
+                         {c: np.concatenate(v) if v else np.zeros(0, dtype=np.float64) for c, v in values.items()},
+                         **meta)
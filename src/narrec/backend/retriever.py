@@ -1,7 +1,10 @@
+import hashlib
+import json
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Set
 
-from sqlalchemy import and_
+from sqlalchemy import and_, select, func
 
 from kgextractiontoolbox.backend.database import Session
 from kgextractiontoolbox.backend.models import Document, DocumentTranslation, Tag, Predication
@@ -11,8 +14,13 @@ from kgextractiontoolbox.document.narrative_document import NarrativeDocument, S
 from narraint.backend.database import SessionExtended
 from narrant.entity.entityresolver import GeneResolver
 from narrant.entitylinking.enttypes import GENE
+from narrec.backend.cache import DocumentCache
+from narrec.backend.document_store import DocumentStore, DOCUMENT_STORE_FORMAT_VERSION
+from narrec.document.compact import CompactRecommenderDocument
 from narrec.document.document import RecommenderDocument
 
+BULK_RETRIEVAL_CHUNK_SIZE_DEFAULT = 1000
+
 
 def retrieve_narrative_documents_from_database_small(session, document_ids: Set[int], document_collection: str) \
         -> List[NarrativeDocument]:
@@ -83,6 +91,141 @@ def retrieve_narrative_documents_from_database_small(session, document_ids: Set[
     return list(doc_results.values())
 
 
+def chunk_document_ids(document_ids: Set[int], chunk_size: int) -> List[List[int]]:
+    document_ids = sorted(document_ids)
+    return [document_ids[i:i + chunk_size] for i in range(0, len(document_ids), chunk_size)]
+
+
+def query_document_rows(connection, chunks: List[List[int]], document_collection: str) -> List[tuple]:
+    """
+    Queries (id, title, abstract) rows for all chunks without materializing ORM objects
+    :param connection: a SQLAlchemy connection
+    :param chunks: a list of document id chunks
+    :param document_collection: the corresponding document collection
+    :return: a list of result rows
+    """
+    rows = []
+    for chunk in chunks:
+        q = select(Document.id, Document.title, Document.abstract)
+        q = q.where(and_(Document.collection == document_collection, Document.id.in_(chunk)))
+        rows.extend(connection.execution_options(stream_results=True).execute(q))
+    return rows
+
+
+def query_tag_rows(connection, chunks: List[List[int]], document_collection: str) -> List[tuple]:
+    """
+    Queries (document_id, start, end, ent_id, ent_type, ent_str) rows for all chunks
+    :param connection: a SQLAlchemy connection
+    :param chunks: a list of document id chunks
+    :param document_collection: the corresponding document collection
+    :return: a list of result rows
+    """
+    rows = []
+    for chunk in chunks:
+        q = select(Tag.document_id, Tag.start, Tag.end, Tag.ent_id, Tag.ent_type, Tag.ent_str)
+        q = q.where(and_(Tag.document_collection == document_collection, Tag.document_id.in_(chunk)))
+        rows.extend(connection.execution_options(stream_results=True).execute(q))
+    return rows
+
+
+def query_predication_rows(connection, chunks: List[List[int]], document_collection: str) -> List[tuple]:
+    """
+    Queries all statement extraction rows (with a relation) for all chunks
+    :param connection: a SQLAlchemy connection
+    :param chunks: a list of document id chunks
+    :param document_collection: the corresponding document collection
+    :return: a list of result rows
+    """
+    rows = []
+    for chunk in chunks:
+        q = select(Predication.document_id, Predication.subject_id, Predication.subject_type,
+                   Predication.subject_str, Predication.predicate, Predication.relation, Predication.object_id,
+                   Predication.object_type, Predication.object_str, Predication.sentence_id,
+                   Predication.confidence)
+        q = q.where(and_(Predication.document_collection == document_collection,
+                         Predication.document_id.in_(chunk),
+                         Predication.relation != None))
+        rows.extend(connection.execution_options(stream_results=True).execute(q))
+    return rows
+
+
+def _run_query_on_own_connection(engine, query_function, chunks: List[List[int]], document_collection: str):
+    # every thread requires its own connection
+    with engine.connect() as connection:
+        return query_function(connection, chunks, document_collection)
+
+
+def retrieve_narrative_documents_from_database_bulk(session, document_ids: Set[int], document_collection: str,
+                                                    chunk_size: int = BULK_RETRIEVAL_CHUNK_SIZE_DEFAULT) \
+        -> List[NarrativeDocument]:
+    """
+    Retrieves a set of Narrative Documents from the database
+    Document ids are queried in chunks by column-only selects. Documents, tags and statement extractions
+    are fetched concurrently on separate connections.
+    :param session: the current session
+    :param document_ids: a set of document ids
+    :param document_collection: the corresponding document collection
+    :param chunk_size: the number of document ids per IN (...) query
+    :return: a list of NarrativeDocuments
+    """
+    chunks = chunk_document_ids(document_ids, chunk_size)
+    engine = session.get_bind()
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        doc_future = executor.submit(_run_query_on_own_connection, engine, query_document_rows, chunks,
+                                     document_collection)
+        tag_future = executor.submit(_run_query_on_own_connection, engine, query_tag_rows, chunks,
+                                     document_collection)
+        es_future = executor.submit(_run_query_on_own_connection, engine, query_predication_rows, chunks,
+                                    document_collection)
+        doc_rows, tag_rows, es_rows = doc_future.result(), tag_future.result(), es_future.result()
+
+    doc_results = {}
+    for d_id, title, abstract in doc_rows:
+        doc_results[d_id] = NarrativeDocument(document_id=d_id, title=title, abstract=abstract)
+
+    if len(doc_results) != len(document_ids):
+        diff = set(document_ids) - doc_results.keys()
+        print(f'Did not retrieve all required {document_collection} documents (missed ids: {diff})')
+
+    tag_result = defaultdict(list)
+    for d_id, start, end, ent_id, ent_type, ent_str in tag_rows:
+        tag_result[d_id].append(TaggedEntity(document=d_id, start=start, end=end, ent_id=ent_id,
+                                             ent_type=ent_type, text=ent_str))
+    for doc_id, tags in tag_result.items():
+        if doc_id in doc_results:
+            doc_results[doc_id].tags = tags
+            doc_results[doc_id].sort_tags()
+
+    es_for_doc = defaultdict(list)
+    for d_id, s_id, s_type, s_str, predicate, relation, o_id, o_type, o_str, sentence_id, confidence in es_rows:
+        es_for_doc[d_id].append(StatementExtraction(subject_id=s_id, subject_type=s_type, subject_str=s_str,
+                                                    predicate=predicate, relation=relation,
+                                                    object_id=o_id, object_type=o_type, object_str=o_str,
+                                                    sentence_id=sentence_id, confidence=confidence))
+    for doc_id, extractions in es_for_doc.items():
+        if doc_id in doc_results:
+            doc_results[doc_id].extracted_statements = extractions
+
+    return list(doc_results.values())
+
+
+def compute_collection_fingerprint(session, document_collection: str) -> str:
+    """
+    Computes a fingerprint of the state of a document collection in the database
+    Re-extracting the database or adding tags (e.g., genes) creates new rows, so the largest document, tag and
+    predication ids change (all of them are answered by primary key indexes).
+    :param session: the current session
+    :param document_collection: the document collection
+    :return: a hex digest
+    """
+    max_document_id = session.query(func.max(Document.id)).filter(Document.collection == document_collection).scalar()
+    state = dict(version=DOCUMENT_STORE_FORMAT_VERSION, collection=document_collection,
+                 max_document_id=max_document_id,
+                 max_tag_id=session.query(func.max(Tag.id)).scalar(),
+                 max_predication_id=session.query(func.max(Predication.id)).scalar())
+    return hashlib.sha1(json.dumps(state, sort_keys=True).encode("utf-8")).hexdigest()
+
+
 class DocumentTranslator:
 
     def __init__(self):
@@ -126,11 +269,40 @@ class DocumentTranslator:
 
 class DocumentRetriever:
 
-    def __init__(self):
+    def __init__(self, bulk_retrieval=True, chunk_size=BULK_RETRIEVAL_CHUNK_SIZE_DEFAULT,
+                 cache_max_documents: int = None, cache_max_bytes: int = None, cache_factory=None,
+                 document_store: DocumentStore = None, compact_documents=False):
+        """
+        :param bulk_retrieval: query documents in chunks and concurrently
+        :param chunk_size: the number of document ids per query
+        :param cache_max_documents: maximum number of cached documents per collection (None = unbounded)
+        :param cache_max_bytes: maximum (estimated) size of cached documents per collection (None = unbounded)
+        :param cache_factory: optional callable that creates a cache (get/put/stats interface) per collection
+        :param document_store: optional persistent store which is read before querying the database
+        :param compact_documents: return memory-efficient CompactRecommenderDocuments
+        """
         self.__cache = {}
+        if cache_factory:
+            self.cache_factory = cache_factory
+        else:
+            self.cache_factory = lambda: DocumentCache(max_documents=cache_max_documents, max_bytes=cache_max_bytes)
+        self.bulk_retrieval = bulk_retrieval
+        self.chunk_size = chunk_size
+        self.document_store = document_store
+        # fingerprints of the collections that are read from the document store (computed on first use)
+        self.collection2fingerprint = {}
+        self.compact_documents = compact_documents
         self.translator = DocumentTranslator()
-        self.generesolver = GeneResolver()
-        self.generesolver.load_index()
+        # the gene resolver is only loaded if documents must be queried from the database
+        self.generesolver = None
+
+    def __get_collection_fingerprint(self, document_collection: str) -> str:
+        if document_collection not in self.collection2fingerprint:
+            fingerprint = compute_collection_fingerprint(Session.get(), document_collection)
+            # documents of an older state of the database are outdated
+            self.document_store.invalidate(document_collection, fingerprint)
+            self.collection2fingerprint[document_collection] = fingerprint
+        return self.collection2fingerprint[document_collection]
 
     def retrieve_document_ids_for_collection(self, document_collection: str):
         session = SessionExtended.get()
@@ -183,37 +355,74 @@ class DocumentRetriever:
         narrative_documents = []
 
         if document_collection not in self.__cache:
-            self.__cache[document_collection] = {}
+            self.__cache[document_collection] = self.cache_factory()
+        cache = self.__cache[document_collection]
 
         # look which documents have been cached
         for did in document_ids:
-            if did in self.__cache[document_collection]:
+            cached_doc = cache.get(did)
+            if cached_doc is not None:
                 found_ids.add(did)
-                narrative_documents.append(self.__cache[document_collection][did])
+                narrative_documents.append(cached_doc)
 
         remaining_document_ids = document_ids - found_ids
         if len(remaining_document_ids) == 0:
             return narrative_documents
+
+        # next look into the persistent document store
+        if self.document_store:
+            stored_documents = self.document_store.get_documents(remaining_document_ids, document_collection,
+                                                                 self.__get_collection_fingerprint(document_collection))
+            stored_documents = [self.__to_recommender_document(d) for d in stored_documents.values()]
+            for d in stored_documents:
+                cache.put(d.id, d)
+            narrative_documents.extend(stored_documents)
+            remaining_document_ids = remaining_document_ids - {d.id for d in stored_documents}
+            if len(remaining_document_ids) == 0:
+                return narrative_documents
+
         session = Session.get()
-        narrative_documents_queried = retrieve_narrative_documents_from_database_small(session=session,
-                                                                                       document_ids=remaining_document_ids,
-                                                                                       document_collection=document_collection)
+        if self.bulk_retrieval:
+            narrative_documents_queried = retrieve_narrative_documents_from_database_bulk(session=session,
+                                                                                          document_ids=remaining_document_ids,
+                                                                                          document_collection=document_collection,
+                                                                                          chunk_size=self.chunk_size)
+        else:
+            narrative_documents_queried = retrieve_narrative_documents_from_database_small(session=session,
+                                                                                           document_ids=remaining_document_ids,
+                                                                                           document_collection=document_collection)
         # Gene IDs are only present in the Tag table.
         # The rest work with gene symbols
         for doc in narrative_documents_queried:
             self.__translate_gene_ids_to_symbols(doc)
 
-        narrative_documents_queried = [RecommenderDocument(nd=d) for d in narrative_documents_queried]
+        if self.document_store:
+            self.document_store.put_documents(narrative_documents_queried, document_collection,
+                                              self.__get_collection_fingerprint(document_collection))
+
+        narrative_documents_queried = [self.__to_recommender_document(d) for d in narrative_documents_queried]
 
         # add to cache
         for d in narrative_documents_queried:
-            self.__cache[document_collection][d.id] = d
+            cache.put(d.id, d)
 
         # add them to list
         narrative_documents.extend(narrative_documents_queried)
         return narrative_documents
 
+    def __to_recommender_document(self, document: NarrativeDocument):
+        if self.compact_documents:
+            return CompactRecommenderDocument(RecommenderDocument(nd=document))
+        return RecommenderDocument(nd=document)
+
+    def get_cache_statistics(self) -> dict:
+        return {collection: cache.stats() for collection, cache in self.__cache.items()}
+
     def __translate_gene_ids_to_symbols(self, document: NarrativeDocument):
+        if not self.generesolver:
+            self.generesolver = GeneResolver()
+            self.generesolver.load_index()
+
         translated_gene_ids = []
         for tag in document.tags:
             # Gene IDs need a special handling
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+from narrec.config import SUPPORT_TABLE_DIR
+
+CONCEPT_TABLE = "concept"
+STATEMENT_TABLE = "statement"
+STATEMENT_SEPARATOR = "\x1f"
+
+
+def hash_key(value: str) -> int:
+    # stable 64-bit hash (Python's hash() is salted per process)
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def statement_to_key(statement: tuple) -> str:
+    return STATEMENT_SEPARATOR.join(statement)
+
+
+def get_support_table_dir(collections: [str], base_dir: str = SUPPORT_TABLE_DIR) -> str:
+    return os.path.join(base_dir, "_".join(sorted(collections)))
+
+
+def write_support_table(directory: str, name: str, key2support: dict):
+    """
+    Writes a support table as two aligned .npy arrays (sorted 64-bit key hashes and supports)
+    :param directory: target directory
+    :param name: name of the table (concept / statement)
+    :param key2support: a dictionary mapping a string key to its support
+    """
+    os.makedirs(directory, exist_ok=True)
+    hashes = np.fromiter((hash_key(k) for k in key2support), dtype=np.uint64, count=len(key2support))
+    supports = np.fromiter(key2support.values(), dtype=np.int64, count=len(key2support))
+    order = np.argsort(hashes, kind="stable")
+    hashes, supports = hashes[order], supports[order]
+    if len(hashes) > 1 and np.any(hashes[1:] == hashes[:-1]):
+        raise ValueError(f'Hash collision in support table {name} - cannot write table')
+
+    np.save(os.path.join(directory, f'{name}_keys.npy'), hashes)
+    np.save(os.path.join(directory, f'{name}_support.npy'), supports)
+    with open(os.path.join(directory, f'{name}.json'), 'wt') as f:
+        json.dump(dict(entries=len(hashes)), f)
+
+
+class SupportTable:
+    """
+    Read-only lookup of concept / statement supports
+    The arrays are memory-mapped, so that all processes share the same physical pages and loading takes no time.
+    A lookup is a binary search over the sorted key hashes.
+    """
+
+    def __init__(self, directory: str, name: str):
+        self.name = name
+        self.keys = np.load(os.path.join(directory, f'{name}_keys.npy'), mmap_mode='r')
+        self.supports = np.load(os.path.join(directory, f'{name}_support.npy'), mmap_mode='r')
+        logging.info(f'Support table {name} mapped ({len(self.keys)} entries)')
+
+    @staticmethod
+    def exists(directory: str, name: str) -> bool:
+        return os.path.isfile(os.path.join(directory, f'{name}_keys.npy'))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get(self, key: str, default: int = None) -> int:
+        key_hash = np.uint64(hash_key(key))
+        idx = int(np.searchsorted(self.keys, key_hash))
+        if idx < len(self.keys) and self.keys[idx] == key_hash:
+            return int(self.supports[idx])
+        return default
+
+    def get_many(self, keys: [str], default: int = None) -> [int]:
+        """
+        Looks up several keys at once (one vectorised binary search)
+        :param keys: a list of string keys
+        :param default: value for unknown keys
+        :return: a list of supports (aligned with keys)
+        """
+        if not keys:
+            return []
+        key_hashes = np.fromiter((hash_key(k) for k in keys), dtype=np.uint64, count=len(keys))
+        positions = np.searchsorted(self.keys, key_hashes)
+        positions_clipped = np.minimum(positions, len(self.keys) - 1)
+        found = (positions < len(self.keys)) & (self.keys[positions_clipped] == key_hashes)
+        supports = self.supports[positions_clipped]
+        return [int(s) if f else default for s, f in zip(supports, found)]
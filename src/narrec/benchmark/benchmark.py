@@ -3,6 +3,8 @@ import os
 from abc import abstractmethod
 from enum import Enum
 
+import numpy as np
+
 from narrec.config import GLOBAL_DB_DOCUMENT_COLLECTION, BENCHMKARK_QRELS_DIR
 
 
@@ -25,6 +27,7 @@ class Benchmark:
         self.document_ids = set()
         self.path_to_document_ids = path_to_document_ids
         self.documents_for_baseline_load = False
+        self.document_array_for_baseline = None
 
         self.topics = []
         self.topic2relevant_docs = {}
@@ -69,6 +72,17 @@ class Benchmark:
         self.documents_for_baseline_load = True
         return self.document_ids
 
+    def get_document_array_for_baseline(self):
+        """
+        :return: the documents for the baseline as a sorted array (None if there is no such restriction)
+        """
+        if self.document_array_for_baseline is None:
+            document_ids = self.get_documents_for_baseline()
+            if not document_ids:
+                return None
+            self.document_array_for_baseline = np.array(sorted(document_ids), dtype=np.int64)
+        return self.document_array_for_baseline
+
     def iterate_over_document_entries(self):
         raise NotImplementedError
 
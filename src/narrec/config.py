@@ -9,6 +9,12 @@ DATA_DIR = "/ssd2/kroll/recommender/"
 
 RESULT_DIR = os.path.join(DATA_DIR, "results")
 INDEX_DIR = os.path.join(DATA_DIR, "indexes")
+DOCUMENT_STORE_PATH = os.path.join(DATA_DIR, "document_store.sqlite")
+CORE_STORE_PATH = os.path.join(DATA_DIR, "core_store.sqlite")
+VOCABULARY_PATH = os.path.join(INDEX_DIR, "vocabulary.json")
+SUPPORT_TABLE_DIR = os.path.join(INDEX_DIR, "support")
+CORE_INDEX_DIR = os.path.join(INDEX_DIR, "cores")
+POSTINGS_INDEX_DIR = os.path.join(INDEX_DIR, "postings")
 BENCHMKARK_QRELS_DIR = os.path.join(DATA_DIR, "benchmark_qrels")
 DIAGRAM_DIR = os.path.join(DATA_DIR, "diagrams")
 
@@ -0,0 +1,241 @@
+from collections.abc import Set
+
+import numpy as np
+
+from kgextractiontoolbox.document.document import TaggedEntity
+from kgextractiontoolbox.document.narrative_document import StatementExtraction
+from narrec.document.document import RecommenderDocument
+from narrec.document.vocabulary import NarrativeVocabulary
+
+
+def _find(sorted_array: np.ndarray, value: int) -> int:
+    # position of value in a sorted array or -1
+    if value < 0:
+        return -1
+    # cast the value to the array type (comparing uint64 with Python ints may fall back to float64)
+    idx = int(np.searchsorted(sorted_array, sorted_array.dtype.type(value)))
+    if idx < len(sorted_array) and int(sorted_array[idx]) == value:
+        return idx
+    return -1
+
+
+class ConceptSetView(Set):
+    """
+    Read-only set of concept strings that is backed by a sorted array of vocabulary ids
+    """
+    __slots__ = ('ids',)
+
+    def __init__(self, ids: np.ndarray):
+        self.ids = ids
+
+    @classmethod
+    def _from_iterable(cls, it):
+        return set(it)
+
+    def __contains__(self, concept):
+        return _find(self.ids, NarrativeVocabulary.instance().concepts.get_id(concept)) >= 0
+
+    def __iter__(self):
+        vocabulary = NarrativeVocabulary.instance().concepts
+        for idx in self.ids:
+            yield vocabulary.get_str(int(idx))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def intersection(self, other):
+        return self & other
+
+    def union(self, other):
+        return self | other
+
+
+class StatementSetView(Set):
+    """
+    Read-only set of (subject, relation, object) tuples that is backed by a sorted array of packed statement keys
+    """
+    __slots__ = ('keys',)
+
+    def __init__(self, keys: np.ndarray):
+        self.keys = keys
+
+    @classmethod
+    def _from_iterable(cls, it):
+        return set(it)
+
+    def __contains__(self, spo):
+        return _find(self.keys, NarrativeVocabulary.instance().get_statement_key(spo)) >= 0
+
+    def __iter__(self):
+        vocabulary = NarrativeVocabulary.instance()
+        for key in self.keys:
+            yield vocabulary.get_statement(int(key))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def intersection(self, other):
+        return self & other
+
+    def union(self, other):
+        return self | other
+
+
+class CompactRecommenderDocument:
+    """
+    Memory-efficient version of a RecommenderDocument
+    Concepts, relations and strings are interned in the process-wide NarrativeVocabulary. All per-document
+    statistics are kept in NumPy arrays instead of dictionaries and sets of string tuples.
+    The class exposes the same accessors as RecommenderDocument.
+    """
+    __slots__ = ('id', 'title', 'abstract', 'classification', 'first_stage_score',
+                 'text_len', 'concept_count', 'max_concept_frequency', 'max_statement_frequency',
+                 '_concept_ids', '_concept_frequency', '_concept_first_position', '_concept_last_position',
+                 '_tag_data', '_statement_ids', '_statement_data', '_statement_confidence',
+                 '_graph_keys', '_graph_confidence', '_node_ids', '_graph_key_set', '_concept_id_set')
+
+    def __init__(self, document: RecommenderDocument):
+        vocabulary = NarrativeVocabulary.instance()
+        self.id = document.id
+        self.title = document.title
+        self.abstract = document.abstract
+        self.classification = document.classification
+        self.first_stage_score = document.first_stage_score
+        self.text_len = document.text_len
+        self.concept_count = document.concept_count
+        self.max_concept_frequency = document.max_concept_frequency
+        self.max_statement_frequency = getattr(document, 'max_statement_frequency', 0)
+
+        # concept statistics sorted by concept id
+        concepts = sorted((vocabulary.concepts.add(c), c) for c in document.concept2frequency)
+        self._concept_ids = np.array([c_id for c_id, _ in concepts], dtype=np.int32)
+        self._concept_frequency = np.array([document.concept2frequency[c] for _, c in concepts], dtype=np.int32)
+        self._concept_first_position = np.array([document.concept2first_position[c] for _, c in concepts],
+                                                dtype=np.int32)
+        self._concept_last_position = np.array([document.concept2last_position[c] for _, c in concepts],
+                                               dtype=np.int32)
+
+        # tags: start, end, entity id, entity type, text
+        self._tag_data = np.array([(t.start, t.end, vocabulary.concepts.add(t.ent_id),
+                                    vocabulary.strings.add(t.ent_type), vocabulary.strings.add(t.text))
+                                   for t in document.tags], dtype=np.int32).reshape(-1, 5)
+
+        # statements: subject, relation, object (ids) / types, strings and predicate (string ids) / sentence ids
+        statements = document.extracted_statements
+        self._statement_ids = np.array([(vocabulary.concepts.add(s.subject_id), vocabulary.relations.add(s.relation),
+                                         vocabulary.concepts.add(s.object_id)) for s in statements],
+                                       dtype=np.int32).reshape(-1, 3)
+        self._statement_data = np.array([(vocabulary.strings.add(s.subject_type), vocabulary.strings.add(s.subject_str),
+                                          vocabulary.strings.add(s.predicate), vocabulary.strings.add(s.object_type),
+                                          vocabulary.strings.add(s.object_str), s.sentence_id) for s in statements],
+                                        dtype=np.int64).reshape(-1, 6)
+        self._statement_confidence = np.array([s.confidence for s in statements], dtype=np.float64)
+
+        # graph (including symmetric statements) as sorted packed keys with the maximum confidence
+        graph = sorted((vocabulary.add_statement(spo), max(confidences))
+                       for spo, confidences in document.spo2confidences.items())
+        self._graph_keys = np.array([key for key, _ in graph], dtype=np.uint64)
+        self._graph_confidence = np.array([conf for _, conf in graph], dtype=np.float64)
+        self._node_ids = np.unique(np.concatenate([self._statement_ids[:, 0], self._statement_ids[:, 2]]))
+        # sets of the keys / ids are built on first access (query documents are compared to many candidates)
+        self._graph_key_set = None
+        self._concept_id_set = None
+
+    @property
+    def graph(self) -> StatementSetView:
+        return StatementSetView(self._graph_keys)
+
+    @property
+    def graph_keys(self) -> frozenset:
+        if self._graph_key_set is None:
+            self._graph_key_set = frozenset(self._graph_keys.tolist())
+        return self._graph_key_set
+
+    @property
+    def concept_ids(self) -> frozenset:
+        if self._concept_id_set is None:
+            self._concept_id_set = frozenset(self._concept_ids.tolist())
+        return self._concept_id_set
+
+    @property
+    def nodes(self) -> ConceptSetView:
+        return ConceptSetView(self._node_ids)
+
+    @property
+    def concepts(self) -> ConceptSetView:
+        return ConceptSetView(self._concept_ids)
+
+    @property
+    def tags(self):
+        concepts, strings = NarrativeVocabulary.instance().concepts, NarrativeVocabulary.instance().strings
+        return [TaggedEntity(document=self.id, start=int(start), end=int(end), ent_id=concepts.get_str(int(ent_id)),
+                             ent_type=strings.get_str(int(ent_type)), text=strings.get_str(int(text)))
+                for start, end, ent_id, ent_type, text in self._tag_data]
+
+    @property
+    def extracted_statements(self):
+        vocabulary = NarrativeVocabulary.instance()
+        concepts, relations, strings = vocabulary.concepts, vocabulary.relations, vocabulary.strings
+        statements = []
+        for (s_id, r_id, o_id), (s_type, s_str, predicate, o_type, o_str, sentence_id), confidence \
+                in zip(self._statement_ids, self._statement_data, self._statement_confidence):
+            statements.append(StatementExtraction(subject_id=concepts.get_str(int(s_id)),
+                                                  subject_type=strings.get_str(int(s_type)),
+                                                  subject_str=strings.get_str(int(s_str)),
+                                                  predicate=strings.get_str(int(predicate)),
+                                                  relation=relations.get_str(int(r_id)),
+                                                  object_id=concepts.get_str(int(o_id)),
+                                                  object_type=strings.get_str(int(o_type)),
+                                                  object_str=strings.get_str(int(o_str)),
+                                                  sentence_id=int(sentence_id),
+                                                  confidence=float(confidence)))
+        return statements
+
+    def get_text_content(self, sections=False):
+        return f"{self.title} {self.abstract}"
+
+    def __concept_index(self, concept) -> int:
+        return _find(self._concept_ids, NarrativeVocabulary.instance().concepts.get_id(concept))
+
+    def get_concept_relative_text_position(self, concept):
+        idx = self.__concept_index(concept)
+        if idx >= 0:
+            return int(self._concept_last_position[idx]) / self.text_len
+        else:
+            return 0.0
+
+    def get_concept_coverage(self, concept):
+        idx = self.__concept_index(concept)
+        if idx >= 0:
+            diff = int(self._concept_last_position[idx]) - int(self._concept_first_position[idx])
+            coverage = diff / self.text_len
+            # some taggers produced strange tag positions that may exceed the text range
+            coverage = max(0.0, min(1.0, coverage))
+            return coverage
+        else:
+            return 0.0
+
+    def get_concept_tf(self, concept):
+        idx = self.__concept_index(concept)
+        if idx >= 0:
+            return int(self._concept_frequency[idx])
+        else:
+            # some strange concepts do not appear as tags although they are used on graphs
+            return 1
+
+    def get_statement_confidence(self, spo: tuple) -> float:
+        idx = _find(self._graph_keys, NarrativeVocabulary.instance().get_statement_key(spo))
+        if idx < 0:
+            raise KeyError(f'Statement {spo} is not contained in document {self.id}')
+        return float(self._graph_confidence[idx])
+
+    def set_first_stage_score(self, score):
+        self.first_stage_score = score
+
+    def get_memory_size(self) -> int:
+        size = len(self.title or "") + len(self.abstract or "")
+        for array in [self._concept_ids, self._concept_frequency, self._concept_first_position,
+                      self._concept_last_position, self._tag_data, self._statement_ids, self._statement_data,
+                      self._statement_confidence, self._graph_keys, self._graph_confidence, self._node_ids]:
+            size += array.nbytes
+        return size
@@ -1,11 +1,17 @@
-from typing import List
+import hashlib
+import json
+from typing import List, Dict
+
+import numpy as np
 
 from kgextractiontoolbox.document.narrative_document import StatementExtraction
+from narrec.backend.cache import LRUCache
 from narrec.document.corpus import DocumentCorpus
 from narrec.document.document import RecommenderDocument
-from narrec.run_config import CONCEPT_MAX_SUPPORT
+from narrec.document.vocabulary import NarrativeVocabulary
+from narrec.run_config import CONCEPT_MAX_SUPPORT, CONFIDENCE_WEIGHT, TFIDF_WEIGHT
 from narrec.scoring.concept import score_concept_by_tf_idf_and_coverage
-from narrec.scoring.edge import score_edge_by_tf_and_concept_idf
+from narrec.scoring.edge import score_edge_by_tf_and_concept_idf, PREDICATE_TO_SCORE
 
 
 class ScoredConcept:
@@ -63,6 +69,40 @@ class NarrativeCore:
         self.statements.sort(key=lambda x: x.score, reverse=True)
         self.size = len(statements)
         self.graph = {(s.subject_id, s.relation, s.object_id) for s in self.statements}
+        # integer keys of statements and unordered node pairs (aligned with statements)
+        vocabulary = NarrativeVocabulary.instance()
+        self.statement_keys = [vocabulary.add_statement(s.get_triple()) for s in self.statements]
+        self.node_pair_keys = [vocabulary.get_node_pair_key(s.subject_id, s.object_id) for s in self.statements]
+        self.node_pairs = set(self.node_pair_keys)
+        # aggregates for the aligned recommenders (computed on first access)
+        self.__node_scores = None
+        self.__edge_scores = None
+
+    def get_node_scores(self) -> dict:
+        """
+        :return: a dictionary mapping a node to the summed score of all statements that contain the node
+        """
+        if self.__node_scores is None:
+            self.__node_scores = {}
+            # sum in statement order
+            for s in self.statements:
+                self.__node_scores[s.subject_id] = self.__node_scores.get(s.subject_id, 0) + s.score
+                if s.object_id != s.subject_id:
+                    self.__node_scores[s.object_id] = self.__node_scores.get(s.object_id, 0) + s.score
+        return self.__node_scores
+
+    def get_edge_scores(self) -> dict:
+        """
+        :return: a dictionary mapping a directed (subject, object) pair to the scores of its statements
+        """
+        if self.__edge_scores is None:
+            self.__edge_scores = {}
+            for s in self.statements:
+                key = (s.subject_id, s.object_id)
+                if key not in self.__edge_scores:
+                    self.__edge_scores[key] = []
+                self.__edge_scores[key].append(s.score)
+        return self.__edge_scores
 
     def contains_statement(self, spo) -> bool:
         return spo in self.graph
@@ -71,28 +111,51 @@ class NarrativeCore:
         if not isinstance(other, NarrativeCore):
             return None
 
-        statements = []
-        for a in self.statements:
-            found = False
-            for b in other.statements:
-                if a.is_equal(b):
-                    found = True
-                    break
-            if found:
-                statements.append(a)
+        # a statement is contained if the other core connects the same nodes (ignoring direction, see is_equal)
+        statements = [a for a, pair in zip(self.statements, self.node_pair_keys) if pair in other.node_pairs]
         return NarrativeCore(statements)
 
 
+def compute_scoring_config_hash(corpus: DocumentCorpus) -> str:
+    """
+    Computes a hash of everything a narrative core depends on (scoring weights and the corpus statistics)
+    :param corpus: the document corpus
+    :return: a hex digest
+    """
+    config = dict(confidence_weight=CONFIDENCE_WEIGHT, tfidf_weight=TFIDF_WEIGHT,
+                  concept_max_support=CONCEPT_MAX_SUPPORT, predicate_to_score=PREDICATE_TO_SCORE,
+                  collections=sorted(corpus.collections), document_count=corpus.get_document_count())
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+
 class NarrativeCoreExtractor:
 
-    def __init__(self, corpus: DocumentCorpus):
+    def __init__(self, corpus: DocumentCorpus, cache_max_items: int = None, core_store=None, core_index=None):
+        """
+        Initializes the extractor
+        :param corpus: the document corpus (for the concept idf)
+        :param cache_max_items: bound of the in-memory core cache (None means unbounded)
+        :param core_store: a CoreStore to persist computed cores (optional)
+        :param core_index: a CoreIndex with precomputed cores (optional, read before computing cores)
+        """
         self.corpus = corpus
-        self.cache = dict()
+        self.cache = LRUCache(max_items=cache_max_items)
+        self.core_store = core_store
+        self.core_index = core_index
+        self.config_hash = compute_scoring_config_hash(corpus)
+        if self.core_store:
+            # cores of other scoring configurations / corpora are outdated
+            self.core_store.invalidate(self.config_hash)
 
     def extract_concept_core(self, document: RecommenderDocument) -> NarrativeConceptCore:
         if not document.concepts:
             return None
 
+        if self.core_index:
+            precomputed = self.core_index.get_concept_cores([document.id], self.config_hash)
+            if document.id in precomputed:
+                return precomputed[document.id]
+
         scored_concepts = []
         for concept in document.concepts:
             score = score_concept_by_tf_idf_and_coverage(concept, document, self.corpus)
@@ -101,39 +164,94 @@ class NarrativeCoreExtractor:
             if support <= CONCEPT_MAX_SUPPORT:
                 scored_concepts.append(ScoredConcept(concept, score, coverage, support))
 
+        return self.__select_concept_core(scored_concepts)
+
+    @staticmethod
+    def __select_concept_core(scored_concepts: List[ScoredConcept]) -> NarrativeConceptCore:
         # sort remaining ones by score
         scored_concepts.sort(key=lambda x: x.score, reverse=True)
 
         return NarrativeConceptCore(scored_concepts)
 
+    def extract_concept_cores(self, documents: List[RecommenderDocument]) -> Dict[int, NarrativeConceptCore]:
+        """
+        Computes the concept cores of several documents at once
+        The IDF of each concept is computed only once and all scores are computed with NumPy (same operation order
+        as score_concept_by_tf_idf_and_coverage, i.e., the cores are identical to extract_concept_core)
+        :param documents: a list of RecommenderDocuments
+        :return: a dictionary mapping a document id to its concept core (None if the document has no concepts)
+        """
+        doc2core = {}
+        concept2idf = {}
+        concept2support = {}
+        if self.core_index:
+            doc2core.update(self.core_index.get_concept_cores([d.id for d in documents if d.concepts],
+                                                              self.config_hash))
+        for document in documents:
+            if document.id in doc2core:
+                continue
+            if not document.concepts:
+                doc2core[document.id] = None
+                continue
+
+            concepts = list(document.concepts)
+            for concept in concepts:
+                if concept not in concept2idf:
+                    concept2idf[concept] = self.corpus.get_concept_ifd_score(concept)
+                    concept2support[concept] = self.corpus.get_concept_support(concept)
+
+            tf = np.array([document.get_concept_tf(c) for c in concepts], dtype=np.float64) / document.concept_count
+            idf = np.array([concept2idf[c] for c in concepts], dtype=np.float64)
+            coverage = np.array([document.get_concept_coverage(c) for c in concepts], dtype=np.float64)
+            scores = coverage * (tf * idf)
+
+            scored_concepts = [ScoredConcept(c, score, cov, concept2support[c])
+                               for c, score, cov in zip(concepts, scores.tolist(), coverage.tolist())
+                               if concept2support[c] <= CONCEPT_MAX_SUPPORT]
+            doc2core[document.id] = self.__select_concept_core(scored_concepts)
+        return doc2core
+
     def extract_narrative_core_from_document(self, document: RecommenderDocument) -> NarrativeCore:
         if document.id in self.cache:
-            return self.cache[document.id]
+            return self.cache.get(document.id)
 
         if not document.extracted_statements:
             return None
 
-        filtered_statements = []
+        for source in [self.core_index, self.core_store]:
+            if source:
+                stored = source.get_narrative_cores([document.id], self.config_hash)
+                if document.id in stored:
+                    self.cache.put(document.id, stored[document.id])
+                    return stored[document.id]
+
         s_scores = []
         for statement in document.extracted_statements:
             spo = (statement.subject_id, statement.relation, statement.object_id)
 
             s_score = score_edge_by_tf_and_concept_idf(spo, document, self.corpus)
             s_scores.append(s_score)
-            filtered_statements.append(ScoredStatementExtraction(stmt=statement, score=s_score))
 
-        if not filtered_statements:
+        core = self.__select_core(document.extracted_statements, s_scores)
+        self.cache.put(document.id, core)
+        if self.core_store:
+            self.core_store.put_cores({document.id: core}, self.config_hash)
+        return core
+
+    @staticmethod
+    def __select_core(statements: List[StatementExtraction], s_scores: List[float]) -> NarrativeCore:
+        if not statements:
             return None
 
-        # sort filtered statements by score
-        filtered_statements.sort(key=lambda x: x.score, reverse=True)
+        # sort statements by score (scored statements are only created for the core)
+        filtered_statements = sorted(zip(statements, s_scores), key=lambda x: x[1], reverse=True)
 
         core_node_pairs = set()
         # The following algorithm will be design select the highest scored edges between two
         # nodes because filtered statements are sorted by their score desc
         # for connected_nodes, size in connected_components:
         core_statements = []
-        for statement in filtered_statements:
+        for statement, s_score in filtered_statements:
             # add only the strongest edge between two nodes (could be caused by multiple extractions)
             so = (statement.subject_id, statement.object_id)
             os = (statement.object_id, statement.subject_id)
@@ -142,9 +260,87 @@ class NarrativeCoreExtractor:
                 continue
 
             # if statement.subject_id in connected_nodes and statement.object_id in connected_nodes:
-            core_statements.append(statement)
+            core_statements.append(ScoredStatementExtraction(stmt=statement, score=s_score))
             core_node_pairs.add(so)
 
-        core = NarrativeCore(core_statements)
-        self.cache[document.id] = core
-        return core
+        return NarrativeCore(core_statements)
+
+    def extract_narrative_cores(self, documents: List[RecommenderDocument]) -> Dict[int, NarrativeCore]:
+        """
+        Computes the narrative cores of several documents at once (e.g., all candidates of a topic)
+        Concept tf, idf and coverage values are gathered once per document / concept and all edge scores are computed
+        with NumPy (same operation order as score_edge_by_tf_and_concept_idf, i.e., the cores are identical to
+        extract_narrative_core_from_document). Computed cores are cached (and persisted if a core store is used).
+        :param documents: a list of RecommenderDocuments
+        :return: a dictionary mapping a document id to its core (None if the document has no statements)
+        """
+        doc2core = {}
+        pending = []
+        concept2idf = {}
+        for document in documents:
+            if document.id in self.cache:
+                doc2core[document.id] = self.cache.get(document.id)
+            elif not document.extracted_statements:
+                doc2core[document.id] = None
+            else:
+                pending.append(document)
+
+        for source in [self.core_index, self.core_store]:
+            if pending and source:
+                stored = source.get_narrative_cores([d.id for d in pending], self.config_hash)
+                for doc_id, core in stored.items():
+                    self.cache.put(doc_id, core)
+                    doc2core[doc_id] = core
+                pending = [d for d in pending if d.id not in stored]
+        if not pending:
+            return doc2core
+
+        # gather all values of all statements into flat arrays
+        confidence, pred_score, tf_s, tf_o, idf_s, idf_o, cov_s, cov_o = [], [], [], [], [], [], [], []
+        offsets = [0]
+        for document in pending:
+            concept2values = {}
+            for statement in document.extracted_statements:
+                spo = (statement.subject_id, statement.relation, statement.object_id)
+                for concept in (spo[0], spo[2]):
+                    if concept not in concept2values:
+                        if document.concept_count > 0:
+                            tf = document.get_concept_tf(concept) / document.concept_count
+                        else:
+                            tf = 0.0
+                        if concept not in concept2idf:
+                            concept2idf[concept] = self.corpus.get_concept_ifd_score(concept)
+                        concept2values[concept] = (tf, concept2idf[concept], document.get_concept_coverage(concept))
+
+                s_values, o_values = concept2values[spo[0]], concept2values[spo[2]]
+                confidence.append(document.get_statement_confidence(spo))
+                pred_score.append(PREDICATE_TO_SCORE[spo[1]])
+                tf_s.append(s_values[0])
+                tf_o.append(o_values[0])
+                idf_s.append(s_values[1])
+                idf_o.append(o_values[1])
+                cov_s.append(s_values[2])
+                cov_o.append(o_values[2])
+            offsets.append(len(confidence))
+
+        confidence = np.array(confidence, dtype=np.float64)
+        tfidf = np.array(pred_score, dtype=np.float64) * (0.5 * ((np.array(tf_s, dtype=np.float64) *
+                                                                   np.array(idf_s, dtype=np.float64)) +
+                                                                  (np.array(tf_o, dtype=np.float64) *
+                                                                   np.array(idf_o, dtype=np.float64))))
+        coverage = np.minimum(np.array(cov_s, dtype=np.float64), np.array(cov_o, dtype=np.float64))
+
+        assert np.all((0.0 <= tfidf) & (tfidf <= 1.0))
+        assert np.all((0.0 <= confidence) & (confidence <= 1.0))
+        assert np.all((0.0 <= coverage) & (coverage <= 1.0))
+
+        scores = (coverage * confidence * tfidf).tolist()
+        computed = {}
+        for idx, document in enumerate(pending):
+            core = self.__select_core(document.extracted_statements, scores[offsets[idx]:offsets[idx + 1]])
+            self.cache.put(document.id, core)
+            computed[document.id] = core
+        if self.core_store:
+            self.core_store.put_cores(computed, self.config_hash)
+        doc2core.update(computed)
+        return doc2core
@@ -1,12 +1,18 @@
 import logging
 
 import math
+from sqlalchemy import tuple_
 from tqdm import tqdm
 
 from kgextractiontoolbox.backend.models import Document
 from narraint.backend.database import SessionExtended
 from narraint.backend.models import PredicationInvertedIndex, TagInvertedIndex
 from narrant.cleaning.pharmaceutical_vocabulary import SYMMETRIC_PREDICATES
+from narrec.backend.support_table import SupportTable, get_support_table_dir, statement_to_key, CONCEPT_TABLE, \
+    STATEMENT_TABLE
+from narrec.document.vocabulary import NarrativeVocabulary
+
+STATEMENT_PRELOAD_CHUNK_SIZE = 1000
 
 
 class DocumentCorpus:
@@ -24,11 +30,32 @@ class DocumentCorpus:
             logging.info(f'{col_count} documents found')
 
         logging.info(f'{self.document_count} documents in corpus')
+        # statements are cached by their packed vocabulary key
         self.cache_statement2count = dict()
         self.cache_concept2support = dict()
         self.all_idf_data_cached = False
+        self.all_statement_data_cached = False
+        # memory-mapped support tables (see backend/create_support_table.py)
+        self.concept_support_table = None
+        self.statement_support_table = None
+
+    def load_support_tables(self) -> bool:
+        directory = get_support_table_dir(self.collections)
+        if not SupportTable.exists(directory, CONCEPT_TABLE):
+            return False
+
+        self.concept_support_table = SupportTable(directory, CONCEPT_TABLE)
+        if SupportTable.exists(directory, STATEMENT_TABLE):
+            self.statement_support_table = SupportTable(directory, STATEMENT_TABLE)
+        return True
 
     def load_all_support_into_memory(self):
+        if self.load_support_tables():
+            print(f'Using memory-mapped support tables ({len(self.concept_support_table)} concepts)')
+            self.all_idf_data_cached = True
+            return
+
+        print('No support tables found (run backend/create_support_table.py) - scanning the database')
         session = SessionExtended.get()
 
         print('Caching all concept inverted index support entries...')
@@ -45,6 +72,72 @@ class DocumentCorpus:
         self.all_idf_data_cached = True
         print('Finished')
 
+    def load_all_statement_support_into_memory(self):
+        if self.statement_support_table:
+            print('Statement support is served by the memory-mapped support table')
+            return
+
+        session = SessionExtended.get()
+        vocabulary = NarrativeVocabulary.instance()
+
+        print('Caching all statement inverted index support entries...')
+        total = session.query(PredicationInvertedIndex).count()
+        q = session.query(PredicationInvertedIndex.subject_id,
+                          PredicationInvertedIndex.relation,
+                          PredicationInvertedIndex.object_id,
+                          PredicationInvertedIndex.support)
+        statement2count = self.cache_statement2count
+        for row in tqdm(q, desc="Loading db data...", total=total):
+            key = vocabulary.add_statement((row.subject_id, row.relation, row.object_id))
+            if key in statement2count:
+                statement2count[key] += row.support
+            else:
+                statement2count[key] = row.support
+        self.all_statement_data_cached = True
+        print('Finished')
+
+    def preload_statement_support(self, documents, chunk_size: int = STATEMENT_PRELOAD_CHUNK_SIZE):
+        """
+        Resolves the support of all statements in the documents that are not cached yet (one query per chunk)
+        :param documents: a list of RecommenderDocuments (e.g., the candidates of a topic)
+        :param chunk_size: number of statements per query
+        :return: None
+        """
+        # nothing will be queried from the database
+        if self.statement_support_table or self.all_idf_data_cached or self.all_statement_data_cached:
+            return
+
+        vocabulary = NarrativeVocabulary.instance()
+        key2statement = dict()
+        for document in documents:
+            for spo in document.graph:
+                statements = [spo]
+                if spo[1] in SYMMETRIC_PREDICATES:
+                    statements.append((spo[2], spo[1], spo[0]))
+                for statement in statements:
+                    key = vocabulary.add_statement(statement)
+                    if key not in self.cache_statement2count and key not in key2statement:
+                        key2statement[key] = statement
+        if not key2statement:
+            return
+
+        session = SessionExtended.get()
+        statements = list(key2statement.values())
+        # statements without index entries have no support (same as in the single statement query)
+        for key in key2statement:
+            self.cache_statement2count[key] = 0
+        for i in range(0, len(statements), chunk_size):
+            q = session.query(PredicationInvertedIndex.subject_id,
+                              PredicationInvertedIndex.relation,
+                              PredicationInvertedIndex.object_id,
+                              PredicationInvertedIndex.support)
+            q = q.filter(tuple_(PredicationInvertedIndex.subject_id,
+                                PredicationInvertedIndex.relation,
+                                PredicationInvertedIndex.object_id).in_(statements[i:i + chunk_size]))
+            for row in q:
+                key = vocabulary.add_statement((row.subject_id, row.relation, row.object_id))
+                self.cache_statement2count[key] += row.support
+
     def get_idf_score(self, statement: tuple):
         # Introduce normalization here
         return math.log(self.get_document_count() / self.get_statement_documents(statement)) / math.log(
@@ -59,13 +152,23 @@ class DocumentCorpus:
 
     def _get_statement_documents_without_symmetric(self, statement: tuple):
         # number of documents which support the statement
-        if statement in self.cache_statement2count:
-            return self.cache_statement2count[statement]
+        statement_key = NarrativeVocabulary.instance().add_statement(statement)
+        if statement_key in self.cache_statement2count:
+            return self.cache_statement2count[statement_key]
+
+        if self.statement_support_table:
+            # some strange statements might not appear in the index (see below)
+            support = self.statement_support_table.get(statement_to_key(statement), default=1)
+            self.cache_statement2count[statement_key] = support
+            return support
 
         # not in index, but all data should be loaded. so no retrieval is needed any more
         # however, some strange statement concept might not appear in the concept index
         if self.all_idf_data_cached:
             return 1
+        # every statement of the index is cached
+        if self.all_statement_data_cached:
+            return 0
 
         session = SessionExtended.get()
         q = session.query(PredicationInvertedIndex.support)
@@ -77,7 +180,7 @@ class DocumentCorpus:
         for row in q:
             support += row.support
 
-        self.cache_statement2count[statement] = support
+        self.cache_statement2count[statement_key] = support
         return support
 
     def get_statement_documents(self, statement: tuple):
@@ -93,6 +196,11 @@ class DocumentCorpus:
     def get_concept_support(self, entity_id):
         if entity_id in self.cache_concept2support:
             return self.cache_concept2support[entity_id]
+        if self.concept_support_table:
+            # only the concepts that are actually used end up in the per-process cache
+            support = self.concept_support_table.get(entity_id, default=1)
+            self.cache_concept2support[entity_id] = support
+            return support
         # not in index, but all data should be loaded. so no retrieval is needed any more
         # however, some strange statement concept might not appear in the concept index
         if self.all_idf_data_cached:
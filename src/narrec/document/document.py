@@ -2,6 +2,7 @@ from collections import defaultdict
 
 from kgextractiontoolbox.document.narrative_document import NarrativeDocument
 from narrant.cleaning.pharmaceutical_vocabulary import SYMMETRIC_PREDICATES
+from narrec.document.vocabulary import NarrativeVocabulary
 
 
 class RecommenderDocument(NarrativeDocument):
@@ -81,6 +82,11 @@ class RecommenderDocument(NarrativeDocument):
 
             self.max_statement_frequency = max(self.spo2frequency.values())
 
+        # integer representation (shared vocabulary) for fast set operations
+        vocabulary = NarrativeVocabulary.instance()
+        self.graph_keys = frozenset(vocabulary.add_statement(spo) for spo in self.graph)
+        self.concept_ids = frozenset(vocabulary.concepts.add(c) for c in self.concepts)
+
     def get_concept_relative_text_position(self, concept):
         # for problematic caseses
         if concept in self.concept2last_position:
@@ -106,5 +112,8 @@ class RecommenderDocument(NarrativeDocument):
             # some strange concepts do not appear as tags although they are used on graphs
             return 1
 
+    def get_statement_confidence(self, spo: tuple) -> float:
+        return max(self.spo2confidences[spo])
+
     def set_first_stage_score(self, score):
         self.first_stage_score = score
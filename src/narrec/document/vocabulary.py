@@ -0,0 +1,119 @@
+import json
+import logging
+import os
+
+from narrec.config import VOCABULARY_PATH
+
+CONCEPT_BITS = 28
+RELATION_BITS = 8
+MAX_CONCEPT_ID = (1 << CONCEPT_BITS) - 1
+MAX_RELATION_ID = (1 << RELATION_BITS) - 1
+
+
+class Vocabulary:
+    """
+    Maps strings to dense integer ids (0, 1, 2, ...)
+    """
+
+    def __init__(self, max_id: int = None):
+        self.str2id = {}
+        self.id2str = []
+        self.max_id = max_id
+
+    def __len__(self):
+        return len(self.id2str)
+
+    def __contains__(self, value: str):
+        return value in self.str2id
+
+    def add(self, value: str) -> int:
+        if value in self.str2id:
+            return self.str2id[value]
+        idx = len(self.id2str)
+        if self.max_id is not None and idx > self.max_id:
+            raise ValueError(f'Vocabulary exceeds the maximum number of ids ({self.max_id})')
+        self.str2id[value] = idx
+        self.id2str.append(value)
+        return idx
+
+    def get_id(self, value: str) -> int:
+        # -1 if the value is unknown
+        return self.str2id.get(value, -1)
+
+    def get_str(self, idx: int) -> str:
+        return self.id2str[idx]
+
+
+def pack_statement(subject_id: int, relation_id: int, object_id: int) -> int:
+    """
+    Packs a statement of vocabulary ids into a single 64-bit key
+    Layout: subject (28 bits) | relation (8 bits) | object (28 bits)
+    """
+    return (subject_id << (CONCEPT_BITS + RELATION_BITS)) | (relation_id << CONCEPT_BITS) | object_id
+
+
+def pack_node_pair(concept_a_id: int, concept_b_id: int) -> int:
+    # unordered pair of concept ids (direction is ignored)
+    if concept_a_id <= concept_b_id:
+        return (concept_a_id << CONCEPT_BITS) | concept_b_id
+    return (concept_b_id << CONCEPT_BITS) | concept_a_id
+
+
+def unpack_statement(key: int) -> (int, int, int):
+    return (key >> (CONCEPT_BITS + RELATION_BITS),
+            (key >> CONCEPT_BITS) & MAX_RELATION_ID,
+            key & MAX_CONCEPT_ID)
+
+
+class NarrativeVocabulary:
+    """
+    Process-wide vocabulary for concepts, relations and other strings (types, surface forms)
+    Concept and relation ids are persisted (VOCABULARY_PATH), so that all processes share the same stable mapping.
+    Concepts that are not contained in the persisted vocabulary receive new ids in the current process.
+    """
+    _instance = None
+
+    def __init__(self):
+        self.concepts = Vocabulary(max_id=MAX_CONCEPT_ID)
+        self.relations = Vocabulary(max_id=MAX_RELATION_ID)
+        self.strings = Vocabulary()
+
+    @staticmethod
+    def instance():
+        if not NarrativeVocabulary._instance:
+            NarrativeVocabulary._instance = NarrativeVocabulary()
+            if os.path.isfile(VOCABULARY_PATH):
+                NarrativeVocabulary._instance.load(VOCABULARY_PATH)
+        return NarrativeVocabulary._instance
+
+    def load(self, path: str):
+        logging.info(f'Loading vocabulary from {path}...')
+        with open(path, 'rt') as f:
+            data = json.load(f)
+        for concept in data["concepts"]:
+            self.concepts.add(concept)
+        for relation in data["relations"]:
+            self.relations.add(relation)
+        logging.info(f'{len(self.concepts)} concepts and {len(self.relations)} relations loaded')
+
+    def save(self, path: str):
+        logging.info(f'Writing vocabulary to {path}...')
+        with open(path, 'wt') as f:
+            json.dump(dict(concepts=self.concepts.id2str, relations=self.relations.id2str), f)
+
+    def get_node_pair_key(self, concept_a: str, concept_b: str) -> int:
+        return pack_node_pair(self.concepts.add(concept_a), self.concepts.add(concept_b))
+
+    def add_statement(self, spo: tuple) -> int:
+        return pack_statement(self.concepts.add(spo[0]), self.relations.add(spo[1]), self.concepts.add(spo[2]))
+
+    def get_statement_key(self, spo: tuple) -> int:
+        # -1 if some part of the statement is unknown
+        s_id, r_id, o_id = self.concepts.get_id(spo[0]), self.relations.get_id(spo[1]), self.concepts.get_id(spo[2])
+        if s_id < 0 or r_id < 0 or o_id < 0:
+            return -1
+        return pack_statement(s_id, r_id, o_id)
+
+    def get_statement(self, key: int) -> tuple:
+        s_id, r_id, o_id = unpack_statement(key)
+        return self.concepts.get_str(s_id), self.relations.get_str(r_id), self.concepts.get_str(o_id)
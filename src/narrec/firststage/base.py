@@ -1,5 +1,12 @@
+from typing import List, Tuple
+
+import numpy as np
+from tqdm import tqdm
+
 from narrec.document.document import RecommenderDocument
 from narrec.run_config import FS_DOCUMENT_CUTOFF, FS_DOCUMENT_CUTOFF_HARD
+from narrec.scoring.ranking import rank_document_scores, dynamic_cutoff_position, \
+    rank_document_scores_with_dynamic_cutoff
 
 
 class FirstStageBase:
@@ -14,38 +21,65 @@ class FirstStageBase:
     def retrieve_documents_for(self, document: RecommenderDocument):
         pass
 
+    def prefetch_for_documents(self, documents: List[RecommenderDocument]):
+        """
+        Loads the data that is required to retrieve documents for several query documents at once (e.g., the
+        postings of all their concepts in bulk queries). Nothing is prefetched by default.
+        :param documents: a list of query documents
+        """
+        pass
+
+    def reset_cache(self):
+        # forget all cached postings (e.g., to measure cold runs)
+        pass
+
+    def retrieve_documents_for_topics(self, topics: List[Tuple[object, RecommenderDocument]],
+                                      progress: bool = False) -> List[list]:
+        """
+        Retrieves documents for several topics at once
+        The data of all query documents is prefetched first, so that data shared by several topics is only
+        loaded once.
+        :param topics: a list of (topic idx, query document) pairs
+        :param progress: show a progress bar
+        :return: a list of rankings (aligned with topics)
+        """
+        self.prefetch_for_documents([document for _, document in topics])
+        rankings = []
+        for topic_idx, document in (tqdm(topics, total=len(topics)) if progress else topics):
+            self.set_current_topic(topic_idx)
+            rankings.append(self.retrieve_documents_for(document))
+        return rankings
+
     @staticmethod
-    def normalize_and_sort_document_scores(document_ids_scored):
+    def normalize_and_sort_document_scores(document_ids_scored, k: int = None):
+        """
+        Normalizes the scores by the maximum score and ranks the documents by their score and then by their id
+        :param document_ids_scored: a dictionary mapping document ids to scores or a ScoreAccumulator
+        :param k: only the k best documents are ranked and returned (None returns all documents)
+        :return: a list of (document id, normalized score) tuples
+        """
         # We did not find any documents
         if len(document_ids_scored) == 0:
             return []
-
-        # Get the maximum score to normalize the scores
-        max_score = max(document_ids_scored.values())
-        if max_score > 0.0:
-            # Convert to list
-            document_ids_scored = [(k, v / max_score) for k, v in document_ids_scored.items()]
-        else:
-            document_ids_scored = [(k, v) for k, v in document_ids_scored.items()]
-        # Sort by score and then doc desc
-        document_ids_scored.sort(key=lambda x: (x[1], int(x[0])), reverse=True)
-        return document_ids_scored
+        return rank_document_scores(document_ids_scored, k=k)
 
     @staticmethod
     def apply_dynamic_cutoff(document_ids_scored):
-        if len(document_ids_scored) > FS_DOCUMENT_CUTOFF:
-            # get score at position
-            score_at_cutoff = document_ids_scored[FS_DOCUMENT_CUTOFF][1]
-            # search position where score is lower
-            new_cutoff_position = 0
-            for idx, (d, score) in enumerate(document_ids_scored[FS_DOCUMENT_CUTOFF:]):
-                if score < score_at_cutoff:
-                    new_cutoff_position = idx
-                    break
-            if FS_DOCUMENT_CUTOFF + new_cutoff_position < FS_DOCUMENT_CUTOFF_HARD:
-                return document_ids_scored[:FS_DOCUMENT_CUTOFF + new_cutoff_position]
-            else:
-                return document_ids_scored[:FS_DOCUMENT_CUTOFF_HARD]
-        else:
-            # Ensure cutoff
-            return document_ids_scored[:FS_DOCUMENT_CUTOFF]
+        if len(document_ids_scored) == 0:
+            return document_ids_scored
+        sorted_scores = np.fromiter((score for _, score in document_ids_scored[:FS_DOCUMENT_CUTOFF_HARD]),
+                                    dtype=np.float64)
+        position = dynamic_cutoff_position(sorted_scores, document_ids_scored[-1][1],
+                                           FS_DOCUMENT_CUTOFF, FS_DOCUMENT_CUTOFF_HARD)
+        return document_ids_scored[:position]
+
+    @staticmethod
+    def normalize_and_sort_with_dynamic_cutoff(document_ids_scored):
+        """
+        Same result as apply_dynamic_cutoff(normalize_and_sort_document_scores(document_ids_scored)), but only
+        the documents up to the hard cutoff are sorted
+        :param document_ids_scored: a dictionary mapping document ids to scores or a ScoreAccumulator
+        :return: a list of (document id, normalized score) tuples
+        """
+        return rank_document_scores_with_dynamic_cutoff(document_ids_scored, FS_DOCUMENT_CUTOFF,
+                                                        FS_DOCUMENT_CUTOFF_HARD)
@@ -2,18 +2,20 @@ import ast
 
 from narraint.backend.database import SessionExtended
 from narraint.backend.models import TagInvertedIndex
+from narrec.backend.postings_index import PostingsIndex
 from narrec.benchmark.benchmark import Benchmark
 from narrec.document.core import NarrativeCoreExtractor, NarrativeConceptCore
 from narrec.document.document import RecommenderDocument
 from narrec.firststage.base import FirstStageBase
 from narrec.firststage.fsconcept import FSConcept
-from narrec.run_config import FS_DOCUMENT_CUTOFF
+from narrec.run_config import FS_DOCUMENT_CUTOFF, FS_DOCUMENT_CUTOFF_HARD
 
 
 class FSConceptFlex(FSConcept):
 
-    def __init__(self, extractor: NarrativeCoreExtractor, benchmark: Benchmark, name="FSConceptFlex"):
-        super().__init__(name=name, extractor=extractor, benchmark=benchmark)
+    def __init__(self, extractor: NarrativeCoreExtractor, benchmark: Benchmark, name="FSConceptFlex",
+                 postings_index: PostingsIndex = None):
+        super().__init__(name=name, extractor=extractor, benchmark=benchmark, postings_index=postings_index)
 
     def retrieve_documents_for(self, document: RecommenderDocument):
         # Compute the cores
@@ -23,12 +25,6 @@ class FSConceptFlex(FSConcept):
         if not core:
             return []
 
-        # score documents with this core
-        document_ids_scored = self.score_document_ids_with_core(core)
-
-        # We did not find any documents
-        if len(document_ids_scored) == 0:
-            return []
-
-        # Ensure cutoff
-        return FirstStageBase.apply_dynamic_cutoff(document_ids_scored)
+        # score documents with this core (only the documents up to the hard cutoff are ranked)
+        document_ids_scored = self.accumulate_document_scores(core, k=FS_DOCUMENT_CUTOFF_HARD)
+        return FirstStageBase.normalize_and_sort_with_dynamic_cutoff(document_ids_scored)
@@ -1,62 +1,98 @@
 import ast
 
+import numpy as np
+
 from narrec.backend.database import SessionRecommender
 from narrec.backend.models import TagInvertedIndexScored
+from narrec.backend.postings import contained_mask
+from narrec.backend.postings_index import PostingsIndex, FIELD_CONCEPT_SCORED
 from narrec.benchmark.benchmark import Benchmark
 from narrec.document.core import NarrativeCoreExtractor, NarrativeConceptCore
 from narrec.document.document import RecommenderDocument
 from narrec.firststage.base import FirstStageBase
-from narrec.run_config import FS_DOCUMENT_CUTOFF
+from narrec.run_config import FS_DOCUMENT_CUTOFF, FS_POSTINGS_BULK_CHUNK_SIZE
+from narrec.scoring.ranking import ScoreAccumulator
 
 
 class FSConceptPlus(FirstStageBase):
 
-    def __init__(self, extractor: NarrativeCoreExtractor, benchmark: Benchmark, name="FSConceptPlus"):
+    def __init__(self, extractor: NarrativeCoreExtractor, benchmark: Benchmark, name="FSConceptPlus",
+                 postings_index: PostingsIndex = None):
         super().__init__(name=name)
         self.extractor = extractor
         self.benchmark = benchmark
-        self.session = SessionRecommender.get()
+        self.postings_index = postings_index if postings_index and postings_index.has_field(FIELD_CONCEPT_SCORED) \
+            else None
+        # the database is only queried if the postings are not read from the postings index
+        self.session = SessionRecommender.get() if not self.postings_index else None
+        # a benchmark-scoped postings index only contains benchmark documents
+        self.postings_in_scope = bool(self.postings_index) and self.postings_index.scope == benchmark.name
         self.concept2documents = dict()
 
     def retrieve_documents(self, concept: str):
-        if concept in self.concept2documents:
-            return self.concept2documents[concept]
-
-        q = self.session.query(TagInvertedIndexScored)
-        # Search for matching nodes but not for predicates (ignore direction)
-        q = q.filter(TagInvertedIndexScored.entity_id == concept)
-        q = q.filter(TagInvertedIndexScored.document_collection == self.benchmark.document_collection)
-
-        doc_scores = list()
-        for row in q:
-            scored_docs = ast.literal_eval(row.scored_document_ids)
-            for did, tf, score in scored_docs:
+        """
+        :param concept: a concept id
+        :return: the ids of the documents that contain the concept and their concept scores (aligned arrays)
+        """
+        if concept not in self.concept2documents:
+            self.retrieve_documents_bulk([concept])
+        return self.concept2documents[concept]
+
+    def retrieve_documents_bulk(self, concepts: [str]):
+        """
+        Loads the scored postings of several concepts (one query per chunk of concepts) into the cache
+        :param concepts: a list of concepts
+        """
+        concepts = [c for c in concepts if c not in self.concept2documents]
+        for i in range(0, len(concepts), FS_POSTINGS_BULK_CHUNK_SIZE):
+            chunk = concepts[i:i + FS_POSTINGS_BULK_CHUNK_SIZE]
+            concept2postings = {}
+            if self.postings_index:
+                postings = self.postings_index.get_postings_with_values_many(FIELD_CONCEPT_SCORED, chunk, "score")
+                concept2postings = dict(zip(chunk, postings))
+            else:
+                q = self.session.query(TagInvertedIndexScored.entity_id, TagInvertedIndexScored.scored_document_ids)
+                q = q.filter(TagInvertedIndexScored.entity_id.in_(chunk))
+                q = q.filter(TagInvertedIndexScored.document_collection == self.benchmark.document_collection)
+
+                concept2values = {c: ([], []) for c in chunk}
+                for row in q:
+                    document_ids, scores = concept2values[row.entity_id]
+                    for did, tf, score in ast.literal_eval(row.scored_document_ids):
+                        document_ids.append(did)
+                        scores.append(score)
+                for concept, (document_ids, scores) in concept2values.items():
+                    concept2postings[concept] = (np.array(document_ids, dtype=np.int64),
+                                                 np.array(scores, dtype=np.float64))
+
+            for concept, (document_ids, scores) in concept2postings.items():
                 # if its pubmed use the filter for possible benchmark documents
-                if self.benchmark.document_collection == "PubMed" and self.benchmark.get_documents_for_baseline():
-                    if did not in self.benchmark.get_documents_for_baseline():
-                        continue
-                doc_scores.append((did, tf, score))
-
-        # add to cache
-        self.concept2documents[concept] = doc_scores
-        return doc_scores
-
-    def score_document_ids_with_core(self, core: NarrativeConceptCore):
+                if self.benchmark.document_collection == "PubMed" and not self.postings_in_scope:
+                    baseline_document_ids = self.benchmark.get_document_array_for_baseline()
+                    if baseline_document_ids is not None:
+                        mask = contained_mask(document_ids, baseline_document_ids)
+                        document_ids, scores = document_ids[mask], scores[mask]
+                # add to cache
+                self.concept2documents[concept] = document_ids, scores
+
+    def prefetch_for_documents(self, documents: [RecommenderDocument]):
+        doc2core = self.extractor.extract_concept_cores(documents)
+        self.retrieve_documents_bulk(sorted({c.concept for core in doc2core.values() if core for c in core.concepts}))
+
+    def reset_cache(self):
+        self.concept2documents.clear()
+
+    def score_document_ids_with_core(self, core: NarrativeConceptCore, k: int = None):
         # Core statements are also sorted by their score
-        document_ids_scored = {}
+        document_ids_scored = ScoreAccumulator()
         # If a statement of the core is contained within a document, we increase the score
         # of the document by the score of the corresponding edge
         for idx, concept in enumerate(core.concepts):
             # retrieve matching documents
-            doc2score = self.retrieve_documents(concept.concept)
-
-            for doc_id, tf, score in doc2score:
-                if doc_id not in document_ids_scored:
-                    document_ids_scored[doc_id] = min(concept.score, score)
-                else:
-                    document_ids_scored[doc_id] += min(concept.score, score)
+            document_ids, scores = self.retrieve_documents(concept.concept)
+            document_ids_scored.add_scores(document_ids, np.minimum(concept.score, scores))
 
-        return FirstStageBase.normalize_and_sort_document_scores(document_ids_scored)
+        return FirstStageBase.normalize_and_sort_document_scores(document_ids_scored, k=k)
 
     def retrieve_documents_for(self, document: RecommenderDocument):
         # Compute the cores
@@ -67,7 +103,7 @@ class FSConceptPlus(FirstStageBase):
             return []
 
         # score documents with this core
-        document_ids_scored = self.score_document_ids_with_core(core)
+        document_ids_scored = self.score_document_ids_with_core(core, k=FS_DOCUMENT_CUTOFF)
 
         # We did not find any documents
         if len(document_ids_scored) == 0:
@@ -1,70 +1,148 @@
 import json
 
-from sqlalchemy import or_, and_
+import numpy as np
+from sqlalchemy import tuple_
 
 from narraint.backend.database import SessionExtended
 from narraint.backend.models import PredicationInvertedIndex
+from narrec.backend.database import has_table
+from narrec.backend.models import NodePairInvertedIndex
+from narrec.backend.postings import filter_postings, decode_postings
+from narrec.backend.postings_index import PostingsIndex, FIELD_NODE_PAIR, node_pair_to_term
 from narrec.benchmark.benchmark import Benchmark
 from narrec.document.core import NarrativeCoreExtractor, NarrativeCore
 from narrec.document.document import RecommenderDocument
+from narrec.document.vocabulary import NarrativeVocabulary
 from narrec.firststage.base import FirstStageBase
-from narrec.run_config import FS_DOCUMENT_CUTOFF
+from narrec.run_config import FS_DOCUMENT_CUTOFF, FS_POSTINGS_BULK_CHUNK_SIZE
+from narrec.scoring.ranking import ScoreAccumulator, accumulate_postings
 
 
 class FSCore(FirstStageBase):
 
-    def __init__(self, extractor: NarrativeCoreExtractor, benchmark: Benchmark, name="FSCore"):
+    def __init__(self, extractor: NarrativeCoreExtractor, benchmark: Benchmark, name="FSCore",
+                 postings_index: PostingsIndex = None):
         super().__init__(name=name)
         self.extractor = extractor
         self.benchmark = benchmark
-        self.session = SessionExtended.get()
+        self.postings_index = postings_index if postings_index and postings_index.has_field(FIELD_NODE_PAIR) else None
+        # the database is only queried if the postings are not read from the postings index
+        self.session = SessionExtended.get() if not self.postings_index else None
+        # a benchmark-scoped postings index only contains benchmark documents
+        self.postings_in_scope = bool(self.postings_index) and self.postings_index.scope == benchmark.name
         self.cache = dict()
+        # whether the node pair index was computed for the collection (checked on first use)
+        self.node_pair_index_available = None
+
+    def has_node_pair_index(self) -> bool:
+        if self.node_pair_index_available is None:
+            # databases without a computed node pair index do not have the table
+            if not has_table(self.session, NodePairInvertedIndex):
+                self.node_pair_index_available = False
+                return False
+            q = self.session.query(NodePairInvertedIndex.node_a)
+            q = q.filter(NodePairInvertedIndex.document_collection == self.benchmark.document_collection)
+            self.node_pair_index_available = q.first() is not None
+        return self.node_pair_index_available
 
     def retrieve_documents(self, spo: tuple):
-        if spo[0] < spo[2]:
-            so_key = (spo[0], spo[2])
-        else:
-            so_key = (spo[2], spo[0])
-
-        if so_key in self.cache:
-            return self.cache[so_key]
-
-        q = self.session.query(PredicationInvertedIndex)
-        # Search for matching nodes but not for predicates (ignore direction)
-        q = q.filter(
-            or_(and_(PredicationInvertedIndex.subject_id == spo[0], PredicationInvertedIndex.object_id == spo[2]),
-                and_(PredicationInvertedIndex.subject_id == spo[2], PredicationInvertedIndex.object_id == spo[0])))
-        q = q.filter(PredicationInvertedIndex.document_collection == self.benchmark.document_collection)
-
-        document_ids = set()
-        for row in q:
-            prov_mapping = json.loads(row.provenance_mapping)
-            for doc_id in prov_mapping:
-                doc_id_int = int(doc_id)
-                if self.benchmark.document_collection == "PubMed" and self.benchmark.get_documents_for_baseline():
-                    if doc_id_int not in self.benchmark.get_documents_for_baseline():
-                        continue
-                    document_ids.add(doc_id_int)
-
-        self.cache[so_key] = document_ids
-        return document_ids
-
-    def score_document_ids_with_core(self, core: NarrativeCore):
+        # unordered node pair key
+        so_key = NarrativeVocabulary.instance().get_node_pair_key(spo[0], spo[2])
+
+        if so_key not in self.cache:
+            self.retrieve_documents_bulk([(spo[0], spo[2])])
+        return self.cache[so_key]
+
+    def retrieve_documents_bulk(self, node_pairs: [tuple]):
+        """
+        Loads the postings of several node pairs (one query per chunk of node pairs) into the cache
+        The direction of a pair is ignored.
+        :param node_pairs: a list of (subject id, object id) pairs
+        """
+        vocabulary = NarrativeVocabulary.instance()
+        key2pair = {}
+        for node_a, node_b in node_pairs:
+            so_key = vocabulary.get_node_pair_key(node_a, node_b)
+            if so_key not in self.cache:
+                key2pair[so_key] = (node_a, node_b)
+
+        pending = list(key2pair.items())
+        for i in range(0, len(pending), FS_POSTINGS_BULK_CHUNK_SIZE):
+            chunk = pending[i:i + FS_POSTINGS_BULK_CHUNK_SIZE]
+            term2key = {node_pair_to_term(node_a, node_b): so_key for so_key, (node_a, node_b) in chunk}
+            key2document_ids = {}
+            if self.postings_index:
+                terms = list(term2key)
+                for term, postings in zip(terms, self.postings_index.get_postings_many(FIELD_NODE_PAIR, terms)):
+                    key2document_ids[term2key[term]] = postings
+            elif self.has_node_pair_index():
+                # pairs are stored in sorted order and their postings are decoded without parsing provenance
+                pairs = [(a, b) if a <= b else (b, a) for _, (a, b) in chunk]
+                q = self.session.query(NodePairInvertedIndex.node_a, NodePairInvertedIndex.node_b,
+                                       NodePairInvertedIndex.document_ids)
+                q = q.filter(tuple_(NodePairInvertedIndex.node_a, NodePairInvertedIndex.node_b).in_(pairs))
+                q = q.filter(NodePairInvertedIndex.document_collection == self.benchmark.document_collection)
+
+                key2document_ids = {so_key: np.zeros(0, dtype=np.int64) for so_key, _ in chunk}
+                for row in q:
+                    so_key = term2key[node_pair_to_term(row.node_a, row.node_b)]
+                    key2document_ids[so_key] = decode_postings(row.document_ids).astype(np.int64)
+            else:
+                # Search for matching nodes but not for predicates (ignore direction)
+                pairs = [(a, b) for _, (a, b) in chunk] + [(b, a) for _, (a, b) in chunk]
+                q = self.session.query(PredicationInvertedIndex.subject_id, PredicationInvertedIndex.object_id,
+                                       PredicationInvertedIndex.provenance_mapping)
+                q = q.filter(tuple_(PredicationInvertedIndex.subject_id,
+                                    PredicationInvertedIndex.object_id).in_(pairs))
+                q = q.filter(PredicationInvertedIndex.document_collection == self.benchmark.document_collection)
+
+                key2ids = {so_key: set() for so_key, _ in chunk}
+                for row in q:
+                    so_key = term2key[node_pair_to_term(row.subject_id, row.object_id)]
+                    key2ids[so_key].update(int(doc_id) for doc_id in json.loads(row.provenance_mapping))
+                # postings are stored as sorted arrays
+                for so_key, document_ids in key2ids.items():
+                    key2document_ids[so_key] = np.array(sorted(document_ids), dtype=np.int64)
+
+            for so_key, document_ids in key2document_ids.items():
+                # if its pubmed use the filter for possible benchmark documents (computed once per node pair)
+                if self.benchmark.document_collection == "PubMed" and not self.postings_in_scope:
+                    baseline_document_ids = self.benchmark.get_document_array_for_baseline()
+                    if baseline_document_ids is not None:
+                        document_ids = filter_postings(document_ids, baseline_document_ids)
+                self.cache[so_key] = document_ids
+
+    def prefetch_for_documents(self, documents: [RecommenderDocument]):
+        doc2core = self.extractor.extract_narrative_cores(documents)
+        self.retrieve_documents_bulk([(stmt.subject_id, stmt.object_id) for core in doc2core.values() if core
+                                      for stmt in core.statements])
+
+    def reset_cache(self):
+        self.cache.clear()
+
+    def accumulate_document_scores(self, core: NarrativeCore, k: int = None) -> ScoreAccumulator:
+        """
+        Scores all documents that share a node pair with the core (sum of the scores of the shared statements)
+        :param core: the core of the query document
+        :param k: only the ranking of the k best documents must be exact (enables early termination)
+        :return: a ScoreAccumulator
+        """
+        # the postings of all node pairs of the core are loaded at once
+        self.retrieve_documents_bulk([(stmt.subject_id, stmt.object_id) for stmt in core.statements])
         # Core statements are also sorted by their score
-        document_ids_scored = {}
         # If a statement of the core is contained within a document, we increase the score
         # of the document by the score of the corresponding edge
-        for idx, stmt in enumerate(core.statements):
-            # retrieve matching documents
-            document_ids = self.retrieve_documents((stmt.subject_id, stmt.relation, stmt.object_id))
-
-            for doc_id in document_ids:
-                if doc_id not in document_ids_scored:
-                    document_ids_scored[doc_id] = stmt.score
-                else:
-                    document_ids_scored[doc_id] += stmt.score
-
-        return FirstStageBase.normalize_and_sort_document_scores(document_ids_scored)
+        postings = [(self.retrieve_documents((stmt.subject_id, stmt.relation, stmt.object_id)), stmt.score)
+                    for stmt in core.statements]
+        return accumulate_postings(postings, k=k)
+
+    def score_document_ids_with_core(self, core: NarrativeCore, k: int = None):
+        """
+        :param core: the core of the query document
+        :param k: only the k best documents are ranked and returned (None returns all documents)
+        :return: a list of (document id, normalized score) tuples
+        """
+        return FirstStageBase.normalize_and_sort_document_scores(self.accumulate_document_scores(core, k=k), k=k)
 
     def retrieve_documents_for(self, document: RecommenderDocument):
         # Compute the cores
@@ -74,8 +152,8 @@ class FSCore(FirstStageBase):
         if not max_core:
             return []
 
-        # score documents with this core
-        document_ids_scored = self.score_document_ids_with_core(max_core)
+        # score documents with this core (only the documents within the cutoff are ranked)
+        document_ids_scored = self.score_document_ids_with_core(max_core, k=FS_DOCUMENT_CUTOFF)
 
         # We did not find any documents
         if len(document_ids_scored) == 0:
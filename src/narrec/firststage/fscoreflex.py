@@ -1,14 +1,17 @@
+from narrec.backend.postings_index import PostingsIndex
 from narrec.benchmark.benchmark import Benchmark
 from narrec.document.core import NarrativeCoreExtractor
 from narrec.document.document import RecommenderDocument
 from narrec.firststage.base import FirstStageBase
 from narrec.firststage.fscore import FSCore
+from narrec.run_config import FS_DOCUMENT_CUTOFF_HARD
 
 
 class FSCoreFlex(FSCore):
 
-    def __init__(self, extractor: NarrativeCoreExtractor, benchmark: Benchmark, name="FSCoreFlex"):
-        super().__init__(name=name, extractor=extractor, benchmark=benchmark)
+    def __init__(self, extractor: NarrativeCoreExtractor, benchmark: Benchmark, name="FSCoreFlex",
+                 postings_index: PostingsIndex = None):
+        super().__init__(name=name, extractor=extractor, benchmark=benchmark, postings_index=postings_index)
 
     def retrieve_documents_for(self, document: RecommenderDocument):
         # Compute the cores
@@ -18,11 +21,6 @@ class FSCoreFlex(FSCore):
         if not max_core:
             return []
 
-        # score documents with this core
-        document_ids_scored = self.score_document_ids_with_core(max_core)
-
-        # We did not find any documents
-        if len(document_ids_scored) == 0:
-            return []
-
-        return FirstStageBase.apply_dynamic_cutoff(document_ids_scored)
+        # score documents with this core (only the documents up to the hard cutoff are ranked)
+        document_ids_scored = self.accumulate_document_scores(max_core, k=FS_DOCUMENT_CUTOFF_HARD)
+        return FirstStageBase.normalize_and_sort_with_dynamic_cutoff(document_ids_scored)
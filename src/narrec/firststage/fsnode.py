@@ -1,60 +1,116 @@
 import ast
 
+import numpy as np
+
 from narraint.backend.database import SessionExtended
-from narrec.backend.models import NodeInvertedIndex
+from narrec.backend.database import has_table
+from narrec.backend.models import NodeInvertedIndex, NodeInvertedIndexPacked
+from narrec.backend.postings import decode_postings, merge_postings, filter_postings
+from narrec.backend.postings_index import PostingsIndex, FIELD_NODE
 from narrec.benchmark.benchmark import Benchmark
 from narrec.document.core import NarrativeCoreExtractor, NarrativeConceptCore
 from narrec.document.document import RecommenderDocument
 from narrec.firststage.base import FirstStageBase
-from narrec.run_config import FS_DOCUMENT_CUTOFF
+from narrec.run_config import FS_DOCUMENT_CUTOFF, FS_POSTINGS_BULK_CHUNK_SIZE
+from narrec.scoring.ranking import ScoreAccumulator, accumulate_postings
 
 
 class FSNode(FirstStageBase):
 
-    def __init__(self, extractor: NarrativeCoreExtractor, benchmark: Benchmark, name="FSNode"):
+    def __init__(self, extractor: NarrativeCoreExtractor, benchmark: Benchmark, name="FSNode",
+                 postings_index: PostingsIndex = None):
         super().__init__(name=name)
         self.extractor = extractor
         self.benchmark = benchmark
-        self.session = SessionExtended.get()
+        self.postings_index = postings_index if postings_index and postings_index.has_field(FIELD_NODE) else None
+        # the database is only queried if the postings are not read from the postings index
+        self.session = SessionExtended.get() if not self.postings_index else None
+        # a benchmark-scoped postings index only contains benchmark documents
+        self.postings_in_scope = bool(self.postings_index) and self.postings_index.scope == benchmark.name
         self.concept2documents = dict()
+        # whether the packed index was computed for the collection (checked on first use)
+        self.packed_index_available = None
+
+    def has_packed_index(self) -> bool:
+        if self.packed_index_available is None:
+            # databases that predate the packed index do not have the table
+            if not has_table(self.session, NodeInvertedIndexPacked):
+                self.packed_index_available = False
+                return False
+            q = self.session.query(NodeInvertedIndexPacked.entity_id)
+            q = q.filter(NodeInvertedIndexPacked.document_collection == self.benchmark.document_collection)
+            self.packed_index_available = q.first() is not None
+        return self.packed_index_available
 
     def retrieve_documents(self, concept: str):
-        if concept in self.concept2documents:
-            return self.concept2documents[concept]
-
-        q = self.session.query(NodeInvertedIndex)
-        q = q.filter(NodeInvertedIndex.entity_id == concept)
-        q = q.filter(NodeInvertedIndex.document_collection == self.benchmark.document_collection)
-
-        document_ids = set()
-        for row in q:
-            # if its pubmed use the filter for possible benchmark documents
-            if self.benchmark.document_collection == "PubMed" and self.benchmark.get_documents_for_baseline():
-                document_ids.update({int(d) for d in ast.literal_eval(row.document_ids)
-                                     if int(d) in self.benchmark.get_documents_for_baseline()})
+        if concept not in self.concept2documents:
+            self.retrieve_documents_bulk([concept])
+        return self.concept2documents[concept]
+
+    def retrieve_documents_bulk(self, concepts: [str]):
+        """
+        Loads the postings of several concepts (one query per chunk of concepts) into the cache
+        :param concepts: a list of concepts
+        """
+        concepts = [c for c in concepts if c not in self.concept2documents]
+        for i in range(0, len(concepts), FS_POSTINGS_BULK_CHUNK_SIZE):
+            chunk = concepts[i:i + FS_POSTINGS_BULK_CHUNK_SIZE]
+            concept2postings = {c: [] for c in chunk}
+            if self.postings_index:
+                for concept, postings in zip(chunk, self.postings_index.get_postings_many(FIELD_NODE, chunk)):
+                    concept2postings[concept].append(postings)
+            elif self.has_packed_index():
+                # encoded postings are decoded without parsing text
+                q = self.session.query(NodeInvertedIndexPacked.entity_id, NodeInvertedIndexPacked.document_ids)
+                q = q.filter(NodeInvertedIndexPacked.entity_id.in_(chunk))
+                q = q.filter(NodeInvertedIndexPacked.document_collection == self.benchmark.document_collection)
+                for row in q:
+                    concept2postings[row.entity_id].append(decode_postings(row.document_ids))
             else:
-                document_ids.update({int(d) for d in ast.literal_eval(row.document_ids)})
-
-        # add to cache
-        self.concept2documents[concept] = document_ids
-        return document_ids
-
-    def score_document_ids_with_core(self, core: NarrativeConceptCore):
-        # Core statements are also sorted by their score
-        document_ids_scored = {}
-        # If a statement of the core is contained within a document, we increase the score
-        # of the document by the score of the corresponding edge
-        for idx, concept in enumerate(core.concepts):
-            # retrieve matching documents
-            document_ids = self.retrieve_documents(concept.concept)
-
-            for doc_id in document_ids:
-                if doc_id not in document_ids_scored:
-                    document_ids_scored[doc_id] = concept.score
-                else:
-                    document_ids_scored[doc_id] += concept.score
-
-        return FirstStageBase.normalize_and_sort_document_scores(document_ids_scored)
+                q = self.session.query(NodeInvertedIndex.entity_id, NodeInvertedIndex.document_ids)
+                q = q.filter(NodeInvertedIndex.entity_id.in_(chunk))
+                q = q.filter(NodeInvertedIndex.document_collection == self.benchmark.document_collection)
+                for row in q:
+                    concept2postings[row.entity_id].append(
+                        np.unique(np.array([int(d) for d in ast.literal_eval(row.document_ids)], dtype=np.int64)))
+
+            for concept, postings in concept2postings.items():
+                # postings are stored as sorted arrays
+                document_ids = merge_postings(postings)
+                # if its pubmed use the filter for possible benchmark documents
+                if self.benchmark.document_collection == "PubMed" and not self.postings_in_scope:
+                    baseline_document_ids = self.benchmark.get_document_array_for_baseline()
+                    if baseline_document_ids is not None:
+                        document_ids = filter_postings(document_ids, baseline_document_ids)
+                # add to cache
+                self.concept2documents[concept] = document_ids
+
+    def prefetch_for_documents(self, documents: [RecommenderDocument]):
+        doc2core = self.extractor.extract_concept_cores(documents)
+        self.retrieve_documents_bulk(sorted({c.concept for core in doc2core.values() if core for c in core.concepts}))
+
+    def reset_cache(self):
+        self.concept2documents.clear()
+
+    def accumulate_document_scores(self, core: NarrativeConceptCore, k: int = None) -> ScoreAccumulator:
+        """
+        Scores all documents that contain a concept of the core (sum of the scores of the contained concepts)
+        :param core: the concept core of the query document
+        :param k: only the ranking of the k best documents must be exact (enables early termination)
+        :return: a ScoreAccumulator
+        """
+        # If a concept of the core is contained within a document, we increase the score
+        # of the document by the score of the concept
+        postings = [(self.retrieve_documents(concept.concept), concept.score) for concept in core.concepts]
+        return accumulate_postings(postings, k=k)
+
+    def score_document_ids_with_core(self, core: NarrativeConceptCore, k: int = None):
+        """
+        :param core: the core of the query document
+        :param k: only the k best documents are ranked and returned (None returns all documents)
+        :return: a list of (document id, normalized score) tuples
+        """
+        return FirstStageBase.normalize_and_sort_document_scores(self.accumulate_document_scores(core, k=k), k=k)
 
     def retrieve_documents_for(self, document: RecommenderDocument):
         # Compute the cores
@@ -64,8 +120,8 @@ class FSNode(FirstStageBase):
         if not core:
             return []
 
-        # score documents with this core
-        document_ids_scored = self.score_document_ids_with_core(core)
+        # score documents with this core (only the documents within the cutoff are ranked)
+        document_ids_scored = self.score_document_ids_with_core(core, k=FS_DOCUMENT_CUTOFF)
 
         # We did not find any documents
         if len(document_ids_scored) == 0:
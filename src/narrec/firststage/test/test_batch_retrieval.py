@@ -0,0 +1,182 @@
+import random
+import unittest
+from unittest import mock
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from narrec.backend.models import NodePairInvertedIndex
+from narrec.backend.postings import encode_postings
+from narrec.backend.postings_index import FIELD_CONCEPT, FIELD_NODE, FIELD_NODE_PAIR, FIELD_CONCEPT_SCORED, \
+    node_pair_to_term
+from narrec.document.core import NarrativeCore, NarrativeConceptCore, ScoredConcept
+from narrec.firststage.fsconcept import FSConcept
+from narrec.firststage.fsconceptflex import FSConceptFlex
+from narrec.firststage.fsconceptplus import FSConceptPlus
+from narrec.firststage.fscore import FSCore
+from narrec.firststage.fscoreflex import FSCoreFlex
+from narrec.firststage.fsnode import FSNode
+from narrec.firststage.fsnodeflex import FSNodeFlex
+from narrectests.stubs import IdDocument, PrecomputedCoreExtractor, create_scored_statement
+
+MAX_DOCUMENT_ID = 20000
+FIRST_STAGES = [FSConcept, FSConceptFlex, FSConceptPlus, FSNode, FSNodeFlex, FSCore, FSCoreFlex]
+
+
+class StubBenchmark:
+    """
+    A PubMed benchmark whose baseline consists of the even document ids
+    """
+    name = "stub"
+    document_collection = "PubMed"
+
+    def get_document_array_for_baseline(self) -> np.ndarray:
+        return np.arange(0, MAX_DOCUMENT_ID, 2, dtype=np.int64)
+
+
+class StubPostingsIndex:
+    """
+    Serves postings from dictionaries and counts the lookups (same interface as PostingsIndex)
+    """
+    scope = None
+
+    def __init__(self, field2term2postings: dict, term2scores: dict):
+        self.field2term2postings = field2term2postings
+        self.term2scores = term2scores
+        self.lookups = 0
+
+    def has_field(self, field: str) -> bool:
+        return field in self.field2term2postings
+
+    def get_postings_many(self, field: str, terms: [str]):
+        self.lookups += 1
+        term2postings = self.field2term2postings[field]
+        return [term2postings.get(t, np.zeros(0, dtype=np.int64)) for t in terms]
+
+    def get_postings_with_values_many(self, field: str, terms: [str], column: str):
+        self.lookups += 1
+        return [(self.field2term2postings[field].get(t, np.zeros(0, dtype=np.int64)),
+                 self.term2scores.get(t, np.zeros(0, dtype=np.float64))) for t in terms]
+
+
+def random_postings(rnd: random.Random) -> np.ndarray:
+    size = rnd.choice([1, 10, 200, 3000])
+    return np.array(sorted(rnd.sample(range(MAX_DOCUMENT_ID), size)), dtype=np.int64)
+
+
+class BatchRetrievalTestCase(unittest.TestCase):
+
+    def setUp(self):
+        rnd = random.Random(42)
+        concepts = [f'MESH:D{i:06d}' for i in range(60)]
+        # the last concepts are unknown to the index
+        known = concepts[:50]
+        self.term2postings = {c: random_postings(rnd) for c in known}
+        self.node_pair2postings = {}
+        for _ in range(300):
+            a, b = rnd.sample(known[:30], 2)
+            self.node_pair2postings[node_pair_to_term(a, b)] = random_postings(rnd)
+        term2scores = {c: np.array([rnd.random() for _ in p], dtype=np.float64)
+                       for c, p in self.term2postings.items()}
+        self.index = StubPostingsIndex({FIELD_CONCEPT: self.term2postings, FIELD_NODE: self.term2postings,
+                                        FIELD_CONCEPT_SCORED: self.term2postings,
+                                        FIELD_NODE_PAIR: self.node_pair2postings}, term2scores)
+
+        doc2concept_core, doc2core = {}, {}
+        self.topics = []
+        for topic_idx in range(40):
+            document = IdDocument(100 + topic_idx)
+            self.topics.append((topic_idx, document))
+            # some topics share concepts, some do not have a core at all
+            scored = sorted([ScoredConcept(c, rnd.random(), 1.0, 1) for c in rnd.sample(concepts, rnd.randint(0, 8))],
+                            key=lambda c: c.score, reverse=True)
+            doc2concept_core[document.id] = NarrativeConceptCore(scored) if scored else None
+            statements = []
+            for _ in range(rnd.randint(0, 6)):
+                s, o = rnd.sample(concepts[:32], 2)
+                statements.append(create_scored_statement(s, o, relation="treats", confidence=1.0, score=rnd.random()))
+            statements.sort(key=lambda x: x.score, reverse=True)
+            doc2core[document.id] = NarrativeCore(statements) if statements else None
+        self.extractor = PrecomputedCoreExtractor(doc2core, doc2concept_core)
+
+    def assertBatchEqualsPerTopic(self, first_stage, count_lookups):
+        lookups = count_lookups()
+        per_topic = []
+        for topic_idx, document in self.topics:
+            first_stage.set_current_topic(topic_idx)
+            per_topic.append(first_stage.retrieve_documents_for(document))
+        per_topic_lookups = count_lookups() - lookups
+
+        first_stage.reset_cache()
+        lookups = count_lookups()
+        batch = first_stage.retrieve_documents_for_topics(self.topics)
+        batch_lookups = count_lookups() - lookups
+
+        self.assertEqual(per_topic, batch, msg=first_stage.name)
+        # the rankings are not trivial
+        self.assertGreater(sum(1 for ranking in batch if ranking), len(self.topics) // 4)
+        self.assertTrue(any(len(ranking) > 100 for ranking in batch))
+        # all postings are fetched with a single lookup
+        self.assertEqual(1, batch_lookups, msg=first_stage.name)
+        self.assertGreater(per_topic_lookups, batch_lookups, msg=first_stage.name)
+        return batch
+
+    def test_batch_equals_per_topic(self):
+        for first_stage_cls in FIRST_STAGES:
+            first_stage = first_stage_cls(self.extractor, StubBenchmark(), postings_index=self.index)
+            self.assertBatchEqualsPerTopic(first_stage, lambda: self.index.lookups)
+
+    def test_batch_is_repeatable(self):
+        for first_stage_cls in FIRST_STAGES:
+            first_stage = first_stage_cls(self.extractor, StubBenchmark(), postings_index=self.index)
+            # cached postings give the same result as a cold run
+            self.assertEqual(first_stage.retrieve_documents_for_topics(self.topics),
+                             first_stage.retrieve_documents_for_topics(self.topics))
+
+    def test_baseline_filter(self):
+        first_stage = FSConcept(self.extractor, StubBenchmark(), postings_index=self.index)
+        for ranking in first_stage.retrieve_documents_for_topics(self.topics):
+            self.assertTrue(all(document_id % 2 == 0 for document_id, _ in ranking))
+
+    def test_fscore_node_pair_table(self):
+        # the node pair table of the database gives the same rankings as the postings index
+        engine = create_engine('sqlite://')
+        NodePairInvertedIndex.__table__.create(engine)
+        session = sessionmaker(bind=engine)()
+        for term, document_ids in self.node_pair2postings.items():
+            node_a, node_b = sorted(term.split(node_pair_to_term('', '')))
+            session.add(NodePairInvertedIndex(node_a=node_a, node_b=node_b, document_collection="PubMed",
+                                              support=len(document_ids), document_ids=encode_postings(document_ids)))
+        session.commit()
+
+        queries = []
+        session_query = session.query
+
+        def counting_query(*args, **kwargs):
+            queries.append(args)
+            return session_query(*args, **kwargs)
+
+        session.query = counting_query
+        expected = FSCore(self.extractor, StubBenchmark(), postings_index=self.index) \
+            .retrieve_documents_for_topics(self.topics)
+        for first_stage_cls in [FSCore, FSCoreFlex]:
+            with mock.patch("narrec.firststage.fscore.SessionExtended") as session_extended:
+                session_extended.get.return_value = session
+                first_stage = first_stage_cls(self.extractor, StubBenchmark())
+            self.assertTrue(first_stage.has_node_pair_index())
+            batch = self.assertBatchEqualsPerTopic(first_stage, lambda: len(queries))
+            if first_stage_cls == FSCore:
+                self.assertEqual(expected, batch)
+
+    def test_fscore_without_node_pair_table(self):
+        # databases without a node pair index fall back to the predication index
+        session = sessionmaker(bind=create_engine('sqlite://'))()
+        with mock.patch("narrec.firststage.fscore.SessionExtended") as session_extended:
+            session_extended.get.return_value = session
+            first_stage = FSCore(self.extractor, StubBenchmark())
+        self.assertFalse(first_stage.has_node_pair_index())
+
+
+if __name__ == '__main__':
+    unittest.main()
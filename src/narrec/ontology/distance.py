@@ -0,0 +1,243 @@
+from collections import defaultdict
+from typing import List, Tuple, Dict
+
+from narrec.backend.cache import LRUCache
+from narrec.ontology.ontology import Ontology
+from narrec.run_config import DISTANCE_CACHE_MAX_ITEMS
+
+
+class OntologyDistanceEngine:
+    """
+    Computes ontological distances between MeSH descriptors and between ChEMBL ids (same semantics as
+    Ontology.compute_ontological_distance, i.e., ontological_mesh_distance and compute_chembl_ontological_distance)
+    MeSH tree numbers and ATC classes (ChEMBL) are parsed once into integer paths of one unified index (one
+    interned id per tree level, the vocabulary is part of the first level).
+    The distance between two paths is derived from the length of their common prefix, i.e., the depth of their
+    lowest common ancestor. Computed distances are cached per (unordered) concept pair.
+    """
+    _instance = None
+
+    def __init__(self, ontology: Ontology = None, cache_max_items: int = DISTANCE_CACHE_MAX_ITEMS):
+        self.ontology = ontology if ontology else Ontology()
+        self.level2id = {}
+        self.concept2paths = {}
+        self.distance_cache = LRUCache(max_items=cache_max_items)
+        # (concept, radius) -> prefixes of the concept's paths which are at most radius steps upwards
+        self.neighbourhood_cache = LRUCache(max_items=cache_max_items)
+
+    @staticmethod
+    def instance():
+        # the ontologies are large, so all recommenders of a process share the same engine (and its caches)
+        if not OntologyDistanceEngine._instance:
+            OntologyDistanceEngine._instance = OntologyDistanceEngine()
+        return OntologyDistanceEngine._instance
+
+    def __intern_level(self, level: str) -> int:
+        if level not in self.level2id:
+            self.level2id[level] = len(self.level2id)
+        return self.level2id[level]
+
+    def __to_path(self, vocabulary: str, levels: [str]) -> Tuple[int, ...]:
+        # the first level is interned together with the vocabulary, so paths of MeSH and ATC never agree
+        return (self.__intern_level((vocabulary, levels[0])),) + tuple(self.__intern_level(l) for l in levels[1:])
+
+    def get_paths(self, concept: str) -> List[Tuple[int, ...]]:
+        """
+        :param concept: a concept id (e.g., MESH:D003920 or CHEMBL1234)
+        :return: the MeSH tree numbers / ATC classes of the concept as integer paths (empty if the concept is
+                 not contained in one of the ontologies)
+        """
+        if concept in self.concept2paths:
+            return self.concept2paths[concept]
+
+        paths = []
+        if concept.startswith('MESH:D'):
+            try:
+                for tree_no in self.ontology.mesh_ontology.get_tree_numbers_for_descriptor(concept[5:]):
+                    paths.append(self.__to_path('MESH', tree_no.split('.')))
+            except KeyError:
+                # some descriptor does not have a tree number
+                pass
+        elif concept.startswith('CHEMBL'):
+            # only the final atc classification level (code len = 7): R06AE06 -> R.06.A.E06
+            for atc in self.ontology.atc.chembl2atcclass.get(concept, []):
+                if len(atc) == 7:
+                    paths.append(self.__to_path('ATC', [atc[0], atc[1:3], atc[3], atc[4:]]))
+        self.concept2paths[concept] = paths
+        return paths
+
+    @staticmethod
+    def path_distance(path_a: Tuple[int, ...], path_b: Tuple[int, ...]) -> int:
+        # they do not agree on their first prefix
+        if path_a[0] != path_b[0]:
+            return -1
+        # depth of the lowest common ancestor
+        common = 0
+        for level_a, level_b in zip(path_a, path_b):
+            if level_a != level_b:
+                break
+            common += 1
+        return (len(path_a) - common) + (len(path_b) - common)
+
+    def distance(self, a: str, b: str) -> int:
+        """
+        Computes the minimum distance between all paths (tree numbers or ATC classes) of a and b
+        :param a: concept id a
+        :param b: concept id b
+        :return: the distance or -1 if there is no path between a and b
+        """
+        # equal concepts have distance 0 (even without tree numbers / ATC classes)
+        if a == b:
+            return 0
+        key = (a, b) if a <= b else (b, a)
+        distance = self.distance_cache.get(key)
+        if distance is not None:
+            return distance
+
+        distance = -1
+        for path_a in self.get_paths(a):
+            for path_b in self.get_paths(b):
+                dis = OntologyDistanceEngine.path_distance(path_a, path_b)
+                if dis >= 0 and (distance < 0 or dis < distance):
+                    distance = dis
+        self.distance_cache.put(key, distance)
+        return distance
+
+    def similarity(self, a: str, b: str) -> float:
+        if a == b:
+            return 1.0
+
+        distance = self.distance(a, b)
+        # no distance -> perfect similarity
+        if distance == 0:
+            return 1.0
+        # there is no path between a and b
+        elif distance == -1:
+            return 0.0
+        else:
+            return 1.0 / distance
+
+    @staticmethod
+    def max_distance(threshold: float) -> int:
+        """
+        :param threshold: a similarity threshold
+        :return: the largest distance d with 1 / d >= threshold (None if every distance passes the threshold)
+        """
+        if threshold <= 0.0:
+            return None
+        if threshold > 1.0:
+            return -1
+        distance = int(1.0 / threshold)
+        # guard against rounding issues
+        while 1.0 / (distance + 1) >= threshold:
+            distance += 1
+        while distance > 1 and 1.0 / distance < threshold:
+            distance -= 1
+        return distance
+
+    def get_neighbourhood_prefixes(self, concept: str, radius: int) -> frozenset:
+        """
+        The neighbourhood of a concept is given by the ancestors of its paths that can be reached within
+        radius steps upwards. Only concepts below these ancestors can be within the radius.
+        :param concept: a concept id
+        :param radius: the maximum distance
+        :return: a set of path prefixes
+        """
+        key = (concept, radius)
+        prefixes = self.neighbourhood_cache.get(key)
+        if prefixes is not None:
+            return prefixes
+
+        prefixes = set()
+        for path in self.get_paths(concept):
+            # distances are only defined if both paths agree on their first level
+            for depth in range(max(1, len(path) - radius), len(path) + 1):
+                prefixes.add(path[:depth])
+        prefixes = frozenset(prefixes)
+        self.neighbourhood_cache.put(key, prefixes)
+        return prefixes
+
+    def build_prefix_index(self, nodes: [str], radius: int) -> Dict[Tuple[int, ...], List[int]]:
+        """
+        Indexes a list of nodes by the prefixes of their paths
+        A node is only registered under prefixes that are at most radius steps above it.
+        :param nodes: a list of nodes
+        :param radius: the maximum distance
+        :return: a dictionary mapping a path prefix to the positions of the nodes below it
+        """
+        prefix2positions = defaultdict(list)
+        for position, node in enumerate(nodes):
+            for prefix in self.get_neighbourhood_prefixes(node, radius):
+                prefix2positions[prefix].append(position)
+        return prefix2positions
+
+    def create_neighbourhood(self, nodes, threshold: float):
+        """
+        :param nodes: the nodes of a query document
+        :param threshold: the minimum similarity
+        :return: a NodeNeighbourhood that can be reused for all candidates of the query
+        """
+        return NodeNeighbourhood(self, nodes, threshold)
+
+    def similar_pairs(self, nodes_a, nodes_b, threshold: float) -> List[Tuple[str, str, float]]:
+        """
+        Computes all node pairs between two node sets whose similarity is at least the threshold
+        The pairs are returned in sorted node order (independent of the iteration order of sets, so that matchings
+        are reproducible across processes).
+        :param nodes_a: first set of nodes
+        :param nodes_b: second set of nodes
+        :param threshold: the minimum similarity
+        :return: a list of (node a, node b, similarity) tuples
+        """
+        return self.create_neighbourhood(nodes_a, threshold).similar_pairs(nodes_b)
+
+
+class NodeNeighbourhood:
+    """
+    Query-side state for node matching (computed once per query document)
+    The paths of the query nodes are indexed by their prefixes within the radius given by the threshold.
+    A candidate node is only compared to the query nodes that share one of these prefixes (identical nodes are
+    always similar).
+    """
+
+    def __init__(self, engine: OntologyDistanceEngine, nodes, threshold: float):
+        self.engine = engine
+        self.nodes = sorted(nodes)
+        self.threshold = threshold
+        self.radius = OntologyDistanceEngine.max_distance(threshold)
+        self.node2positions = defaultdict(list)
+        for position, node in enumerate(self.nodes):
+            self.node2positions[node].append(position)
+        if self.radius is not None and self.radius >= 0:
+            self.prefix2positions = engine.build_prefix_index(self.nodes, self.radius)
+        else:
+            self.prefix2positions = {}
+
+    def similar_pairs(self, nodes_b) -> List[Tuple[str, str, float]]:
+        """
+        Computes all pairs between the query nodes and nodes_b whose similarity is at least the threshold
+        :param nodes_b: the nodes of a candidate document
+        :return: a list of (query node, node b, similarity) tuples in sorted node order
+        """
+        nodes_b = sorted(nodes_b)
+        if self.radius is None:
+            # every pair passes the threshold
+            return [(a, b, self.engine.similarity(a, b)) for a in self.nodes for b in nodes_b]
+        if self.radius < 0:
+            return []
+
+        matches = []
+        for position_b, b in enumerate(nodes_b):
+            positions = set(self.node2positions.get(b, []))
+            for prefix in self.engine.get_neighbourhood_prefixes(b, self.radius):
+                if prefix in self.prefix2positions:
+                    positions.update(self.prefix2positions[prefix])
+
+            for position_a in positions:
+                similarity = self.engine.similarity(self.nodes[position_a], b)
+                if similarity >= self.threshold:
+                    matches.append((position_a, position_b, similarity))
+
+        matches.sort(key=lambda x: (x[0], x[1]))
+        return [(self.nodes[position_a], nodes_b[position_b], similarity)
+                for position_a, position_b, similarity in matches]
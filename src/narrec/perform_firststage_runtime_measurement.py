@@ -4,11 +4,16 @@ from datetime import datetime
 
 import numpy
 
+from narrec.backend.core_index import CoreIndex
+from narrec.backend.core_store import CoreStore
+from narrec.backend.document_store import DocumentStore
+from narrec.backend.postings_index import PostingsIndex
 from narrec.backend.retriever import DocumentRetriever
 from narrec.benchmark.benchmark import Benchmark
 from narrec.config import RESULT_DIR, INDEX_DIR, GLOBAL_DB_DOCUMENT_COLLECTION, RUNTIME_MEASUREMENT_RESULT_DIR
 from narrec.document.core import NarrativeCoreExtractor
 from narrec.document.corpus import DocumentCorpus
+from narrec.firststage.base import FirstStageBase
 from narrec.firststage.bm25abstract import BM25Abstract
 from narrec.firststage.bm25title import BM25Title
 from narrec.firststage.fsconcept import FSConcept
@@ -18,7 +23,29 @@ from narrec.firststage.fscoreflex import FSCoreFlex
 from narrec.firststage.fsnode import FSNode
 from narrec.firststage.fsnodeflex import FSNodeFlex
 from narrec.run import run_first_stage_for_benchmark
-from narrec.run_config import BENCHMARKS, LOAD_FULL_IDF_CACHE, NO_PERFORMANCE_MEASUREMENTS
+from narrec.run_config import BENCHMARKS, LOAD_FULL_IDF_CACHE, NO_PERFORMANCE_MEASUREMENTS, \
+    DOCUMENT_CACHE_MAX_DOCUMENTS, DOCUMENT_CACHE_MAX_BYTES, USE_DOCUMENT_STORE, COMPACT_DOCUMENTS, \
+    CORE_CACHE_MAX_ITEMS, USE_CORE_STORE, USE_CORE_INDEX, USE_POSTINGS_INDEX
+
+
+def measure_topic_throughput(retriever: DocumentRetriever, bench: Benchmark, first_stage: FirstStageBase,
+                             fs_path: str) -> dict:
+    """
+    Compares the per-topic throughput of retrieving the topics one by one and of the batch mode (postings of all
+    topics are prefetched in bulk queries). Both modes start with an empty postings cache.
+    :return: a dictionary with the runtime and the number of topics per second of both modes
+    """
+    topics = len(list(bench.iterate_over_document_entries()))
+    result = dict(topics=topics)
+    for mode, batch in [("per_topic", False), ("batch", True)]:
+        first_stage.reset_cache()
+        time_start = datetime.now()
+        run_first_stage_for_benchmark(retriever, bench, first_stage, fs_path, write_results=False, verbose=False,
+                                      progress=True, batch=batch)
+        seconds = (datetime.now() - time_start).total_seconds()
+        result[mode] = dict(seconds=seconds, topics_per_second=topics / max(seconds, 1e-9))
+        print(f'{mode:<10}: {topics} topics in {round(seconds, 2)}s ({round(topics / max(seconds, 1e-9), 2)} topics/s)')
+    return result
 
 
 def perform_benchmark_first_stage_runtime_measurement(bench: Benchmark):
@@ -27,16 +54,25 @@ def perform_benchmark_first_stage_runtime_measurement(bench: Benchmark):
         corpus.load_all_support_into_memory()
 
     index_path = os.path.join(INDEX_DIR, bench.get_index_name())
-    core_extractor = NarrativeCoreExtractor(corpus=corpus)
-    retriever = DocumentRetriever()
+    core_extractor = NarrativeCoreExtractor(corpus=corpus, cache_max_items=CORE_CACHE_MAX_ITEMS,
+                                            core_store=CoreStore() if USE_CORE_STORE else None,
+                                            core_index=CoreIndex() if USE_CORE_INDEX else None)
+    retriever = DocumentRetriever(cache_max_documents=DOCUMENT_CACHE_MAX_DOCUMENTS,
+                                  cache_max_bytes=DOCUMENT_CACHE_MAX_BYTES,
+                                  document_store=DocumentStore() if USE_DOCUMENT_STORE else None,
+                                  compact_documents=COMPACT_DOCUMENTS)
     bench.load_benchmark_data()
 
-    first_stages = [FSConceptFlex(core_extractor, bench),
-                    FSCoreFlex(core_extractor, bench),
-                    FSNodeFlex(core_extractor, bench),
-                    FSConcept(core_extractor, bench),
-                    FSCore(core_extractor, bench),
-                    FSNode(core_extractor, bench),
+    postings_index = None
+    if USE_POSTINGS_INDEX:
+        # postings restricted to the benchmark documents (cached on disk per benchmark)
+        postings_index = PostingsIndex(collection=bench.document_collection).scoped_to_benchmark(bench)
+    first_stages = [FSConceptFlex(core_extractor, bench, postings_index=postings_index),
+                    FSCoreFlex(core_extractor, bench, postings_index=postings_index),
+                    FSNodeFlex(core_extractor, bench, postings_index=postings_index),
+                    FSConcept(core_extractor, bench, postings_index=postings_index),
+                    FSCore(core_extractor, bench, postings_index=postings_index),
+                    FSNode(core_extractor, bench, postings_index=postings_index),
                     BM25Abstract(index_path),
                     BM25Title(index_path)]
     print('==' * 60)
@@ -71,6 +107,9 @@ def perform_benchmark_first_stage_runtime_measurement(bench: Benchmark):
         result_dict["mean"] = sum(times) / len(times)
         result_dict["std"] = numpy.std(times)
 
+        print('Measuring per-topic throughput (one by one vs. batch)...')
+        result_dict["throughput"] = measure_topic_throughput(retriever, bench, first_stage, fs_path)
+
         print(f'Writing runtime measurement results to: {path}')
         with open(path, 'wt') as f:
             json.dump(result_dict, f, indent=4)
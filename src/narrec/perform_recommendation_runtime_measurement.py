@@ -5,6 +5,9 @@ from datetime import datetime
 import numpy
 from tqdm import tqdm
 
+from narrec.backend.core_index import CoreIndex
+from narrec.backend.core_store import CoreStore
+from narrec.backend.document_store import DocumentStore
 from narrec.backend.retriever import DocumentRetriever
 from narrec.benchmark.benchmark import Benchmark
 from narrec.citation.graph import CitationGraph
@@ -13,23 +16,69 @@ from narrec.config import RESULT_DIR, INDEX_DIR, GLOBAL_DB_DOCUMENT_COLLECTION,
 from narrec.document.core import NarrativeCoreExtractor
 from narrec.document.corpus import DocumentCorpus
 from narrec.firststage.fsconceptflex import FSConceptFlex
+from narrec.recommender.aligned_cores import AlignedCoresRecommender
+from narrec.recommender.aligned_nodes import AlignedNodesRecommender
+from narrec.recommender.base import RecommenderBase
 from narrec.recommender.bm25 import BM25Recommender
 from narrec.recommender.coreoverlap import CoreOverlap
 from narrec.recommender.graph_base_fallback_bm25 import GraphBaseFallbackBM25
 from narrec.run import load_document_ids_from_runfile
-from narrec.run_config import BENCHMARKS, LOAD_FULL_IDF_CACHE, NO_PERFORMANCE_MEASUREMENTS
+from narrec.run_config import BENCHMARKS, LOAD_FULL_IDF_CACHE, NO_PERFORMANCE_MEASUREMENTS, \
+    DOCUMENT_CACHE_MAX_DOCUMENTS, DOCUMENT_CACHE_MAX_BYTES, USE_DOCUMENT_STORE, COMPACT_DOCUMENTS, \
+    STATEMENT_SUPPORT_PRELOAD, CORE_CACHE_MAX_ITEMS, USE_CORE_STORE, USE_CORE_INDEX, RECOMMENDER_SCORING_CHUNK_SIZE, \
+    RECOMMENDER_SCORING_WORKER_CURVE
 from narrec.scoring.BM25Scorer import BM25Scorer
 
 
+def measure_parallel_scoring_speedup(recommenders: [RecommenderBase], topics, citation_graph: CitationGraph) -> dict:
+    """
+    Measures the runtime of recommenders that score every candidate on its own for different worker counts
+    :param recommenders: a list of recommenders
+    :param topics: a list of (input document, candidate documents) pairs
+    :param citation_graph: citation network
+    :return: a dictionary mapping a recommender name to the mean runtime and speedup per worker count
+    """
+    result = dict()
+    for recommender in recommenders:
+        result[recommender.name] = dict()
+        for workers in RECOMMENDER_SCORING_WORKER_CURVE:
+            recommender.enable_parallel_scoring(workers, RECOMMENDER_SCORING_CHUNK_SIZE)
+            times = []
+            for input_doc, documents in tqdm(topics, desc=f"{recommender.name} with {workers} workers"):
+                for i in range(0, NO_PERFORMANCE_MEASUREMENTS):
+                    time_start = datetime.now()
+                    recommender.recommend_documents(input_doc, documents, citation_graph)
+                    time_taken = datetime.now() - time_start
+                    # first run is cold start
+                    if i > 0:
+                        times.append(time_taken.total_seconds())
+            result[recommender.name][workers] = {"mean": sum(times) / len(times), "std": numpy.std(times)}
+        recommender.enable_parallel_scoring(1)
+
+        base_time = result[recommender.name][RECOMMENDER_SCORING_WORKER_CURVE[0]]["mean"]
+        for workers in RECOMMENDER_SCORING_WORKER_CURVE:
+            speedup = base_time / result[recommender.name][workers]["mean"]
+            result[recommender.name][workers]["speedup"] = speedup
+            print(f'{recommender.name}: {workers} workers -> speedup {round(speedup, 2)}')
+    return result
+
+
 def perform_benchmark_first_stage_runtime_measurement(bench: Benchmark):
     citation_graph = CitationGraph()
     corpus = DocumentCorpus(collections=[GLOBAL_DB_DOCUMENT_COLLECTION])
     if LOAD_FULL_IDF_CACHE:
         corpus.load_all_support_into_memory()
+    if STATEMENT_SUPPORT_PRELOAD == "full":
+        corpus.load_all_statement_support_into_memory()
 
     index_path = os.path.join(INDEX_DIR, bench.get_index_name())
-    core_extractor = NarrativeCoreExtractor(corpus=corpus)
-    retriever = DocumentRetriever()
+    core_extractor = NarrativeCoreExtractor(corpus=corpus, cache_max_items=CORE_CACHE_MAX_ITEMS,
+                                            core_store=CoreStore() if USE_CORE_STORE else None,
+                                            core_index=CoreIndex() if USE_CORE_INDEX else None)
+    retriever = DocumentRetriever(cache_max_documents=DOCUMENT_CACHE_MAX_DOCUMENTS,
+                                  cache_max_bytes=DOCUMENT_CACHE_MAX_BYTES,
+                                  document_store=DocumentStore() if USE_DOCUMENT_STORE else None,
+                                  compact_documents=COMPACT_DOCUMENTS)
     bench.load_benchmark_data()
 
     first_stage = FSConceptFlex(extractor=core_extractor, benchmark=bench)
@@ -37,9 +86,12 @@ def perform_benchmark_first_stage_runtime_measurement(bench: Benchmark):
     recommender_coreoverlap = CoreOverlap(extractor=core_extractor)
 
     bm25_scorer = BM25Scorer(index_path)
+    aligned_recommenders = [AlignedNodesRecommender(corpus=corpus, extractor=core_extractor),
+                            AlignedCoresRecommender(corpus=corpus, extractor=core_extractor)]
     recommenders = [recommender_coreoverlap,
                     GraphBaseFallbackBM25(bm25scorer=bm25_scorer, graph_recommender=recommender_coreoverlap),
-                    BM25Recommender(bm25scorer=bm25_scorer)]
+                    BM25Recommender(bm25scorer=bm25_scorer),
+                    *aligned_recommenders]
 
     print('==' * 60)
     print(f'Measuring runtime on benchmark: {bench.name}')
@@ -62,6 +114,7 @@ def perform_benchmark_first_stage_runtime_measurement(bench: Benchmark):
     recommender2times = dict()
     for r in recommenders:
         recommender2times[r.name] = list()
+    topics = []
 
     for topicid, retrieved_docs in tqdm(fs_docs.items(), desc="Evaluating topics"):
         # Retrieve the input document
@@ -72,6 +125,10 @@ def perform_benchmark_first_stage_runtime_measurement(bench: Benchmark):
         retrieved_doc_ids = [d[0] for d in retrieved_docs]
         documents = retriever.retrieve_narrative_documents(retrieved_doc_ids,
                                                            GLOBAL_DB_DOCUMENT_COLLECTION)
+        if STATEMENT_SUPPORT_PRELOAD == "candidates":
+            corpus.preload_statement_support([input_doc] + documents)
+        topics.append((input_doc, documents))
+
         for recommender in recommenders:
 
             times = []
@@ -95,6 +152,9 @@ def perform_benchmark_first_stage_runtime_measurement(bench: Benchmark):
             "std": numpy.std(times)
         }
 
+    print('Measuring the speedup of parallel candidate scoring...')
+    result_dict["parallel_scoring"] = measure_parallel_scoring_speedup(aligned_recommenders, topics, citation_graph)
+
     print(f'Writing runtime measurement results to: {path}')
     with open(path, 'wt') as f:
         json.dump(result_dict, f, indent=4)
@@ -6,10 +6,18 @@ from narrec.recommender.graph_base import GraphBase
 
 
 class AlignedCoresRecommender(GraphBase):
-    def __init__(self, corpus: DocumentCorpus, name="AlignedCoresRecommender"):
+    def __init__(self, corpus: DocumentCorpus, name="AlignedCoresRecommender",
+                 extractor: NarrativeCoreExtractor = None):
         super().__init__(name=name)
         self.corpus = corpus
-        self.extractor = NarrativeCoreExtractor(corpus=self.corpus)
+        # share the extractor (and its core cache) with other components if possible
+        self.extractor = extractor if extractor else NarrativeCoreExtractor(corpus=self.corpus)
+
+    def recommend_documents(self, doc: RecommenderDocument, docs_from: [RecommenderDocument],
+                            citation_graph: CitationGraph) -> [RecommenderDocument]:
+        # compute the cores of all candidates in a single batch (cached by the extractor)
+        self.extractor.extract_narrative_cores(docs_from)
+        return super().recommend_documents(doc, docs_from, citation_graph)
 
     def compute_document_score(self, doc: RecommenderDocument, candidate: RecommenderDocument,
                                citation_graph: CitationGraph) -> float:
@@ -24,11 +32,17 @@ class AlignedCoresRecommender(GraphBase):
         if not candidate_core:
             return 0.0
 
-        for node_a1, node_b1, osim1 in node_matchings:
-            for node_a2, node_b2, osim2 in node_matchings:
-                for stmt in candidate_core.statements:
-                    edge = stmt.get_triple()
-                    if edge[0] == node_b1 and edge[2] == node_b2:
-                        similarity_score += osim1 * osim2 * stmt.score
+        # only edges between two matched nodes contribute
+        node2matching = {node_b: (idx, osim) for idx, (_, node_b, osim) in enumerate(node_matchings)}
+        contributions = []
+        for (subject_id, object_id), scores in candidate_core.get_edge_scores().items():
+            if subject_id in node2matching and object_id in node2matching:
+                contributions.append((node2matching[subject_id], node2matching[object_id], scores))
+
+        # sum in the order of the matchings (same result as iterating over all pairs of matchings)
+        contributions.sort(key=lambda x: (x[0][0], x[1][0]))
+        for (_, osim1), (_, osim2), scores in contributions:
+            for score in scores:
+                similarity_score += osim1 * osim2 * score
 
         return similarity_score
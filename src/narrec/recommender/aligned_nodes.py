@@ -6,18 +6,22 @@ from narrec.recommender.graph_base import GraphBase
 
 
 class AlignedNodesRecommender(GraphBase):
-    def __init__(self, corpus: DocumentCorpus, name="AlignedNodesRecommender"):
+    def __init__(self, corpus: DocumentCorpus, name="AlignedNodesRecommender",
+                 extractor: NarrativeCoreExtractor = None):
         super().__init__(name=name)
         self.corpus = corpus
-        self.extractor = NarrativeCoreExtractor(corpus=self.corpus)
+        # share the extractor (and its core cache) with other components if possible
+        self.extractor = extractor if extractor else NarrativeCoreExtractor(corpus=self.corpus)
 
     def node_score(self, node, candidate_core: NarrativeCore):
-        scores = [statement.score
-                  for statement in candidate_core.statements
-                  if statement.subject_id == node or statement.object_id == node]
-        if len(scores) == 0:
-            return 0.0
-        return sum(scores) # / len(scores)
+        # summed score of all statements that contain the node (aggregated once per core)
+        return candidate_core.get_node_scores().get(node, 0.0)
+
+    def recommend_documents(self, doc: RecommenderDocument, docs_from: [RecommenderDocument],
+                            citation_graph: CitationGraph) -> [RecommenderDocument]:
+        # compute the cores of all candidates in a single batch (cached by the extractor)
+        self.extractor.extract_narrative_cores(docs_from)
+        return super().recommend_documents(doc, docs_from, citation_graph)
 
     def compute_document_score(self, doc: RecommenderDocument, candidate: RecommenderDocument,
                                citation_graph: CitationGraph) -> float:
@@ -1,11 +1,41 @@
+import multiprocessing
+
+from narrec.backend.database import dispose_inherited_sessions
 from narrec.citation.graph import CitationGraph
 from narrec.document.document import RecommenderDocument
+from narrec.scoring.ranking import rank_document_scores
+
+# the scoring task of the current parallel call (inherited by the forked workers)
+_parallel_task = None
+
+
+def _score_range(start: int, end: int) -> [float]:
+    recommender, doc, docs_from, citation_graph = _parallel_task
+    return [recommender.compute_document_score(doc, candidate, citation_graph) for candidate in docs_from[start:end]]
 
 
 class RecommenderBase:
 
     def __init__(self, name):
         self.name = name
+        self.scoring_workers = 1
+        self.scoring_chunk_size = None
+
+    def enable_parallel_scoring(self, workers: int, chunk_size: int = 100):
+        """
+        Scores the candidates of score_documents in forked worker processes
+        The workers are forked for every call and inherit the recommender state (corpus, caches, ontology) and the
+        documents copy-on-write, so only the scores are transferred between the processes.
+        The workers do not share the inherited database connections: they drop the inherited sessions and open new
+        connections if they need the database (the document and core stores reconnect per process anyway).
+        Caches filled by a worker (e.g., cores or documents loaded on demand) are lost when the worker terminates and
+        are not visible to the other processes. So everything the scoring needs should be loaded before
+        score_documents is called (e.g., the aligned recommenders extract the cores of all candidates in one batch).
+        :param workers: number of worker processes (1 disables parallel scoring)
+        :param chunk_size: number of candidates per task
+        """
+        self.scoring_workers = workers
+        self.scoring_chunk_size = chunk_size
 
     def recommend_documents(self, doc: RecommenderDocument, docs_from: [RecommenderDocument],
                             citation_graph: CitationGraph) -> [RecommenderDocument]:
@@ -17,20 +47,41 @@ class RecommenderBase:
         :param citation_graph: citation network
         :return: a ranked list of recommended documents
         """
+        document_ids_scored = self.score_documents(doc, docs_from, citation_graph)
+
+        # Normalize by the maximum score, sort by score and then doc desc
+        return rank_document_scores(document_ids_scored)
+
+    def score_documents(self, doc: RecommenderDocument, docs_from: [RecommenderDocument],
+                        citation_graph: CitationGraph) -> dict:
+        """
+        Scores all candidates (unnormalized). Subclasses may override this method to score the whole batch at once
+        :param doc: the document for which recommendations should be generated
+        :param docs_from: the list of possible documents to recommend
+        :param citation_graph: citation network
+        :return: a dictionary mapping a candidate id to its score
+        """
         document_ids_scored = dict()
+        if self.scoring_workers > 1 and len(docs_from) > self.scoring_chunk_size:
+            global _parallel_task
+            docs_from = list(docs_from)
+            ranges = [(i, min(i + self.scoring_chunk_size, len(docs_from)))
+                      for i in range(0, len(docs_from), self.scoring_chunk_size)]
+            _parallel_task = (self, doc, docs_from, citation_graph)
+            try:
+                with multiprocessing.get_context("fork").Pool(processes=self.scoring_workers,
+                                                              initializer=dispose_inherited_sessions) as pool:
+                    # starmap returns the results in the order of the ranges
+                    results = pool.starmap(_score_range, ranges)
+            finally:
+                _parallel_task = None
+            for (start, end), scores in zip(ranges, results):
+                for candidate, score in zip(docs_from[start:end], scores):
+                    document_ids_scored[candidate.id] = score
+            return document_ids_scored
+
         for candidate in docs_from:
             document_ids_scored[candidate.id] = self.compute_document_score(doc, candidate, citation_graph)
-
-        # Get the maximum score to normalize the scores
-        max_score = max(document_ids_scored.values())
-        # Convert to list
-        if max_score > 0.0:
-            document_ids_scored = [(k, v / max_score) for k, v in document_ids_scored.items()]
-        else:
-            document_ids_scored = [(k, v) for k, v in document_ids_scored.items()]
-        # Sort by score and then doc desc
-        document_ids_scored.sort(key=lambda x: (x[1], x[0]), reverse=True)
-        # Ensure cutoff
         return document_ids_scored
 
     def compute_document_score(self, doc: RecommenderDocument, candidate: RecommenderDocument,
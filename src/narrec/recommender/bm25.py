@@ -4,6 +4,7 @@ from narrec.citation.graph import CitationGraph
 from narrec.document.document import RecommenderDocument
 from narrec.recommender.graph_base import GraphBase
 from narrec.scoring.BM25Scorer import BM25Scorer
+from narrec.scoring.ranking import rank_document_scores
 
 
 class BM25Recommender(GraphBase):
@@ -17,7 +18,4 @@ class BM25Recommender(GraphBase):
         document_ids_scored_bm25 = self.bm25_scorer.score_document_ids_with_bm25(doc, [d.id for d in docs_from])
 
         # Sort by score and then doc desc
-        document_ids_scored_bm25 = sorted([(k, v) for k, v in document_ids_scored_bm25.items()],
-                                          key=lambda x: (x[1], x[0]), reverse=True)
-        # Ensure cutoff
-        return document_ids_scored_bm25
+        return rank_document_scores(document_ids_scored_bm25, normalize=False)
@@ -1,7 +1,10 @@
+from typing import Dict
+
 from narrec.citation.graph import CitationGraph
-from narrec.document.core import NarrativeCoreExtractor
+from narrec.document.core import NarrativeCoreExtractor, NarrativeCore
 from narrec.document.document import RecommenderDocument
 from narrec.recommender.base import RecommenderBase
+from narrec.scoring.ranking import rank_document_scores
 
 
 class CoreOverlap(RecommenderBase):
@@ -10,6 +13,39 @@ class CoreOverlap(RecommenderBase):
         super().__init__(name=name)
         self.extractor = extractor
 
+    @staticmethod
+    def score_candidates(core: NarrativeCore, candidate_cores: Dict[int, NarrativeCore]) -> Dict[int, float]:
+        """
+        Scores all candidates by the overlap between their cores and the query core
+        A candidate receives the score of each query core statement whose (unordered) node pair is contained in the
+        candidate core. Candidates are collected in postings of the query core statements, so the scores are
+        accumulated in a single pass and in the order of the query core statements (as with core.intersect).
+        :param core: the query core
+        :param candidate_cores: a dictionary mapping a candidate id to its core (or None)
+        :return: a dictionary mapping a candidate id to its score
+        """
+        # positions of the query core statements by node pair (usually a single statement per pair)
+        pair2positions = {}
+        for position, pair in enumerate(core.node_pair_keys):
+            if pair in pair2positions:
+                pair2positions[pair].append(position)
+            else:
+                pair2positions[pair] = [position]
+
+        postings = [[] for _ in core.statements]
+        for candidate_id, cand_core in candidate_cores.items():
+            if cand_core:
+                for pair in cand_core.node_pairs:
+                    if pair in pair2positions:
+                        for position in pair2positions[pair]:
+                            postings[position].append(candidate_id)
+
+        document_ids_scored = {candidate_id: 0.0 for candidate_id in candidate_cores}
+        for position, stmt in enumerate(core.statements):
+            for candidate_id in postings[position]:
+                document_ids_scored[candidate_id] += stmt.score
+        return document_ids_scored
+
     def recommend_documents(self, doc: RecommenderDocument, docs_from: [RecommenderDocument],
                             citation_graph: CitationGraph) -> [RecommenderDocument]:
         # Compute the cores
@@ -19,21 +55,8 @@ class CoreOverlap(RecommenderBase):
             return [(d.id, 1.0) for d in docs_from]
 
         # Core statements are also sorted by their score
-        document_ids_scored = {d.id: 0.0 for d in docs_from}
-        for candidate in docs_from:
-            cand_core = self.extractor.extract_narrative_core_from_document(candidate)
-            if cand_core:
-                for stmt in core.intersect(cand_core).statements:
-                    document_ids_scored[candidate.id] += stmt.score
-
-        # Get the maximum score to normalize the scores
-        max_score = max(document_ids_scored.values())
-        # Convert to list
-        if max_score > 0.0:
-            document_ids_scored = [(k, v / max_score) for k, v in document_ids_scored.items()]
-        else:
-            document_ids_scored = [(k, v) for k, v in document_ids_scored.items()]
-        # Sort by score and then doc desc
-        document_ids_scored.sort(key=lambda x: (x[1], x[0]), reverse=True)
-        # Ensure cutoff
-        return document_ids_scored
+        candidate_cores = self.extractor.extract_narrative_cores(docs_from)
+        document_ids_scored = self.score_candidates(core, {d.id: candidate_cores[d.id] for d in docs_from})
+
+        # Normalize by the maximum score, sort by score and then doc desc
+        return rank_document_scores(document_ids_scored)
@@ -1,59 +1,55 @@
+import heapq
+
 from narrec.citation.graph import CitationGraph
 from narrec.document.document import RecommenderDocument
-from narrec.ontology.ontology import Ontology
+from narrec.ontology.distance import OntologyDistanceEngine, NodeNeighbourhood
 from narrec.recommender.base import RecommenderBase
 from narrec.run_config import NODE_SIMILARITY_THRESHOLD
 
 
 class GraphBase(RecommenderBase):
-    def __init__(self, name, threshold=NODE_SIMILARITY_THRESHOLD):
+    def __init__(self, name, threshold=NODE_SIMILARITY_THRESHOLD, distance_engine: OntologyDistanceEngine = None):
         super().__init__(name=name)
         self.threshold = threshold
-        self.ontology = Ontology()
+        # the engine (parsed tree numbers and cached distances) is shared between all recommenders by default
+        self.distance_engine = distance_engine if distance_engine else OntologyDistanceEngine.instance()
+        self.ontology = self.distance_engine.ontology
+        # query-side matching state of the last query document (computed once per topic)
+        self.query_neighbourhood = None
+        self.query_document_id = None
 
     def ontological_node_similarity(self, node_j, node_k):
-        if node_j == node_k:
-            return 1.0
-
-        distance = self.ontology.ontological_mesh_distance(node_j, node_k)
-        # no distance -> perfect similarity
-        if distance == 0:
-            return 1.0
-        # there is no path between j and k
-        elif distance == -1:
-            return 0.0
-        else:
-            # compute similarity
-            return 1.0 / distance
-
-    def node_candidates(self, document_i: RecommenderDocument, document_k: RecommenderDocument):
-        candidates = []
-        nodes_i = document_i.nodes
-        nodes_k = document_k.nodes
+        return self.distance_engine.similarity(node_j, node_k)
 
-        for node_a in nodes_i:
-            for node_b in nodes_k:
-                similarity = self.ontological_node_similarity(node_a, node_b)
-                if similarity >= self.threshold:
-                    candidates.append((node_a, node_b, similarity))
+    def get_query_neighbourhood(self, document: RecommenderDocument) -> NodeNeighbourhood:
+        if self.query_neighbourhood is None or self.query_document_id != document.id:
+            self.query_neighbourhood = self.distance_engine.create_neighbourhood(document.nodes, self.threshold)
+            self.query_document_id = document.id
+        return self.query_neighbourhood
 
-        return candidates
+    def node_candidates(self, document_i: RecommenderDocument, document_k: RecommenderDocument):
+        return self.get_query_neighbourhood(document_i).similar_pairs(document_k.nodes)
 
     def greedy_node_matching(self, document_i: RecommenderDocument, document_k: RecommenderDocument):
         candidates = self.node_candidates(document_i, document_k)
-        candidates.sort(key=lambda x: x[2], reverse=True)
+        # highest similarity first, ties are resolved by the candidate order (same as a stable sort)
+        heap = [(-similarity, idx) for idx, (_, _, similarity) in enumerate(candidates)]
+        heapq.heapify(heap)
 
         matchings = []
-        mapped = set()
-
-        for node_a, node_b, similarity in candidates:
-            # we need to distinguish between the same concept nodes in a and b
-            node_a_pref = 'a_' + node_a
-            node_b_pref = 'b_' + node_b
-            if node_a_pref not in mapped and node_b_pref not in mapped:
-                mapped.add(node_a_pref)
-                mapped.add(node_b_pref)
+        # we need to distinguish between the same concept nodes in a and b
+        mapped_a, mapped_b = set(), set()
+        remaining_a = len({c[0] for c in candidates})
+        remaining_b = len({c[1] for c in candidates})
+
+        while heap and remaining_a > 0 and remaining_b > 0:
+            node_a, node_b, similarity = candidates[heapq.heappop(heap)[1]]
+            if node_a not in mapped_a and node_b not in mapped_b:
+                mapped_a.add(node_a)
+                mapped_b.add(node_b)
                 matchings.append((node_a, node_b, similarity))
+                remaining_a -= 1
+                remaining_b -= 1
 
         return matchings
 
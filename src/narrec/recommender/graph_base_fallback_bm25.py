@@ -6,6 +6,7 @@ from narrec.recommender.base import RecommenderBase
 from narrec.recommender.graph_base import GraphBase
 from narrec.run_config import BM25_WEIGHT, GRAPH_WEIGHT
 from narrec.scoring.BM25Scorer import BM25Scorer
+from narrec.scoring.ranking import rank_document_scores
 
 
 class GraphBaseFallbackBM25(GraphBase):
@@ -42,7 +43,4 @@ class GraphBaseFallbackBM25(GraphBase):
             document_ids_scored[d] = GRAPH_WEIGHT * graph_score + BM25_WEIGHT * document_ids_scored_bm25[d]
 
         # Sort by score and then doc desc
-        document_ids_scored = sorted([(k, v) for k, v in document_ids_scored.items()],
-                                     key=lambda x: (x[1], x[0]), reverse=True)
-        # Ensure cutoff
-        return document_ids_scored
+        return rank_document_scores(document_ids_scored, normalize=False)
@@ -11,10 +11,11 @@ class Jaccard(RecommenderBase):
 
     def compute_document_score(self, doc: RecommenderDocument, candidate: RecommenderDocument,
                                citation_graph: CitationGraph) -> float:
-        if len(doc.graph) == 0 or len(candidate.graph) == 0:
+        graph_a, graph_b = doc.graph_keys, candidate.graph_keys
+        if len(graph_a) == 0 or len(graph_b) == 0:
             return 0.0
 
-        graph_inter = doc.graph.intersection(candidate.graph)
-        graph_union = doc.graph.union(candidate.graph)
-        score = len(graph_inter) / len(graph_union)
+        # packed statement keys: |A ∪ B| = |A| + |B| - |A ∩ B|
+        inter_size = len(graph_a & graph_b)
+        score = inter_size / (len(graph_a) + len(graph_b) - inter_size)
         return score
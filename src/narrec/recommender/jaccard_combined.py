@@ -4,15 +4,24 @@ from narrec.document.document import RecommenderDocument
 from narrec.recommender.base import RecommenderBase
 from narrec.recommender.jaccard_graph_weighted import JaccardGraphWeighted
 from narrec.recommender.jaccard_concepts_weighted import JaccardConceptWeighted
+from narrec.recommender.weighted_jaccard import WeightedJaccardEngine
 
 
 class JaccardCombinedWeighted(RecommenderBase):
 
-    def __init__(self, corpus: DocumentCorpus, name="JaccardCombinedWeighted"):
+    def __init__(self, corpus: DocumentCorpus, name="JaccardCombinedWeighted", engine: WeightedJaccardEngine = None):
         super().__init__(name=name)
         self.corpus = corpus
-        self.jaccard_graph = JaccardGraphWeighted(corpus)
-        self.jaccard_concept = JaccardConceptWeighted(corpus)
+        engine = engine if engine else WeightedJaccardEngine(corpus)
+        self.jaccard_graph = JaccardGraphWeighted(corpus, engine=engine)
+        self.jaccard_concept = JaccardConceptWeighted(corpus, engine=engine)
+
+    def score_documents(self, doc: RecommenderDocument, docs_from: [RecommenderDocument],
+                        citation_graph: CitationGraph) -> dict:
+        # combine both sub-results instead of scoring every pair twice
+        graph_scores = self.jaccard_graph.score_documents(doc, docs_from, citation_graph)
+        concept_scores = self.jaccard_concept.score_documents(doc, docs_from, citation_graph)
+        return {doc_id: (graph_scores[doc_id] + concept_scores[doc_id]) / 2 for doc_id in graph_scores}
 
     def compute_document_score(self, doc: RecommenderDocument, candidate: RecommenderDocument,
                                citation_graph: CitationGraph) -> float:
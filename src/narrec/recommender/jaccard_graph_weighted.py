@@ -2,14 +2,22 @@ from narrec.citation.graph import CitationGraph
 from narrec.document.corpus import DocumentCorpus
 from narrec.document.document import RecommenderDocument
 from narrec.recommender.base import RecommenderBase
+from narrec.recommender.weighted_jaccard import WeightedJaccardEngine
 from narrec.scoring.edge import score_edge_by_tf_and_concept_idf
 
 
 class JaccardGraphWeighted(RecommenderBase):
 
-    def __init__(self, corpus: DocumentCorpus, name="JaccardGraphWeighted"):
+    def __init__(self, corpus: DocumentCorpus, name="JaccardGraphWeighted", engine: WeightedJaccardEngine = None):
         super().__init__(name=name)
         self.corpus = corpus
+        self.engine = engine if engine else WeightedJaccardEngine(corpus)
+
+    def score_documents(self, doc: RecommenderDocument, docs_from: [RecommenderDocument],
+                        citation_graph: CitationGraph) -> dict:
+        # vectorised version of compute_document_score
+        scores = self.engine.score_graphs(doc, docs_from).tolist()
+        return {candidate.id: score for candidate, score in zip(docs_from, scores)}
 
     def compute_document_score(self, doc: RecommenderDocument, candidate: RecommenderDocument,
                                citation_graph: CitationGraph) -> float:
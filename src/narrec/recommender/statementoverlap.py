@@ -1,14 +1,55 @@
+import numpy as np
+
 from narrec.citation.graph import CitationGraph
-from narrec.document.core import NarrativeCoreExtractor
+from narrec.document.core import NarrativeCoreExtractor, NarrativeCore
 from narrec.document.document import RecommenderDocument
 from narrec.recommender.base import RecommenderBase
+from narrec.scoring.ranking import rank_document_scores
 
 
 class StatementOverlap(RecommenderBase):
 
-    def __init__(self, extractor: NarrativeCoreExtractor, name="StatementOverlap"):
+    def __init__(self, extractor: NarrativeCoreExtractor, name="StatementOverlap", use_postings=True):
+        """
+        :param extractor: the narrative core extractor
+        :param name: name of the recommender
+        :param use_postings: score via statement postings (cost scales with the number of matches) instead of
+                             probing every candidate for every core statement
+        """
         super().__init__(name=name)
         self.extractor = extractor
+        self.use_postings = use_postings
+
+    @staticmethod
+    def score_candidates_by_postings(core: NarrativeCore, docs_from: [RecommenderDocument]) -> np.ndarray:
+        """
+        Scores the candidates with a temporary statement -> candidate postings map
+        The scores are accumulated in the order of the core statements (same result as the nested loop).
+        :param core: the query core
+        :param docs_from: the candidates
+        :return: an array of scores (aligned with docs_from)
+        """
+        key2position = {}
+        for position, stmt_key in enumerate(core.statement_keys):
+            key2position.setdefault(stmt_key, []).append(position)
+        query_keys = frozenset(key2position)
+
+        postings = [[] for _ in core.statements]
+        for idx, candidate in enumerate(docs_from):
+            candidate_keys = candidate.graph_keys
+            # most candidates do not share any statement (isdisjoint does not create a new set)
+            if query_keys.isdisjoint(candidate_keys):
+                continue
+            for stmt_key in query_keys & candidate_keys:
+                for position in key2position[stmt_key]:
+                    postings[position].append(idx)
+
+        scores = np.zeros(len(docs_from), dtype=np.float64)
+        for position, stmt in enumerate(core.statements):
+            if postings[position]:
+                # candidates are unique within a posting list
+                scores[postings[position]] += stmt.score
+        return scores
 
     def recommend_documents(self, doc: RecommenderDocument, docs_from: [RecommenderDocument],
                             citation_graph: CitationGraph) -> [RecommenderDocument]:
@@ -22,19 +63,16 @@ class StatementOverlap(RecommenderBase):
         document_ids_scored = {d.id: 0.0 for d in docs_from}
         # If a statement of the core is contained within a document, we increase the score
         # of the document by the score of the corresponding edge
-        for stmt in core.statements:
-            for candidate in docs_from:
-                if (stmt.subject_id, stmt.relation, stmt.object_id) in candidate.graph:
-                    document_ids_scored[candidate.id] += stmt.score
-
-        # Get the maximum score to normalize the scores
-        max_score = max(document_ids_scored.values())
-        # Convert to list
-        if max_score > 0.0:
-            document_ids_scored = [(k, v / max_score) for k, v in document_ids_scored.items()]
+        if self.use_postings:
+            scores = self.score_candidates_by_postings(core, docs_from).tolist()
+            for candidate, score in zip(docs_from, scores):
+                document_ids_scored[candidate.id] += score
         else:
-            document_ids_scored = [(k, v) for k, v in document_ids_scored.items()]
-        # Sort by score and then doc desc
-        document_ids_scored.sort(key=lambda x: (x[1], x[0]), reverse=True)
-        # Ensure cutoff
-        return document_ids_scored
+            for candidate in docs_from:
+                candidate_keys = candidate.graph_keys
+                for stmt_key, stmt in zip(core.statement_keys, core.statements):
+                    if stmt_key in candidate_keys:
+                        document_ids_scored[candidate.id] += stmt.score
+
+        # Normalize by the maximum score, sort by score and then doc desc
+        return rank_document_scores(document_ids_scored)
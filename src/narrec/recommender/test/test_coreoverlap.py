@@ -0,0 +1,96 @@
+import random
+import unittest
+
+from kgextractiontoolbox.document.narrative_document import StatementExtraction
+from narrec.document.core import NarrativeCore, ScoredStatementExtraction
+from narrec.recommender.coreoverlap import CoreOverlap
+from narrectests.stubs import IdDocument, PrecomputedCoreExtractor, create_scored_statement
+
+RELATIONS = ["associated", "induces", "inhibits", "treats"]
+
+
+def create_core(rnd: random.Random, concepts: [str], size: int) -> NarrativeCore:
+    statements = []
+    pairs = set()
+    while len(statements) < size:
+        s, o = rnd.sample(concepts, 2)
+        if (s, o) in pairs or (o, s) in pairs:
+            continue
+        pairs.add((s, o))
+        statements.append(create_scored_statement(s, o, relation=rnd.choice(RELATIONS), confidence=rnd.random(),
+                                                  score=rnd.random()))
+    return NarrativeCore(statements)
+
+
+def reference_intersect(core_a: NarrativeCore, core_b: NarrativeCore) -> [ScoredStatementExtraction]:
+    # the former nested loop implementation of NarrativeCore.intersect
+    statements = []
+    for a in core_a.statements:
+        if any(a.is_equal(b) for b in core_b.statements):
+            statements.append(a)
+    return statements
+
+
+def reference_core_overlap(core: NarrativeCore, doc2core: dict, docs: [IdDocument]):
+    # the former CoreOverlap implementation (one intersection per candidate)
+    document_ids_scored = {d.id: 0.0 for d in docs}
+    for candidate in docs:
+        cand_core = doc2core[candidate.id]
+        if cand_core:
+            for stmt in reference_intersect(core, cand_core):
+                document_ids_scored[candidate.id] += stmt.score
+    max_score = max(document_ids_scored.values())
+    if max_score > 0.0:
+        document_ids_scored = [(k, v / max_score) for k, v in document_ids_scored.items()]
+    else:
+        document_ids_scored = [(k, v) for k, v in document_ids_scored.items()]
+    document_ids_scored.sort(key=lambda x: (x[1], x[0]), reverse=True)
+    return document_ids_scored
+
+
+class CoreOverlapTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.rnd = random.Random(42)
+        # a small concept pool leads to many overlapping node pairs
+        self.concepts = [f'MESH:D{i:06d}' for i in range(40)]
+
+    def test_intersect(self):
+        for _ in range(200):
+            core_a = create_core(self.rnd, self.concepts, self.rnd.randint(1, 30))
+            core_b = create_core(self.rnd, self.concepts, self.rnd.randint(1, 30))
+            expected = [s.get_triple() for s in reference_intersect(core_a, core_b)]
+            self.assertEqual(expected, [s.get_triple() for s in core_a.intersect(core_b).statements])
+
+    def test_intersect_reversed_direction(self):
+        core_a = create_core(self.rnd, self.concepts, 1)
+        s = core_a.statements[0]
+        stmt = StatementExtraction(subject_id=s.object_id, subject_type="Disease", subject_str="", predicate="p",
+                                   relation="treats", object_id=s.subject_id, object_type="Drug", object_str="",
+                                   sentence_id=0, confidence=1.0)
+        core_b = NarrativeCore([ScoredStatementExtraction(stmt=stmt, score=1.0)])
+        self.assertEqual(1, len(core_a.intersect(core_b).statements))
+
+    def test_rankings_unchanged(self):
+        for topic in range(20):
+            core = create_core(self.rnd, self.concepts, 30)
+            docs = [IdDocument(i) for i in range(1, 500)]
+            doc2core = {d.id: create_core(self.rnd, self.concepts, self.rnd.randint(1, 30))
+                        if self.rnd.random() > 0.1 else None for d in docs}
+            doc2core[0] = core
+
+            recommender = CoreOverlap(extractor=PrecomputedCoreExtractor(doc2core))
+            # scores must be exactly equal (same summation order)
+            self.assertEqual(reference_core_overlap(core, doc2core, docs),
+                             recommender.recommend_documents(IdDocument(0), docs, None))
+
+    def test_no_overlap(self):
+        core = create_core(self.rnd, self.concepts[:10], 5)
+        doc2core = {0: core, 1: create_core(self.rnd, self.concepts[10:], 5), 2: None}
+        recommender = CoreOverlap(extractor=PrecomputedCoreExtractor(doc2core))
+        self.assertEqual([(2, 0.0), (1, 0.0)],
+                         recommender.recommend_documents(IdDocument(0), [IdDocument(1), IdDocument(2)], None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+
+from kgextractiontoolbox.document.document import TaggedEntity
+from kgextractiontoolbox.document.narrative_document import NarrativeDocument, StatementExtraction
+from narrec.document.document import RecommenderDocument
+from narrec.recommender.jaccard_concepts_weighted import JaccardConceptWeighted
+from narrec.recommender.jaccard_graph_weighted import JaccardGraphWeighted
+from narrec.recommender.weighted_jaccard import WeightedJaccardEngine
+
+CONCEPT2IDF = {"MESH:D000001": 0.9, "MESH:D000002": 0.4, "MESH:D000003": 0.7,
+               "CHEMBL1": 0.5, "CHEMBL2": 1.0, "CHEMBL3": 0.2}
+
+
+class IdfCorpus:
+    """
+    Serves fixed concept idf scores
+    """
+
+    def get_concept_ifd_score(self, concept: str) -> float:
+        return CONCEPT2IDF[concept]
+
+
+def create_document(document_id: int, tags: [tuple], statements: [tuple]) -> RecommenderDocument:
+    """
+    :param document_id: the document id
+    :param tags: a list of (concept, start, end) tuples
+    :param statements: a list of (subject, relation, object, sentence id, confidence) tuples
+    :return: a RecommenderDocument
+    """
+    tagged = [TaggedEntity(document=document_id, start=start, end=end, ent_id=concept,
+                           ent_type="Drug" if concept.startswith("CHEMBL") else "Disease", text=concept)
+              for concept, start, end in tags]
+    extractions = [StatementExtraction(subject_id=s, subject_type="Drug", subject_str=s, predicate=r,
+                                       relation=r, object_id=o, object_type="Disease", object_str=o,
+                                       sentence_id=sentence_id, confidence=confidence)
+                   for s, r, o, sentence_id, confidence in statements]
+    text = "x" * 99
+    return RecommenderDocument(NarrativeDocument(document_id=document_id, title=text, abstract=text, tags=tagged,
+                                                 extracted_statements=extractions))
+
+
+class WeightedJaccardTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.corpus = IdfCorpus()
+        self.graph_recommender = JaccardGraphWeighted(self.corpus)
+        self.concept_recommender = JaccardConceptWeighted(self.corpus)
+        self.engine = WeightedJaccardEngine(self.corpus)
+
+        self.query = create_document(1, [("CHEMBL1", 0, 10), ("CHEMBL1", 120, 130), ("MESH:D000001", 20, 150),
+                                         ("CHEMBL2", 40, 50), ("MESH:D000002", 60, 190)],
+                                     [("CHEMBL1", "treats", "MESH:D000001", 0, 0.9),
+                                      ("CHEMBL1", "treats", "MESH:D000001", 1, 0.6),
+                                      ("CHEMBL2", "associated", "MESH:D000002", 1, 0.4),
+                                      ("CHEMBL2", "inhibits", "MESH:D000001", 2, 0.8)])
+        self.candidates = [
+            # shares a statement and concepts with the query
+            create_document(2, [("CHEMBL1", 5, 15), ("MESH:D000001", 30, 160), ("CHEMBL3", 70, 80)],
+                            [("CHEMBL1", "treats", "MESH:D000001", 0, 0.7),
+                             ("CHEMBL3", "induces", "MESH:D000001", 1, 0.5)]),
+            # the statements of the query (with other weights) and an additional statement
+            create_document(3, [("CHEMBL1", 0, 100), ("MESH:D000001", 10, 20), ("CHEMBL2", 30, 40),
+                                ("MESH:D000002", 50, 60), ("CHEMBL3", 70, 190)],
+                            [("CHEMBL1", "treats", "MESH:D000001", 0, 0.3),
+                             ("CHEMBL2", "associated", "MESH:D000002", 0, 1.0),
+                             ("CHEMBL2", "inhibits", "MESH:D000001", 1, 0.2),
+                             ("CHEMBL3", "induces", "MESH:D000002", 2, 0.9)]),
+            # nothing in common with the query
+            create_document(4, [("CHEMBL3", 0, 50), ("MESH:D000003", 60, 120)],
+                            [("CHEMBL3", "decreases", "MESH:D000003", 0, 0.5)]),
+            # neither statements nor concepts
+            create_document(5, [], []),
+            # concepts without statements
+            create_document(6, [("CHEMBL2", 0, 30), ("MESH:D000002", 10, 90)], []),
+        ]
+
+    def assertScoresEqual(self, expected: dict, scores: dict):
+        self.assertEqual(expected.keys(), scores.keys())
+        for document_id, score in expected.items():
+            self.assertAlmostEqual(score, scores[document_id], delta=1e-12, msg=f'document {document_id}')
+
+    def assertGraphScoresEqual(self, query: RecommenderDocument, candidates: [RecommenderDocument]):
+        expected = {c.id: self.graph_recommender.compute_document_score(query, c, None) for c in candidates}
+        scores = {c.id: s for c, s in zip(candidates, self.engine.score_graphs(query, candidates).tolist())}
+        self.assertScoresEqual(expected, scores)
+
+    def assertConceptScoresEqual(self, query: RecommenderDocument, candidates: [RecommenderDocument]):
+        expected = {c.id: self.concept_recommender.compute_document_score(query, c, None) for c in candidates}
+        scores = {c.id: s for c, s in zip(candidates, self.engine.score_concepts(query, candidates).tolist())}
+        self.assertScoresEqual(expected, scores)
+
+    def test_score_graphs(self):
+        self.assertGraphScoresEqual(self.query, self.candidates)
+        # the scores are not trivial
+        scores = self.engine.score_graphs(self.query, self.candidates).tolist()
+        self.assertTrue(0.0 < scores[0] < 1.0)
+        self.assertTrue(0.0 < scores[1] < 1.0)
+        self.assertEqual(0.0, scores[2])
+
+    def test_score_concepts(self):
+        self.assertConceptScoresEqual(self.query, self.candidates)
+        scores = self.engine.score_concepts(self.query, self.candidates).tolist()
+        self.assertTrue(0.0 < scores[0] < 1.0)
+        self.assertTrue(0.0 < scores[4] < 1.0)
+        self.assertEqual(0.0, scores[2])
+
+    def test_query_is_candidate(self):
+        self.assertAlmostEqual(1.0, self.engine.score_graphs(self.query, [self.query])[0], delta=1e-12)
+        self.assertAlmostEqual(1.0, self.engine.score_concepts(self.query, [self.query])[0], delta=1e-12)
+
+    def test_empty_graph(self):
+        # query without statements
+        query = self.candidates[3]
+        self.assertGraphScoresEqual(query, self.candidates)
+        self.assertEqual([0.0] * len(self.candidates), self.engine.score_graphs(query, self.candidates).tolist())
+        # concepts without statements
+        self.assertGraphScoresEqual(self.candidates[4], self.candidates + [self.query])
+
+    def test_empty_concepts(self):
+        query = self.candidates[3]
+        self.assertConceptScoresEqual(query, self.candidates)
+        self.assertEqual([0.0] * len(self.candidates), self.engine.score_concepts(query, self.candidates).tolist())
+
+    def test_no_candidates(self):
+        self.assertEqual([], self.engine.score_graphs(self.query, []).tolist())
+        self.assertEqual([], self.engine.score_concepts(self.query, []).tolist())
+
+    def test_score_documents(self):
+        # the recommenders score all candidates with the engine
+        expected = {c.id: self.graph_recommender.compute_document_score(self.query, c, None)
+                    for c in self.candidates}
+        self.assertScoresEqual(expected, self.graph_recommender.score_documents(self.query, self.candidates, None))
+        expected = {c.id: self.concept_recommender.compute_document_score(self.query, c, None)
+                    for c in self.candidates}
+        self.assertScoresEqual(expected,
+                               self.concept_recommender.score_documents(self.query, self.candidates, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from narrec.backend.cache import LRUCache
+from narrec.document.corpus import DocumentCorpus
+from narrec.document.document import RecommenderDocument
+from narrec.document.vocabulary import NarrativeVocabulary
+from narrec.scoring.edge import PREDICATE_TO_SCORE
+
+WEIGHT_CACHE_MAX_ITEMS = 100000
+
+
+def weighted_jaccard(query_keys: np.ndarray, query_weights: np.ndarray,
+                     candidate_keys: List[np.ndarray], candidate_weights: List[np.ndarray]) -> np.ndarray:
+    """
+    Computes the weighted Jaccard similarity between a query and a batch of candidates (sparse vectors over integer
+    keys). Shared items count with the mean weight of both sides:
+    inter = sum over A ∩ B of 0.5 * (w_A + w_B)
+    union = inter + sum over A \\ B of w_A + sum over B \\ A of w_B
+    :param query_keys: unique keys of the query
+    :param query_weights: weights aligned with query_keys
+    :param candidate_keys: unique keys of each candidate
+    :param candidate_weights: weights of each candidate (aligned with candidate_keys)
+    :return: an array of similarities (aligned with the candidates)
+    """
+    n = len(candidate_keys)
+    scores = np.zeros(n, dtype=np.float64)
+    if n == 0 or len(query_keys) == 0:
+        return scores
+
+    order = np.argsort(query_keys)
+    query_keys, query_weights = query_keys[order], query_weights[order]
+    lengths = np.array([len(k) for k in candidate_keys], dtype=np.int64)
+    if lengths.sum() == 0:
+        return scores
+    candidate_idx = np.repeat(np.arange(n), lengths)
+    keys = np.concatenate(candidate_keys).astype(query_keys.dtype)
+    weights = np.concatenate(candidate_weights)
+
+    positions = np.minimum(np.searchsorted(query_keys, keys), len(query_keys) - 1)
+    match = query_keys[positions] == keys
+
+    sum_b = np.bincount(candidate_idx, weights=weights, minlength=n)
+    inter_b = np.bincount(candidate_idx[match], weights=weights[match], minlength=n)
+    inter_a = np.bincount(candidate_idx[match], weights=query_weights[positions[match]], minlength=n)
+    inter = 0.5 * (inter_a + inter_b)
+    union = inter + (query_weights.sum() - inter_a) + (sum_b - inter_b)
+
+    valid = (lengths > 0) & (union > 0.0)
+    scores[valid] = inter[valid] / union[valid]
+    return scores
+
+
+class WeightedJaccardEngine:
+    """
+    Encodes documents as sparse vectors over the integer vocabulary (packed statement keys / concept ids)
+    The weights are the edge scores (score_edge_by_tf_and_concept_idf) and concept scores
+    (score_concept_by_tf_idf_and_coverage). They are computed once per document with NumPy and cached.
+    """
+
+    def __init__(self, corpus: DocumentCorpus, cache_max_items: int = WEIGHT_CACHE_MAX_ITEMS):
+        self.corpus = corpus
+        self.concept2idf = {}
+        self.graph_cache = LRUCache(max_items=cache_max_items)
+        self.concept_cache = LRUCache(max_items=cache_max_items)
+
+    def __get_idf(self, concept: str) -> float:
+        if concept not in self.concept2idf:
+            self.concept2idf[concept] = self.corpus.get_concept_ifd_score(concept)
+        return self.concept2idf[concept]
+
+    def graph_vector(self, document: RecommenderDocument) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param document: a RecommenderDocument
+        :return: packed statement keys of the document graph and their edge scores
+        """
+        vector = self.graph_cache.get(document.id)
+        if vector is not None:
+            return vector
+
+        vocabulary = NarrativeVocabulary.instance()
+        concept2values = {}
+        keys, confidence, pred_score, tf_s, tf_o, idf_s, idf_o, cov_s, cov_o = [], [], [], [], [], [], [], [], []
+        for spo in document.graph:
+            for concept in (spo[0], spo[2]):
+                if concept not in concept2values:
+                    if document.concept_count > 0:
+                        tf = document.get_concept_tf(concept) / document.concept_count
+                    else:
+                        tf = 0.0
+                    concept2values[concept] = (tf, self.__get_idf(concept), document.get_concept_coverage(concept))
+            s_values, o_values = concept2values[spo[0]], concept2values[spo[2]]
+            keys.append(vocabulary.add_statement(spo))
+            confidence.append(document.get_statement_confidence(spo))
+            pred_score.append(PREDICATE_TO_SCORE[spo[1]])
+            tf_s.append(s_values[0])
+            tf_o.append(o_values[0])
+            idf_s.append(s_values[1])
+            idf_o.append(o_values[1])
+            cov_s.append(s_values[2])
+            cov_o.append(o_values[2])
+
+        # same operations as score_edge_by_tf_and_concept_idf
+        tfidf = np.array(pred_score, dtype=np.float64) * (0.5 * ((np.array(tf_s, dtype=np.float64) *
+                                                                   np.array(idf_s, dtype=np.float64)) +
+                                                                  (np.array(tf_o, dtype=np.float64) *
+                                                                   np.array(idf_o, dtype=np.float64))))
+        coverage = np.minimum(np.array(cov_s, dtype=np.float64), np.array(cov_o, dtype=np.float64))
+        weights = coverage * np.array(confidence, dtype=np.float64) * tfidf
+
+        vector = (np.array(keys, dtype=np.uint64), weights)
+        self.graph_cache.put(document.id, vector)
+        return vector
+
+    def concept_vector(self, document: RecommenderDocument) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param document: a RecommenderDocument
+        :return: concept ids of the document and their concept scores
+        """
+        vector = self.concept_cache.get(document.id)
+        if vector is not None:
+            return vector
+
+        vocabulary = NarrativeVocabulary.instance()
+        concepts = list(document.concepts)
+        ids = np.array([vocabulary.concepts.add(c) for c in concepts], dtype=np.int64)
+        if concepts:
+            # same operations as score_concept_by_tf_idf_and_coverage
+            tf = np.array([document.get_concept_tf(c) for c in concepts], dtype=np.float64) / document.concept_count
+            idf = np.array([self.__get_idf(c) for c in concepts], dtype=np.float64)
+            coverage = np.array([document.get_concept_coverage(c) for c in concepts], dtype=np.float64)
+            weights = coverage * (tf * idf)
+        else:
+            weights = np.zeros(0, dtype=np.float64)
+
+        vector = (ids, weights)
+        self.concept_cache.put(document.id, vector)
+        return vector
+
+    def score_graphs(self, doc: RecommenderDocument, candidates: [RecommenderDocument]) -> np.ndarray:
+        query_keys, query_weights = self.graph_vector(doc)
+        vectors = [self.graph_vector(c) for c in candidates]
+        return weighted_jaccard(query_keys, query_weights, [k for k, _ in vectors], [w for _, w in vectors])
+
+    def score_concepts(self, doc: RecommenderDocument, candidates: [RecommenderDocument]) -> np.ndarray:
+        query_keys, query_weights = self.concept_vector(doc)
+        vectors = [self.concept_vector(c) for c in candidates]
+        return weighted_jaccard(query_keys, query_weights, [k for k, _ in vectors], [w for _, w in vectors])
@@ -7,6 +7,9 @@ from flask import Flask
 from narraint.queryengine.engine import QueryEngine
 from narraint.queryengine.result import QueryDocumentResult
 from narrant.entity.entityresolver import EntityResolver
+from narrec.backend.core_index import CoreIndex
+from narrec.backend.core_store import CoreStore
+from narrec.backend.document_store import DocumentStore
 from narrec.backend.retriever import DocumentRetriever
 from narrec.benchmark.benchmark import Benchmark, BenchmarkType
 from narrec.config import INDEX_DIR
@@ -16,7 +19,8 @@ from narrec.firststage.create_bm25_index import BenchmarkIndex
 from narrec.firststage.fsconceptflex import FSConceptFlex
 from narrec.recommender.coreoverlap import CoreOverlap
 from narrec.recommender.graph_base_fallback_bm25 import GraphBaseFallbackBM25
-from narrec.run_config import FS_DOCUMENT_CUTOFF_HARD
+from narrec.run_config import FS_DOCUMENT_CUTOFF_HARD, DOCUMENT_CACHE_MAX_DOCUMENTS, DOCUMENT_CACHE_MAX_BYTES, \
+    USE_DOCUMENT_STORE, CORE_CACHE_MAX_ITEMS, USE_CORE_STORE, USE_CORE_INDEX
 from narrec.scoring.BM25Scorer import BM25Scorer
 
 logging.basicConfig(format='%(asctime)s,%(msecs)d %(levelname)-8s [%(filename)s:%(lineno)d] %(message)s',
@@ -42,10 +46,14 @@ if CREATE_PUBMED_BM25_INDEX:
     index = BenchmarkIndex(PubMedBenchmark())
 
 resolver = EntityResolver()
-retriever = DocumentRetriever()
+retriever = DocumentRetriever(cache_max_documents=DOCUMENT_CACHE_MAX_DOCUMENTS,
+                              cache_max_bytes=DOCUMENT_CACHE_MAX_BYTES,
+                              document_store=DocumentStore() if USE_DOCUMENT_STORE else None)
 corpus = DocumentCorpus(["PubMed"])
 corpus.load_all_support_into_memory()
-core_extractor = NarrativeCoreExtractor(corpus=corpus)
+core_extractor = NarrativeCoreExtractor(corpus=corpus, cache_max_items=CORE_CACHE_MAX_ITEMS,
+                                        core_store=CoreStore() if USE_CORE_STORE else None,
+                                        core_index=CoreIndex() if USE_CORE_INDEX else None)
 
 first_stage = FSConceptFlex(extractor=core_extractor, benchmark=PubMedBenchmark())
 
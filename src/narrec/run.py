@@ -4,6 +4,10 @@ from multiprocessing import Process
 
 from tqdm import tqdm
 
+from narrec.backend.core_index import CoreIndex
+from narrec.backend.core_store import CoreStore
+from narrec.backend.document_store import DocumentStore
+from narrec.backend.postings_index import PostingsIndex
 from narrec.backend.retriever import DocumentRetriever
 from narrec.benchmark.benchmark import Benchmark
 from narrec.citation.graph import CitationGraph
@@ -33,8 +37,12 @@ from narrec.recommender.jaccard_concepts_weighted import JaccardConceptWeighted
 from narrec.recommender.jaccard_graph_weighted import JaccardGraphWeighted
 from narrec.recommender.splade import SpladeRecommender
 from narrec.recommender.statementoverlap import StatementOverlap
+from narrec.recommender.weighted_jaccard import WeightedJaccardEngine
 from narrec.run_config import BENCHMARKS, DO_RECOMMENDATION, MULTIPROCESSING, LOAD_FULL_IDF_CACHE, \
-    ADD_GRAPH_BASED_BM25_FALLBACK_RECOMMENDERS, RERUN_FIRST_STAGES, FS_DOCUMENT_CUTOFF_HARD
+    ADD_GRAPH_BASED_BM25_FALLBACK_RECOMMENDERS, RERUN_FIRST_STAGES, FS_DOCUMENT_CUTOFF_HARD, \
+    DOCUMENT_CACHE_MAX_DOCUMENTS, DOCUMENT_CACHE_MAX_BYTES, USE_DOCUMENT_STORE, COMPACT_DOCUMENTS, \
+    STATEMENT_SUPPORT_PRELOAD, CORE_CACHE_MAX_ITEMS, USE_CORE_STORE, USE_CORE_INDEX, RECOMMENDER_SCORING_WORKERS, \
+    RECOMMENDER_SCORING_CHUNK_SIZE, USE_POSTINGS_INDEX
 from narrec.scoring.BM25Scorer import BM25Scorer
 
 
@@ -60,7 +68,7 @@ def load_document_ids_from_runfile(path_to_runfile):
 
 
 def run_first_stage_for_benchmark(retriever: DocumentRetriever, benchmark: Benchmark, first_stage: FirstStageBase,
-                                  result_path: str, write_results=True, verbose=True, progress=False):
+                                  result_path: str, write_results=True, verbose=True, progress=False, batch=True):
     if verbose:
         print(f'Creating first stage runfile for benchmark: {benchmark.name} with stage: {first_stage.name}')
     result_lines = []
@@ -72,6 +80,12 @@ def run_first_stage_for_benchmark(retriever: DocumentRetriever, benchmark: Bench
                                                         document_collection=benchmark.document_collection)
     docid2docs = {d.id: d for d in input_docs}
 
+    if batch:
+        # data shared by several topics (e.g., postings of the same concepts) is loaded once in bulk queries
+        if verbose:
+            print('Prefetch first stage data for all topics...')
+        first_stage.prefetch_for_documents(input_docs)
+
     if verbose:
         print('Perform first stage retrieval')
     doc_queries = list(benchmark.iterate_over_document_entries())
@@ -106,16 +120,34 @@ def process_benchmark(bench: Benchmark):
     corpus = DocumentCorpus(collections=[GLOBAL_DB_DOCUMENT_COLLECTION])
     if LOAD_FULL_IDF_CACHE:
         corpus.load_all_support_into_memory()
-
-    retriever = DocumentRetriever()
-    core_extractor = NarrativeCoreExtractor(corpus=corpus)
+    if STATEMENT_SUPPORT_PRELOAD == "full":
+        corpus.load_all_statement_support_into_memory()
+
+    retriever = DocumentRetriever(cache_max_documents=DOCUMENT_CACHE_MAX_DOCUMENTS,
+                                  cache_max_bytes=DOCUMENT_CACHE_MAX_BYTES,
+                                  document_store=DocumentStore() if USE_DOCUMENT_STORE else None,
+                                  compact_documents=COMPACT_DOCUMENTS)
+    core_extractor = NarrativeCoreExtractor(corpus=corpus, cache_max_items=CORE_CACHE_MAX_ITEMS,
+                                            core_store=CoreStore() if USE_CORE_STORE else None,
+                                            core_index=CoreIndex() if USE_CORE_INDEX else None)
     bm25_scorer = BM25Scorer(None)
 
     citation_graph = CitationGraph()
+    # the weighted Jaccard recommenders share the document vectors
+    jaccard_engine = WeightedJaccardEngine(corpus)
+
+    aligned_recommenders = [AlignedNodesRecommender(corpus, extractor=core_extractor),
+                            AlignedCoresRecommender(corpus, extractor=core_extractor)]
+    if RECOMMENDER_SCORING_WORKERS > 1:
+        # these recommenders score every candidate on its own
+        for r in aligned_recommenders:
+            r.enable_parallel_scoring(RECOMMENDER_SCORING_WORKERS, RECOMMENDER_SCORING_CHUNK_SIZE)
 
-    recommenders = [EqualRecommender(), AlignedNodesRecommender(corpus), AlignedCoresRecommender(corpus),
+    recommenders = [EqualRecommender(), *aligned_recommenders,
                     StatementOverlap(core_extractor), Jaccard(), CoreOverlap(extractor=core_extractor),
-                    JaccardGraphWeighted(corpus), JaccardConceptWeighted(corpus), JaccardCombinedWeighted(corpus)]
+                    JaccardGraphWeighted(corpus, engine=jaccard_engine),
+                    JaccardConceptWeighted(corpus, engine=jaccard_engine),
+                    JaccardCombinedWeighted(corpus, engine=jaccard_engine)]
 
     if ADD_GRAPH_BASED_BM25_FALLBACK_RECOMMENDERS:
         for r in recommenders.copy():
@@ -129,12 +161,16 @@ def process_benchmark(bench: Benchmark):
     index_path = os.path.join(INDEX_DIR, bench.get_index_name())
     bm25_scorer.set_index(index_path)
 
-    first_stages = [FSConceptFlex(core_extractor, bench),
-                    FSCoreFlex(core_extractor, bench),
-                    FSNodeFlex(core_extractor, bench),
-                    FSConcept(core_extractor, bench),
-                    FSCore(core_extractor, bench),
-                    FSNode(core_extractor, bench),
+    postings_index = None
+    if USE_POSTINGS_INDEX:
+        # postings restricted to the benchmark documents (cached on disk per benchmark)
+        postings_index = PostingsIndex(collection=bench.document_collection).scoped_to_benchmark(bench)
+    first_stages = [FSConceptFlex(core_extractor, bench, postings_index=postings_index),
+                    FSCoreFlex(core_extractor, bench, postings_index=postings_index),
+                    FSNodeFlex(core_extractor, bench, postings_index=postings_index),
+                    FSConcept(core_extractor, bench, postings_index=postings_index),
+                    FSCore(core_extractor, bench, postings_index=postings_index),
+                    FSNode(core_extractor, bench, postings_index=postings_index),
                     PubMedRecommender(bench),
                     BM25Abstract(index_path),
                     BM25Title(index_path),
@@ -189,6 +225,9 @@ def process_benchmark(bench: Benchmark):
                     # get scores
                     doc.set_first_stage_score(fs_topic2doc2scores[topicid][doc.id])
 
+                if STATEMENT_SUPPORT_PRELOAD == "candidates":
+                    corpus.preload_statement_support([input_doc] + documents)
+
                 # only apply recommender if first stage returned a result
                 if len(documents) > 0:
                     for recommender in recommenders:
@@ -229,6 +268,8 @@ def process_benchmark(bench: Benchmark):
                     if recommender.name in recommender2result_lines:
                         f.write('\n'.join(recommender2result_lines[recommender.name]))
 
+        print(f'{bench.name}: document cache statistics: {retriever.get_cache_statistics()}')
+
 
 def main():
     if MULTIPROCESSING:
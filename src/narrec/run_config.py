@@ -68,12 +68,46 @@ assert GRAPH_WEIGHT + BM25_WEIGHT == 1.0
 
 MULTIPROCESSING = True
 LOAD_FULL_IDF_CACHE = True
+# Statement support: "full" caches the whole predication inverted index, "candidates" (opt-in) resolves the
+# statements of a topic's documents in bulk queries, None resolves statements on demand
+# (no scorer reads statement support at the moment, see DocumentCorpus.get_statement_documents)
+STATEMENT_SUPPORT_PRELOAD = None
+
+# Bounds of the in-memory document cache (per collection) - None means unbounded
+DOCUMENT_CACHE_MAX_DOCUMENTS = 250000
+DOCUMENT_CACHE_MAX_BYTES = 8 * 1024 ** 3
+# Read documents from the persistent document store (DOCUMENT_STORE_PATH) before querying the database
+# (documents are stored per state of the collection in the database, see compute_collection_fingerprint)
+USE_DOCUMENT_STORE = False
+# Bound of the in-memory narrative core cache (None means unbounded)
+CORE_CACHE_MAX_ITEMS = 500000
+# Bound of each in-memory cache of the ontology distance engine (distances and node neighbourhoods)
+DISTANCE_CACHE_MAX_ITEMS = 500000
+# Persist computed narrative cores (CORE_STORE_PATH) keyed by the scoring configuration
+USE_CORE_STORE = True
+# Read precomputed cores from the core index (CORE_INDEX_DIR, see backend/create_core_index.py)
+USE_CORE_INDEX = True
+# Read the postings of the FS* first stages from the file-based postings index (POSTINGS_INDEX_DIR, see
+# backend/create_postings_index.py) - fields that were not exported are still queried from the database.
+# The postings are restricted to the documents of the benchmark once (cached on disk per benchmark).
+USE_POSTINGS_INDEX = True
+# Score the candidates of per-candidate recommenders (AlignedNodes / AlignedCores) in a pool of forked worker
+# processes (1 disables parallel scoring)
+RECOMMENDER_SCORING_WORKERS = 1
+RECOMMENDER_SCORING_CHUNK_SIZE = 100
+# Worker counts for the speedup curve of the recommendation runtime measurement
+RECOMMENDER_SCORING_WORKER_CURVE = [1, 2, 4, 8]
+# Keep documents as CompactRecommenderDocuments (interned ids and NumPy arrays) in memory
+COMPACT_DOCUMENTS = True
 DO_RECOMMENDATION = True
 RERUN_FIRST_STAGES = True
 
 # Experimental Configuration (because first stage will always find input doc)
 FS_DOCUMENT_CUTOFF = 1001
 FS_DOCUMENT_CUTOFF_HARD = FS_DOCUMENT_CUTOFF * 2
+# Number of concepts / node pairs whose postings are fetched in one query when first stages prefetch the postings
+# of all topics (FirstStageBase.prefetch_for_documents)
+FS_POSTINGS_BULK_CHUNK_SIZE = 1000
 
 print('--' * 60)
 print(f'Confidence weight : {CONFIDENCE_WEIGHT}')
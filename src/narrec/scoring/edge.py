@@ -18,7 +18,7 @@ PREDICATE_TO_SCORE = {
 def score_edge_by_tf_and_concept_idf(statement: tuple, document: RecommenderDocument, corpus: DocumentCorpus):
     assert len(statement) == 3
 
-    confidence = max(document.spo2confidences[statement])
+    confidence = document.get_statement_confidence(statement)
     assert 0.0 <= confidence <= 1.0
 
     # tf = len(document.spo2sentences[statement]) / document.max_statement_frequency
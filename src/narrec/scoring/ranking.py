@@ -0,0 +1,241 @@
+from typing import List, Tuple
+
+import numpy as np
+
+
+def rank_top_k(scores: np.ndarray, tie_breaks: np.ndarray, k: int = None) -> np.ndarray:
+    """
+    Ranks items by their score and then by their tie break value (both descending)
+    Only the k best items are sorted: a partition selects the k-th best score first, so that all items with a
+    lower score can be skipped. Items with exactly that score are resolved by the tie break.
+    :param scores: the scores of the items
+    :param tie_breaks: the tie break values of the items (e.g., document ids)
+    :param k: the number of items to return (None returns all items)
+    :return: the positions of the k best items in rank order
+    """
+    n = len(scores)
+    if k is None or k >= n:
+        candidates = np.arange(n)
+    elif k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    else:
+        # the k-th best score (every item with a higher score is part of the result)
+        kth_score = np.partition(scores, n - k)[n - k]
+        candidates = np.flatnonzero(scores >= kth_score)
+
+    # lexsort sorts by the last key first (ascending), so sort by negated values
+    order = np.lexsort((-tie_breaks[candidates], -scores[candidates]))
+    return candidates[order[:k]]
+
+
+def dynamic_cutoff_position(sorted_scores: np.ndarray, min_score: float, cutoff: int, cutoff_hard: int) -> int:
+    """
+    Computes the length of a ranking after applying the dynamic cutoff:
+    The ranking is cut behind the last document that has the same score as the document at the cutoff position.
+    If all remaining documents share this score, the ranking is cut at the cutoff. The ranking never exceeds the
+    hard cutoff.
+    :param sorted_scores: the scores of the (at least cutoff_hard) best documents in rank order
+    :param min_score: the minimum score of the whole ranking
+    :param cutoff: the cutoff
+    :param cutoff_hard: the hard cutoff
+    :return: the number of documents to keep
+    """
+    if len(sorted_scores) <= cutoff:
+        return cutoff
+    score_at_cutoff = sorted_scores[cutoff]
+    # search position where score is lower
+    lower = np.flatnonzero(sorted_scores[cutoff:] < score_at_cutoff)
+    if len(lower) > 0:
+        return min(cutoff + int(lower[0]), cutoff_hard)
+    if min_score < score_at_cutoff:
+        # a lower score exists behind the hard cutoff
+        return cutoff_hard
+    return cutoff
+
+
+class ScoreAccumulator:
+    """
+    Accumulates scores of documents over several posting lists
+    The postings are collected as arrays and summed with a single bincount over the distinct document ids.
+    The contributions of a document are added in insertion order (same result as summing them in a dictionary).
+    """
+
+    def __init__(self):
+        self.__document_ids = []
+        self.__scores = []
+        self.__result = None
+        # true if documents with a lower score were skipped (see accumulate_postings)
+        self.incomplete = False
+
+    def add(self, document_ids, score: float):
+        """
+        Adds a score to all given documents
+        :param document_ids: an iterable or array of integer document ids
+        :param score: the score to add
+        """
+        if not isinstance(document_ids, np.ndarray):
+            document_ids = np.fromiter(document_ids, dtype=np.int64, count=len(document_ids))
+        if len(document_ids) == 0:
+            return
+        self.__document_ids.append(document_ids.astype(np.int64, copy=False))
+        self.__scores.append(np.full(len(document_ids), score, dtype=np.float64))
+        self.__result = None
+
+    def add_scores(self, document_ids, scores):
+        """
+        Adds individual scores to the given documents
+        :param document_ids: an iterable or array of integer document ids
+        :param scores: the scores (aligned with document_ids)
+        """
+        if len(document_ids) == 0:
+            return
+        self.__document_ids.append(np.asarray(document_ids, dtype=np.int64))
+        self.__scores.append(np.asarray(scores, dtype=np.float64))
+        self.__result = None
+
+    def to_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: the distinct document ids (sorted) and their summed scores
+        """
+        if self.__result is None:
+            if not self.__document_ids:
+                self.__result = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+            else:
+                document_ids, inverse = np.unique(np.concatenate(self.__document_ids), return_inverse=True)
+                scores = np.bincount(inverse.reshape(-1), weights=np.concatenate(self.__scores),
+                                     minlength=len(document_ids))
+                self.__result = document_ids, scores
+        return self.__result
+
+    def set_arrays(self, document_ids: np.ndarray, scores: np.ndarray, incomplete: bool = False):
+        # document_ids must be sorted and unique
+        self.__document_ids, self.__scores = [document_ids], [scores]
+        self.__result = document_ids, scores
+        self.incomplete = incomplete
+
+    def __len__(self):
+        return len(self.to_arrays()[0])
+
+
+# relative slack for the upper bounds of the early termination (rounding errors of float sums)
+UPPER_BOUND_SLACK = 1e-9
+
+
+def accumulate_postings(postings: List[Tuple[np.ndarray, float]], k: int = None) -> ScoreAccumulator:
+    """
+    Accumulates the scores of documents over a list of postings (MaxScore-style early termination)
+    Once the sum of the remaining posting scores is lower than the current k-th best score, no further document
+    can enter the top k. The remaining postings are then only intersected with the documents that can still
+    reach the top k (sorted arrays), instead of accumulating all their documents.
+    The scores of these documents and thus the top k ranking are exact. Skipped documents are only flagged
+    (ScoreAccumulator.incomplete) as they have a lower score than the k-th best document.
+    :param postings: a list of (sorted unique document id array, score) pairs - in the order in which the scores
+                     should be summed (best: descending score)
+    :param k: the number of documents whose ranking must be exact (None disables the early termination)
+    :return: a ScoreAccumulator
+    """
+    accumulator = ScoreAccumulator()
+    scores = [score for _, score in postings]
+    prune = k is not None and k > 0 and all(score >= 0.0 for score in scores)
+
+    for idx, (document_ids, score) in enumerate(postings):
+        accumulator.add(document_ids, score)
+        if not prune or idx == len(postings) - 1:
+            continue
+        upper_bound = sum(scores[idx + 1:]) * (1.0 + UPPER_BOUND_SLACK)
+        # the k-th best score is at most the sum of all processed scores
+        if upper_bound >= sum(scores[:idx + 1]):
+            continue
+
+        current_ids, current_scores = accumulator.to_arrays()
+        if len(current_ids) < k:
+            continue
+        # skipped documents must stay below the k-th best score (also after the normalization)
+        kth_score = np.partition(current_scores, len(current_scores) - k)[len(current_scores) - k]
+        kth_score *= 1.0 - UPPER_BOUND_SLACK
+        if upper_bound >= kth_score:
+            continue
+
+        # only documents that can still reach the k-th best score are scored further
+        candidates = current_scores + upper_bound >= kth_score
+        candidate_ids, candidate_scores = current_ids[candidates], current_scores[candidates].copy()
+        incomplete = not candidates.all()
+        for remaining_ids, remaining_score in postings[idx + 1:]:
+            if len(remaining_ids) == 0:
+                continue
+            positions = np.minimum(np.searchsorted(remaining_ids, candidate_ids), len(remaining_ids) - 1)
+            hits = np.flatnonzero(remaining_ids[positions] == candidate_ids)
+            # same summation order as accumulating all postings
+            candidate_scores[hits] += remaining_score
+            # the posting contains documents outside of the candidates
+            if len(hits) < len(remaining_ids):
+                incomplete = True
+        accumulator.set_arrays(candidate_ids, candidate_scores, incomplete=incomplete)
+        break
+    return accumulator
+
+
+def to_score_arrays(document_ids_scored) -> Tuple[list, np.ndarray, np.ndarray]:
+    """
+    :param document_ids_scored: a dictionary mapping document ids to scores or a ScoreAccumulator
+    :return: the document ids, their scores and their integer values (tie break)
+    """
+    if isinstance(document_ids_scored, ScoreAccumulator):
+        document_ids, scores = document_ids_scored.to_arrays()
+        return document_ids, scores, document_ids
+    document_ids = list(document_ids_scored.keys())
+    scores = np.fromiter(document_ids_scored.values(), dtype=np.float64, count=len(document_ids))
+    tie_breaks = np.fromiter((int(d) for d in document_ids), dtype=np.int64, count=len(document_ids))
+    return document_ids, scores, tie_breaks
+
+
+def normalize_scores(scores: np.ndarray) -> np.ndarray:
+    # normalize by the maximum score (if positive)
+    if len(scores) > 0:
+        max_score = scores.max()
+        if max_score > 0.0:
+            return scores / max_score
+    return scores
+
+
+def rank_document_scores(document_ids_scored, k: int = None, normalize: bool = True) -> List[Tuple[object, float]]:
+    """
+    Ranks documents by their score and then by their document id (both descending)
+    :param document_ids_scored: a dictionary mapping document ids to scores or a ScoreAccumulator
+    :param k: the number of documents to return (None returns all documents)
+    :param normalize: whether the scores are normalized by the maximum score before ranking
+    :return: a list of (document id, score) tuples in rank order
+    """
+    document_ids, scores, tie_breaks = to_score_arrays(document_ids_scored)
+    if normalize:
+        scores = normalize_scores(scores)
+    return _to_ranking(document_ids, scores, rank_top_k(scores, tie_breaks, k))
+
+
+def rank_document_scores_with_dynamic_cutoff(document_ids_scored, cutoff: int,
+                                             cutoff_hard: int) -> List[Tuple[object, float]]:
+    """
+    Ranks documents by their normalized score and then by their document id and applies the dynamic cutoff
+    (see dynamic_cutoff_position). Only the documents up to the hard cutoff are sorted.
+    :param document_ids_scored: a dictionary mapping document ids to scores or a ScoreAccumulator
+    :param cutoff: the cutoff
+    :param cutoff_hard: the hard cutoff
+    :return: a list of (document id, normalized score) tuples in rank order
+    """
+    document_ids, scores, tie_breaks = to_score_arrays(document_ids_scored)
+    if len(scores) == 0:
+        return []
+    scores = normalize_scores(scores)
+    positions = rank_top_k(scores, tie_breaks, cutoff_hard)
+    min_score = scores.min()
+    if isinstance(document_ids_scored, ScoreAccumulator) and document_ids_scored.incomplete:
+        # skipped documents have a lower score than the documents up to the hard cutoff
+        min_score = -np.inf
+    positions = positions[:dynamic_cutoff_position(scores[positions], min_score, cutoff, cutoff_hard)]
+    return _to_ranking(document_ids, scores, positions)
+
+
+def _to_ranking(document_ids, scores: np.ndarray, positions: np.ndarray) -> List[Tuple[object, float]]:
+    if isinstance(document_ids, np.ndarray):
+        return list(zip(document_ids[positions].tolist(), scores[positions].tolist()))
+    return [(document_ids[p], float(scores[p])) for p in positions.tolist()]
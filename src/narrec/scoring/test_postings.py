@@ -0,0 +1,96 @@
+import json
+import random
+import unittest
+
+import numpy as np
+
+from narrec.backend.postings import encode_postings, decode_postings, merge_postings, filter_postings, \
+    contained_mask, CODEC_RAW32, CODEC_RAW64, CODEC_DELTA_VARINT, INT32_MAX
+
+CODECS = [CODEC_DELTA_VARINT, CODEC_RAW32, CODEC_RAW64]
+
+
+class PostingsCodecTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.rnd = random.Random(42)
+
+    def assertRoundTrip(self, document_ids, codecs=CODECS):
+        expected = sorted(set(int(d) for d in document_ids))
+        for codec in codecs:
+            data = encode_postings(document_ids, codec=codec)
+            self.assertEqual(codec, data[0])
+            decoded = decode_postings(data)
+            self.assertEqual(expected, decoded.tolist(), msg=f'codec {codec}')
+            # decoding from a memoryview (e.g., a database buffer) gives the same result
+            self.assertEqual(expected, decode_postings(memoryview(data)).tolist(), msg=f'codec {codec}')
+
+    def test_empty(self):
+        self.assertRoundTrip([])
+        self.assertEqual(1, len(encode_postings([])))
+
+    def test_single(self):
+        for document_id in [0, 1, 127, 128, 16383, 16384, INT32_MAX]:
+            self.assertRoundTrip([document_id])
+
+    def test_varint_boundaries(self):
+        # gaps at the boundaries of 1, 2, 3, ... bytes per varint
+        gaps = [1, 127, 128, 129, 2 ** 14 - 1, 2 ** 14, 2 ** 21 - 1, 2 ** 21, 2 ** 28, 2 ** 35 + 3]
+        document_ids = np.cumsum(gaps).tolist()
+        self.assertRoundTrip(document_ids, codecs=[CODEC_DELTA_VARINT, CODEC_RAW64])
+        self.assertRoundTrip([0] + document_ids, codecs=[CODEC_DELTA_VARINT, CODEC_RAW64])
+
+    def test_large_ids(self):
+        document_ids = [2 ** 40, 2 ** 40 + 1, 2 ** 62]
+        self.assertRoundTrip(document_ids, codecs=[CODEC_DELTA_VARINT, CODEC_RAW64])
+        with self.assertRaises(ValueError):
+            encode_postings(document_ids, codec=CODEC_RAW32)
+
+    def test_random(self):
+        for _ in range(200):
+            max_document_id = self.rnd.choice([100, 40000000, INT32_MAX])
+            size = self.rnd.randint(0, 2000)
+            document_ids = [self.rnd.randint(0, max_document_id) for _ in range(size)]
+            self.assertRoundTrip(document_ids)
+            self.assertRoundTrip(np.array(document_ids, dtype=np.int64))
+
+    def test_unsorted_and_duplicates(self):
+        self.assertRoundTrip([5, 3, 5, 1, 3, 1000000, 0])
+        self.assertRoundTrip({9, 2, 7})
+
+    def test_json_compatibility(self):
+        # the postings of the JSON tables (descending document ids) are encoded as sorted ids
+        document_ids = sorted(self.rnd.sample(range(1, 10 ** 7), 500), reverse=True)
+        text = json.dumps(document_ids)
+        self.assertEqual(sorted(json.loads(text)), decode_postings(encode_postings(json.loads(text))).tolist())
+
+    def test_varint_is_compact(self):
+        document_ids = list(range(1000, 2000))
+        # one byte per gap (and one byte for the codec and the first id)
+        self.assertEqual(1 + 2 + 999, len(encode_postings(document_ids)))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            encode_postings([-1, 3])
+        with self.assertRaises(ValueError):
+            encode_postings([1, 2], codec=99)
+        with self.assertRaises(ValueError):
+            decode_postings(bytes([99, 1, 2]))
+
+    def test_merge_and_filter(self):
+        for _ in range(100):
+            postings = [np.array(sorted(self.rnd.sample(range(500), self.rnd.randint(0, 100))), dtype=np.int64)
+                        for _ in range(self.rnd.randint(0, 5))]
+            union = sorted(set().union(*[set(p.tolist()) for p in postings]))
+            merged = merge_postings(postings)
+            self.assertEqual(union, merged.tolist())
+            self.assertEqual(np.int64, merged.dtype)
+
+            allowed = np.array(sorted(self.rnd.sample(range(500), self.rnd.randint(0, 250))), dtype=np.int64)
+            allowed_set = set(allowed.tolist())
+            self.assertEqual([d for d in union if d in allowed_set], filter_postings(merged, allowed).tolist())
+            self.assertEqual([d in allowed_set for d in union], contained_mask(merged, allowed).tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import random
+import unittest
+
+import numpy as np
+
+from narrec.scoring.ranking import ScoreAccumulator, accumulate_postings, rank_document_scores, \
+    rank_document_scores_with_dynamic_cutoff
+
+SCORES = [1.0, 0.75, 0.5, 0.3, 0.25, 0.1, 0.05, 0.01]
+
+
+def create_postings(rnd: random.Random, max_document_id: int) -> [(np.ndarray, float)]:
+    # few distinct scores and small document ranges lead to many ties
+    postings = []
+    for _ in range(rnd.randint(1, 12)):
+        size = rnd.randint(0, max_document_id // 2)
+        document_ids = np.array(sorted(rnd.sample(range(max_document_id), size)), dtype=np.int64)
+        postings.append((document_ids, rnd.choice(SCORES)))
+    # the first stages sum the postings in descending score order
+    postings.sort(key=lambda x: x[1], reverse=True)
+    return postings
+
+
+def reference_ranking(postings: [(np.ndarray, float)]) -> [(int, float)]:
+    # the former dictionary accumulation and sort of the first stages
+    document_ids_scored = {}
+    for document_ids, score in postings:
+        for document_id in document_ids.tolist():
+            if document_id not in document_ids_scored:
+                document_ids_scored[document_id] = score
+            else:
+                document_ids_scored[document_id] += score
+    if not document_ids_scored:
+        return []
+    max_score = max(document_ids_scored.values())
+    if max_score > 0.0:
+        ranking = [(k, v / max_score) for k, v in document_ids_scored.items()]
+    else:
+        ranking = list(document_ids_scored.items())
+    ranking.sort(key=lambda x: (x[1], x[0]), reverse=True)
+    return ranking
+
+
+def reference_dynamic_cutoff(ranking: [(int, float)], cutoff: int, cutoff_hard: int) -> [(int, float)]:
+    # the former FirstStageBase.apply_dynamic_cutoff
+    if len(ranking) > cutoff:
+        score_at_cutoff = ranking[cutoff][1]
+        new_cutoff_position = 0
+        for idx, (_, score) in enumerate(ranking[cutoff:]):
+            if score < score_at_cutoff:
+                new_cutoff_position = idx
+                break
+        if cutoff + new_cutoff_position < cutoff_hard:
+            return ranking[:cutoff + new_cutoff_position]
+        return ranking[:cutoff_hard]
+    return ranking[:cutoff]
+
+
+class RankingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.rnd = random.Random(42)
+
+    def test_accumulator(self):
+        for _ in range(100):
+            postings = create_postings(self.rnd, 200)
+            accumulator = ScoreAccumulator()
+            for document_ids, score in postings:
+                accumulator.add(document_ids, score)
+            # same summation order as the dictionary: the scores are identical (not only close)
+            self.assertEqual(reference_ranking(postings), rank_document_scores(accumulator))
+
+    def test_rank_top_k(self):
+        for _ in range(100):
+            postings = create_postings(self.rnd, 200)
+            accumulator = accumulate_postings(postings)
+            ranking = reference_ranking(postings)
+            for k in [0, 1, 5, 17, len(ranking), len(ranking) + 3]:
+                self.assertEqual(ranking[:k], rank_document_scores(accumulator, k=k))
+
+    def test_early_termination_top_k(self):
+        pruned = 0
+        for _ in range(400):
+            postings = create_postings(self.rnd, self.rnd.choice([50, 200, 1000]))
+            k = self.rnd.choice([1, 3, 10, 25, 100])
+            exhaustive = accumulate_postings(postings)
+            accumulator = accumulate_postings(postings, k=k)
+            self.assertFalse(exhaustive.incomplete)
+            if accumulator.incomplete:
+                pruned += 1
+            # the top k (including ties at the k-th position) are exact
+            self.assertEqual(rank_document_scores(exhaustive, k=k), rank_document_scores(accumulator, k=k))
+            self.assertEqual(reference_ranking(postings)[:k], rank_document_scores(accumulator, k=k))
+        # the early termination was actually used
+        self.assertGreater(pruned, 50)
+
+    def test_early_termination_dynamic_cutoff(self):
+        pruned = 0
+        for _ in range(400):
+            postings = create_postings(self.rnd, self.rnd.choice([50, 200, 1000]))
+            cutoff = self.rnd.choice([1, 5, 20])
+            cutoff_hard = cutoff * self.rnd.choice([1, 2, 5])
+            # the Flex first stages only rank exactly up to the hard cutoff
+            accumulator = accumulate_postings(postings, k=cutoff_hard)
+            if accumulator.incomplete:
+                pruned += 1
+            expected = reference_dynamic_cutoff(reference_ranking(postings), cutoff, cutoff_hard)
+            self.assertEqual(expected, rank_document_scores_with_dynamic_cutoff(accumulator, cutoff, cutoff_hard))
+        self.assertGreater(pruned, 50)
+
+    def test_ties_at_kth_score(self):
+        # all documents share the same score: the k largest document ids are returned
+        postings = [(np.arange(100, dtype=np.int64), 1.0), (np.arange(100, dtype=np.int64), 0.5)]
+        ranking = rank_document_scores(accumulate_postings(postings, k=10), k=10)
+        self.assertEqual(list(range(99, 89, -1)), [d for d, _ in ranking])
+        self.assertEqual([1.0] * 10, [s for _, s in ranking])
+
+    def test_negative_scores_disable_early_termination(self):
+        postings = [(np.arange(50, dtype=np.int64), 1.0), (np.arange(10, 60, dtype=np.int64), -0.5),
+                    (np.arange(40, 45, dtype=np.int64), 0.1)]
+        accumulator = accumulate_postings(postings, k=5)
+        self.assertFalse(accumulator.incomplete)
+        self.assertEqual(reference_ranking(postings)[:5], rank_document_scores(accumulator, k=5))
+
+    def test_empty_postings(self):
+        self.assertEqual([], rank_document_scores(accumulate_postings([], k=5)))
+        postings = [(np.zeros(0, dtype=np.int64), 1.0), (np.array([3, 7], dtype=np.int64), 0.5)]
+        self.assertEqual([(7, 1.0), (3, 1.0)], rank_document_scores(accumulate_postings(postings, k=2), k=2))
+        self.assertEqual([], rank_document_scores_with_dynamic_cutoff(ScoreAccumulator(), 5, 10))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+import random
+import unittest
+
+from narrec.ontology.distance import OntologyDistanceEngine
+from narrec.ontology.ontology import Ontology
+
+THRESHOLDS = [0.3, 0.5, 1.0, 0.0, 0.25, 0.2]
+
+DESCRIPTOR2TREE_NUMBERS = {
+    "D000001": ["C01"],
+    "D000002": ["C01.069"],
+    "D000003": ["C01.221.500"],
+    "D000004": ["C01.221.250.875", "D03.438"],
+    "D000005": ["C02.081.270"],
+    "D000006": ["D03.438.221"],
+    # same tree number as another descriptor (distance 0)
+    "D000007": ["C01.069"],
+    # a descriptor without tree numbers
+    "D000008": [],
+}
+
+CHEMBL2ATC_CLASSES = {
+    "CHEMBL1": {"R06", "R06AE06", "R06AE07"},
+    "CHEMBL2": {"R06AE08"},
+    "CHEMBL3": {"R06AX01", "N05BB01"},
+    "CHEMBL4": {"N06BA01"},
+    # only a class that is not a final ATC level
+    "CHEMBL5": {"N05"},
+    "CHEMBL6": set(),
+}
+
+# concepts of other vocabularies and MeSH descriptors that are not part of the ontology
+OTHER_CONCEPTS = ["MESH:D999999", "MESH:C000001", "HGNC:1"]
+
+
+class StubMeSHOntology:
+
+    def __init__(self, descriptor2tree_numbers: dict):
+        self.descriptor2tree_numbers = descriptor2tree_numbers
+
+    def get_tree_numbers_for_descriptor(self, descriptor: str) -> [str]:
+        # raises a KeyError for unknown descriptors
+        return self.descriptor2tree_numbers[descriptor]
+
+
+class StubATCTree:
+
+    def __init__(self, chembl2atcclass: dict):
+        self.chembl2atcclass = chembl2atcclass
+
+
+class StubOntology(Ontology):
+    """
+    An ontology with a small set of MeSH tree numbers and ATC classes
+    """
+
+    def __init__(self, descriptor2tree_numbers: dict, chembl2atcclass: dict):
+        self.mesh_ontology = StubMeSHOntology(descriptor2tree_numbers)
+        self.atc = StubATCTree(chembl2atcclass)
+
+
+def create_random_ontology(rnd: random.Random, descriptors: int, chembls: int) -> StubOntology:
+    descriptor2tree_numbers = {}
+    for i in range(descriptors):
+        descriptor2tree_numbers[f'D{i:06d}'] = ['.'.join([rnd.choice(['C01', 'C02', 'D03'])] +
+                                                         [f'{rnd.randint(0, 3):03d}'
+                                                          for _ in range(rnd.randint(0, 5))])
+                                                for _ in range(rnd.randint(0, 3))]
+    chembl2atcclass = {}
+    for i in range(chembls):
+        classes = set()
+        for _ in range(rnd.randint(0, 3)):
+            atc = rnd.choice('ABC') + f'{rnd.randint(1, 3):02d}' + rnd.choice('AB') + rnd.choice('AB') + \
+                  f'{rnd.randint(1, 3):02d}'
+            classes.update([atc, atc[:3]])
+        chembl2atcclass[f'CHEMBL{i}'] = classes
+    return StubOntology(descriptor2tree_numbers, chembl2atcclass)
+
+
+def reference_similarity(ontology: Ontology, a: str, b: str) -> float:
+    # the former GraphBase.ontological_node_similarity
+    if a == b:
+        return 1.0
+    distance = ontology.compute_ontological_distance(a, b)
+    if distance == 0:
+        return 1.0
+    elif distance == -1:
+        return 0.0
+    else:
+        return 1.0 / distance
+
+
+def reference_similar_pairs(ontology: Ontology, nodes_a, nodes_b, threshold: float):
+    # the former nested loop of GraphBase.node_candidates (in sorted node order)
+    pairs = []
+    for a in sorted(nodes_a):
+        for b in sorted(nodes_b):
+            similarity = reference_similarity(ontology, a, b)
+            if similarity >= threshold:
+                pairs.append((a, b, similarity))
+    return pairs
+
+
+class OntologyDistanceEngineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.ontology = StubOntology(DESCRIPTOR2TREE_NUMBERS, CHEMBL2ATC_CLASSES)
+        self.engine = OntologyDistanceEngine(ontology=self.ontology)
+        self.concepts = [f'MESH:{d}' for d in DESCRIPTOR2TREE_NUMBERS] + list(CHEMBL2ATC_CLASSES) + OTHER_CONCEPTS
+
+    def test_distance(self):
+        for a in self.concepts:
+            for b in self.concepts:
+                self.assertEqual(self.ontology.compute_ontological_distance(a, b), self.engine.distance(a, b),
+                                 msg=f'{a} - {b}')
+
+    def test_distance_examples(self):
+        # 1 step upwards and two steps downwards
+        self.assertEqual(3, self.engine.distance('MESH:D000002', 'MESH:D000003'))
+        # the closest pair of tree numbers counts
+        self.assertEqual(1, self.engine.distance('MESH:D000004', 'MESH:D000006'))
+        self.assertEqual(0, self.engine.distance('MESH:D000002', 'MESH:D000007'))
+        self.assertEqual(-1, self.engine.distance('MESH:D000001', 'MESH:D000005'))
+        # R06AE06 -> R.06.A.E06
+        self.assertEqual(2, self.engine.distance('CHEMBL1', 'CHEMBL2'))
+        self.assertEqual(2, self.engine.distance('CHEMBL1', 'CHEMBL3'))
+        self.assertEqual(6, self.engine.distance('CHEMBL3', 'CHEMBL4'))
+        self.assertEqual(-1, self.engine.distance('CHEMBL4', 'CHEMBL5'))
+        # MeSH tree numbers and ATC classes are never related
+        self.assertEqual(-1, self.engine.distance('MESH:D000001', 'CHEMBL1'))
+
+    def test_distance_is_cached_symmetric(self):
+        self.assertEqual(self.engine.distance('MESH:D000003', 'MESH:D000004'),
+                         self.engine.distance('MESH:D000004', 'MESH:D000003'))
+
+    def test_similarity(self):
+        for a in self.concepts:
+            for b in self.concepts:
+                self.assertEqual(reference_similarity(self.ontology, a, b), self.engine.similarity(a, b))
+
+    def test_max_distance(self):
+        for threshold in THRESHOLDS + [0.1, 0.33, 1.0 / 3, 1.5]:
+            radius = OntologyDistanceEngine.max_distance(threshold)
+            if radius is None:
+                self.assertLessEqual(threshold, 0.0)
+                continue
+            for distance in range(1, 20):
+                self.assertEqual(1.0 / distance >= threshold, distance <= radius, msg=f'{threshold} - {distance}')
+
+    def test_similar_pairs(self):
+        for threshold in THRESHOLDS:
+            self.assertEqual(reference_similar_pairs(self.ontology, self.concepts, self.concepts, threshold),
+                             self.engine.similar_pairs(self.concepts, self.concepts, threshold),
+                             msg=f'threshold {threshold}')
+
+    def test_similar_pairs_random(self):
+        rnd = random.Random(42)
+        ontology = create_random_ontology(rnd, descriptors=150, chembls=60)
+        engine = OntologyDistanceEngine(ontology=ontology)
+        concepts = [f'MESH:D{i:06d}' for i in range(160)] + [f'CHEMBL{i}' for i in range(60)] + OTHER_CONCEPTS
+        for _ in range(20):
+            nodes_a = set(rnd.sample(concepts, rnd.randint(0, 25)))
+            nodes_b = set(rnd.sample(concepts, rnd.randint(0, 25)))
+            # one neighbourhood is reused for several candidates
+            for threshold in THRESHOLDS:
+                neighbourhood = engine.create_neighbourhood(nodes_a, threshold)
+                self.assertEqual(reference_similar_pairs(ontology, nodes_a, nodes_b, threshold),
+                                 neighbourhood.similar_pairs(nodes_b))
+                self.assertEqual(reference_similar_pairs(ontology, nodes_a, nodes_a, threshold),
+                                 neighbourhood.similar_pairs(nodes_a))
+
+    def test_similar_pairs_empty(self):
+        for threshold in THRESHOLDS:
+            self.assertEqual([], self.engine.similar_pairs([], self.concepts, threshold))
+            self.assertEqual([], self.engine.similar_pairs(self.concepts, [], threshold))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+from kgextractiontoolbox.document.narrative_document import StatementExtraction
+from narrec.document.core import ScoredStatementExtraction
+
+
+class IdDocument:
+    """
+    A document that only has an id (enough for the components that look up precomputed data)
+    """
+
+    def __init__(self, document_id: int):
+        self.id = document_id
+
+
+class PrecomputedCoreExtractor:
+    """
+    Serves cores that were created by the test (same interface as NarrativeCoreExtractor)
+    """
+
+    def __init__(self, doc2core: dict, doc2concept_core: dict = None):
+        self.doc2core = doc2core
+        self.doc2concept_core = doc2concept_core if doc2concept_core else {}
+
+    def extract_concept_core(self, document):
+        return self.doc2concept_core[document.id]
+
+    def extract_concept_cores(self, documents):
+        return {d.id: self.doc2concept_core[d.id] for d in documents}
+
+    def extract_narrative_core_from_document(self, document):
+        return self.doc2core[document.id]
+
+    def extract_narrative_cores(self, documents):
+        return {d.id: self.doc2core[d.id] for d in documents}
+
+
+def create_scored_statement(subject_id: str, object_id: str, relation: str, confidence: float,
+                            score: float) -> ScoredStatementExtraction:
+    stmt = StatementExtraction(subject_id=subject_id, subject_type="Drug", subject_str=subject_id, predicate="p",
+                               relation=relation, object_id=object_id, object_type="Disease", object_str=object_id,
+                               sentence_id=0, confidence=confidence)
+    return ScoredStatementExtraction(stmt=stmt, score=score)